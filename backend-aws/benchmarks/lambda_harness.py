@@ -0,0 +1,233 @@
+"""
+Local cold/warm benchmark for the Lambda handlers.
+
+Each function runs in a fresh Python subprocess, set up like a Lambda
+container: the common layer on sys.path and BedrockClient pointed at a
+local fake Bedrock runtime (backend/loadtest/fake_llm.py) through
+BEDROCK_ENDPOINT_URL. The child times the import of functions/<name>/app.py
+(cold init), then replays API Gateway proxy events through lambda_handler:
+the first invocation is reported separately (it pays for lazy
+initialisation), the rest as warm latency. Peak RSS comes from getrusage.
+
+Numbers are relative: a real Lambda has less CPU at 512 MB and its own
+runtime bootstrap, but import cost, per-invocation overhead and memory
+growth compare well between two versions of the layer or a handler.
+
+Usage (from backend-aws/, with boto3 installed):
+    python benchmarks/lambda_harness.py
+    python benchmarks/lambda_harness.py --functions generate,refine --invocations 200 --latency fixed:0
+    python benchmarks/lambda_harness.py --output lambda-bench.json
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+AWS_DIR = Path(__file__).resolve().parent.parent
+LAYER_DIR = AWS_DIR / 'layers' / 'common' / 'python'
+BACKEND_DIR = AWS_DIR.parent / 'backend'
+RESULT_PREFIX = 'HARNESS_RESULT '
+
+FUNCTIONS = {
+    'validate': '/api/diagrams/validate',
+    'generate': '/api/diagrams/generate',
+    'suggest': '/api/diagrams/suggest-improvements',
+    'refine': '/api/diagrams/refine',
+}
+
+VALID_INPUT = (
+    'Build a web application where customers upload invoices that are stored in Amazon S3 and '
+    'processed by a worker that sends confirmation emails through SendGrid.'
+)
+INCOMPLETE_INPUT = (
+    'Build a platform that processes files from S3 and transfers them to an SFTP server every night '
+    'with retries and email alerts when a transfer fails after several attempts'
+)
+DIAGRAM = """graph LR
+    Customer[👤 Customer<br/>Places orders]
+    WebApp[🌐 Web App<br/>Online store]
+    OrderAPI[⚙️ Order API<br/>Processes orders]
+    Email[📧 Email Service<br/>Sends confirmations]
+    Customer -->|Browses| WebApp
+    WebApp -->|Submits orders| OrderAPI
+    OrderAPI -->|Notifies| Email"""
+
+# Request bodies replayed in turn for each function
+BODIES = {
+    'validate': [{'input_text': VALID_INPUT}, {'input_text': INCOMPLETE_INPUT}, {'input_text': 'Build an app'}],
+    'generate': [{'input_text': VALID_INPUT, 'diagram_type': 'context'}],
+    'suggest': [{'input_text': INCOMPLETE_INPUT, 'diagram_type': 'context'}],
+    'refine': [
+        {'current_mermaid': DIAGRAM, 'original_context': VALID_INPUT, 'refinement_instruction': 'remove Email Service'},
+        {'current_mermaid': DIAGRAM, 'original_context': VALID_INPUT,
+         'refinement_instruction': 'Add a payment provider that the Order API calls before confirming orders'},
+    ],
+}
+
+
+class LambdaContext:
+    """The attributes handlers and traced_handler read from the Lambda context"""
+
+    def __init__(self, function_name: str, timeout_ms: int = 60000):
+        self.function_name = f"c4-{function_name}"
+        self.aws_request_id = str(uuid.uuid4())
+        self.memory_limit_in_mb = 512
+        self._deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self) -> int:
+        return int((self._deadline - time.monotonic()) * 1000)
+
+
+def api_gateway_event(path: str, body: dict) -> dict:
+    return {
+        'resource': path,
+        'path': path,
+        'httpMethod': 'POST',
+        'headers': {'Content-Type': 'application/json', 'Origin': 'http://localhost:5173'},
+        'requestContext': {'requestId': str(uuid.uuid4()), 'stage': 'prod'},
+        'body': json.dumps(body),
+        'isBase64Encoded': False,
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+
+def run_child(function: str, invocations: int, show_logs: bool):
+    """Inside the subprocess: import the handler cold, then invoke it repeatedly"""
+    started = time.time()
+    sys.path.insert(0, str(LAYER_DIR))
+    logs = sys.stdout if show_logs else io.StringIO()
+
+    init_start = time.perf_counter()
+    with contextlib.redirect_stdout(logs):
+        spec = importlib.util.spec_from_file_location('app', AWS_DIR / 'functions' / function / 'app.py')
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['app'] = module
+        spec.loader.exec_module(module)
+    init_ms = (time.perf_counter() - init_start) * 1000
+    rss_after_init = peak_rss_mb()
+
+    path = FUNCTIONS[function]
+    bodies = BODIES[function]
+    durations = []
+    statuses = {}
+    for index in range(invocations + 1):
+        event = api_gateway_event(path, bodies[index % len(bodies)])
+        invoke_start = time.perf_counter()
+        with contextlib.redirect_stdout(logs):
+            response = module.lambda_handler(event, LambdaContext(function))
+        durations.append((time.perf_counter() - invoke_start) * 1000)
+        status = str(response.get('statusCode'))
+        statuses[status] = statuses.get(status, 0) + 1
+        if not show_logs:
+            logs.seek(0)
+            logs.truncate()
+
+    warm = sorted(durations[1:])
+    result = {
+        'process_start_ms': round((started - float(os.environ['HARNESS_SPAWNED_AT'])) * 1000, 1),
+        'init_ms': round(init_ms, 1),
+        'first_invocation_ms': round(durations[0], 1),
+        'warm': {
+            'invocations': len(warm),
+            'mean_ms': round(statistics.fmean(warm), 2) if warm else 0.0,
+            'p50_ms': round(warm[len(warm) // 2], 2) if warm else 0.0,
+            'p95_ms': round(warm[min(len(warm) - 1, int(len(warm) * 0.95))], 2) if warm else 0.0,
+            'max_ms': round(warm[-1], 2) if warm else 0.0,
+        },
+        'rss_after_init_mb': rss_after_init,
+        'peak_rss_mb': peak_rss_mb(),
+        'statuses': statuses,
+    }
+    print(RESULT_PREFIX + json.dumps(result))
+
+
+def measure(function: str, invocations: int, fake_url: str, show_logs: bool) -> dict:
+    """Run one function in a fresh interpreter and return its measurements"""
+    env = {
+        **os.environ,
+        'BEDROCK_ENDPOINT_URL': fake_url,
+        'BEDROCK_REGION': 'us-east-1',
+        'AWS_ACCESS_KEY_ID': 'harness',
+        'AWS_SECRET_ACCESS_KEY': 'harness',
+        'AWS_LAMBDA_FUNCTION_NAME': f"c4-{function}",
+        'HARNESS_SPAWNED_AT': repr(time.time()),
+    }
+    env.pop('AWS_PROFILE', None)
+    command = [sys.executable, __file__, '--child', function, '--invocations', str(invocations)]
+    if show_logs:
+        command.append('--show-logs')
+    completed = subprocess.run(command, env=env, cwd=AWS_DIR, capture_output=True, text=True)
+    if show_logs:
+        sys.stderr.write(completed.stdout)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"{function} failed (exit {completed.returncode}):\n{completed.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--functions', default=','.join(FUNCTIONS), help='Comma-separated function names')
+    parser.add_argument('--invocations', type=int, default=50, help='Warm invocations per function')
+    parser.add_argument('--latency', default='fixed:0',
+                        help='Fake Bedrock latency (fixed:MS | uniform:MIN:MAX | lognormal:P50:P95)')
+    parser.add_argument('--token-delay-ms', type=float, default=0.0)
+    parser.add_argument('--output', default=None, help='Write the JSON report here (default: stdout)')
+    parser.add_argument('--show-logs', action='store_true', help='Pass handler output through to stderr')
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.invocations, args.show_logs)
+        return
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    from loadtest.fake_llm import FakeLLMConfig, FakeLLMServer
+
+    fake = FakeLLMServer(('127.0.0.1', 0), FakeLLMConfig(
+        latency=args.latency, token_delay_ms=args.token_delay_ms
+    )).start()
+    results = {}
+    try:
+        for function in args.functions.split(','):
+            results[function] = measure(function, args.invocations, fake.url, args.show_logs)
+            result = results[function]
+            print(
+                f"{function:<10} init {result['init_ms']:>7.1f} ms  first {result['first_invocation_ms']:>7.1f} ms  "
+                f"warm p50 {result['warm']['p50_ms']:>6.2f} ms  p95 {result['warm']['p95_ms']:>6.2f} ms  "
+                f"peak RSS {result['peak_rss_mb']:>6.1f} MB",
+                file=sys.stderr
+            )
+    finally:
+        fake.shutdown()
+        fake.server_close()
+
+    report = json.dumps({
+        'python': sys.version.split()[0],
+        'fake_bedrock': {'latency': args.latency, 'token_delay_ms': args.token_delay_ms},
+        'upstream': fake.stats.snapshot(),
+        'functions': results,
+    }, indent=2)
+    if args.output:
+        Path(args.output).write_text(report + '\n')
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
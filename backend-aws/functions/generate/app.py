@@ -4,74 +4,37 @@ Lambda function for C4 diagram generation
 import json
 import os
 import sys
+import time
 
 # Add common layer to path
 sys.path.insert(0, '/opt/python')
 
 from common.bedrock_client import BedrockClient
 from common.validation import validate_input
+from common.mermaid import sanitize_mermaid
+from common.prompts import GENERATE_SYSTEM_PROMPT, generate_user_prompt
+from common.model_router import ModelRouter, RoutingPolicy, extract_signals
+from common.tracing import setup_tracing, span, traced_handler
 
+# Spans export per TRACING_EXPORTER (e.g. 'console' -> CloudWatch); Server-Timing is always set
+setup_tracing('c4-generate')
 
-def build_prompt(context: str) -> str:
-    """Build the prompt for Claude to generate C4 diagram."""
-    return f"""You are an expert software architect. Based on the following solution context, generate a clear, legible architecture diagram using Mermaid flowchart syntax (NOT C4Context).
-
-Solution Context:
-{context}
-
-CRITICAL SYNTAX RULES:
-1. Use standard Mermaid flowchart syntax with LEFT-TO-RIGHT (LR) direction
-2. Node IDs MUST be simple alphanumeric (no spaces, no special chars): User, S3Bucket, TransferSystem
-3. NEVER use reserved words as node IDs: "system", "application", "graph", "class", "end"
-4. If you need to use a reserved word, prefix it: node_system, node_application
-5. Labels go inside brackets and can have any text: User[👤 User<br/>Uploads files]
-
-CORRECT SYNTAX EXAMPLES:
-✓ User[👤 User]
-✓ S3Bucket[📦 Amazon S3]
-✓ TransferSys[🔷 Transfer System]
-✓ SFTPServer[📦 SFTP Server]
+# Created once per container so routing stats cover all warm invocations
+model_router = ModelRouter(RoutingPolicy.from_env(
+    fast_model='anthropic.claude-3-haiku-20240307-v1:0',
+    large_model='anthropic.claude-3-5-sonnet-20240620-v1:0'
+))
 
-TEMPLATE TO FOLLOW:
-```
-graph LR
-    %% Define nodes with clear IDs and styled labels
-    UserNode[👤 User<br/>Description]
-    MainSystem[🔷 System Name<br/>Description]
-    ExternalSvc[📦 External System<br/>Description]
-    
-    %% Define relationships with clear labels
-    UserNode -->|Action description| MainSystem
-    MainSystem -->|Action description| ExternalSvc
-    
-    %% Apply styling
-    classDef userStyle fill:#08427B,stroke:#052E56,color:#fff
-    classDef systemStyle fill:#1168BD,stroke:#0B4884,color:#fff
-    classDef externalStyle fill:#999,stroke:#666,color:#fff
-    
-    class UserNode userStyle
-    class MainSystem systemStyle
-    class ExternalSvc externalStyle
-```
 
-RULES FOR LEGIBLE DIAGRAMS:
-1. ALWAYS use "graph LR" (Left-to-Right) for simple diagrams (≤5 elements)
-2. Use "graph TD" (Top-Down) only for complex hierarchies (>5 elements)
-3. Keep labels SHORT (max 3-4 words per line)
-4. Use <br/> to break long text into multiple lines
-5. Add icons: 👤 for users, 🔷 for systems, 📦 for external systems, 💾 for databases
-6. Use clear, descriptive relationship labels on arrows
-7. Apply consistent styling with classDef
-
-STYLING GUIDE:
-- Users/Actors: Dark blue (#08427B)
-- Main Systems: Blue (#1168BD)
-- External Systems: Gray (#999)
-- Databases/Storage: Green (#2E7D32)
-
-Generate a clean, horizontal, legible diagram following these rules. Return ONLY the Mermaid code without markdown code blocks."""
+def build_prompt(context: str) -> str:
+    """
+    Build the variable part of the generate prompt. The rules and template
+    are sent separately as the cached GENERATE_SYSTEM_PROMPT.
+    """
+    return generate_user_prompt(context)
 
 
+@traced_handler
 def lambda_handler(event, context):
     """
     Generate C4 diagram from input text
@@ -85,7 +48,8 @@ def lambda_handler(event, context):
     Returns:
     {
         "mermaid_code": "string",
-        "validation": {...}
+        "validation": {...},
+        "metadata": {"model": "string", "routing": {...}}
     }
     """
     try:
@@ -94,7 +58,8 @@ def lambda_handler(event, context):
         input_text = body.get('input_text', '')
         
         # Validate input
-        validation = validate_input(input_text)
+        with span('validate'):
+            validation = validate_input(input_text)
         
         if not validation.is_valid:
             return {
@@ -113,18 +78,28 @@ def lambda_handler(event, context):
                 })
             }
         
+        # Route simple inputs to the fast model, complex ones to the large model
+        with span('route'):
+            routing = model_router.route(extract_signals(input_text, validation, body.get('diagram_type')))
+        print(f"[ROUTING] {routing.model} ({', '.join(routing.reasons)})")
+        
         # Generate diagram using Bedrock
-        bedrock = BedrockClient()
+        bedrock = BedrockClient(model_id=routing.model)
         prompt = build_prompt(input_text)
         
-        mermaid_code = bedrock.invoke_claude(prompt, max_tokens=2000)
+        start = time.perf_counter()
+        mermaid_code = bedrock.invoke_claude(
+            prompt,
+            max_tokens=2000,
+            system=GENERATE_SYSTEM_PROMPT,
+            cache_system=True
+        )
+        model_router.record(routing.model, time.perf_counter() - start, bedrock.last_usage)
+        print(f"[ROUTING] stats {json.dumps(model_router.stats()['models'])}")
         
-        # Clean up the response - remove markdown code blocks if present
-        mermaid_code = mermaid_code.replace("```mermaid\n", "")
-        mermaid_code = mermaid_code.replace("```mermaid", "")
-        mermaid_code = mermaid_code.replace("```\n", "")
-        mermaid_code = mermaid_code.replace("```", "")
-        mermaid_code = mermaid_code.strip()
+        # Clean up the response - strip markdown code blocks and fix reserved node IDs
+        with span('sanitize'):
+            mermaid_code = sanitize_mermaid(mermaid_code)
         
         # Return response
         return {
@@ -137,7 +112,11 @@ def lambda_handler(event, context):
             },
             'body': json.dumps({
                 'mermaid_code': mermaid_code,
-                'validation': validation.dict()
+                'validation': validation.dict(),
+                'metadata': {
+                    'model': routing.model,
+                    'routing': routing.metadata()
+                }
             })
         }
         
@@ -9,8 +9,16 @@ import sys
 sys.path.insert(0, '/opt/python')
 
 from common.bedrock_client import BedrockClient
+from common.refine_engine import refine_engine
+from common.structured_output import REFINEMENT_TOOL
+from common.prompts import REFINE_SYSTEM_PROMPT, refine_user_prompt
+from common.tracing import setup_tracing, span, traced_handler
 
+# Spans export per TRACING_EXPORTER (e.g. 'console' -> CloudWatch); Server-Timing is always set
+setup_tracing('c4-refine')
 
+
+@traced_handler
 def lambda_handler(event, context):
     """
     Refine existing diagram based on user instructions
@@ -49,57 +57,36 @@ def lambda_handler(event, context):
                 })
             }
         
+        # Simple edits (remove/rename/connect/direction/restyle) skip Bedrock
+        with span('refine_local'):
+            local_result = refine_engine.try_refine(current_mermaid, refinement_instruction)
+        refine_engine.record(served_locally=local_result is not None)
+        if local_result is not None:
+            print(f"[REFINE] Served locally: {json.dumps(refine_engine.stats())}")
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'POST,OPTIONS'
+                },
+                'body': json.dumps(local_result)
+            }
+        
         # Generate refinement using Bedrock
         bedrock = BedrockClient()
         
-        prompt = f"""You are an expert at modifying Mermaid C4 diagrams based on user instructions.
-
-CURRENT DIAGRAM:
-```
-{current_mermaid}
-```
-
-ORIGINAL CONTEXT:
-{original_context}
-
-USER'S REFINEMENT REQUEST:
-"{refinement_instruction}"
-
-Your task:
-1. Understand what the user wants to change
-2. Modify the Mermaid diagram accordingly
-3. Maintain proper Mermaid syntax
-4. Keep the diagram clean and legible
-
-CRITICAL RULES:
-- Use standard Mermaid flowchart syntax (graph LR or graph TD)
-- Node IDs must be alphanumeric (no spaces, no special chars)
-- NEVER use reserved words as node IDs: "system", "application", "graph", "class", "end"
-- Keep labels SHORT and clear
-- Maintain consistent styling with classDef
-- Use icons: 👤 for users, 🔷 for systems, 📦 for external systems, 💾 for databases
-
-Common modifications:
-- REMOVE: Delete specified nodes and their connections
-- ADD: Insert new nodes with appropriate connections
-- EDIT LABEL: Change the text inside brackets [...]
-- REPOSITION: Adjust node order (left/right in LR, top/bottom in TD)
-- SIMPLIFY: Remove unnecessary details or nodes
-- ENHANCE: Add more detail or connections
-
-Format your response as JSON:
-{{
-  "updated_mermaid": "Complete updated Mermaid code",
-  "changes_made": ["List of changes", "Another change"],
-  "explanation": "Brief explanation of what was modified and why"
-}}
-
-Return ONLY the JSON, no markdown code blocks."""
-        
-        response_text = bedrock.invoke_claude(prompt, max_tokens=2000)
+        prompt = refine_user_prompt(current_mermaid, original_context, refinement_instruction)
         
-        # Parse JSON response
-        response_data = json.loads(response_text)
+        # Schema-constrained output, with JSON in the text as a fallback
+        response_data = bedrock.invoke_structured(
+            prompt,
+            REFINEMENT_TOOL,
+            max_tokens=2000,
+            system=REFINE_SYSTEM_PROMPT,
+            cache_system=True
+        )
         
         # Return response
         return {
@@ -10,8 +10,42 @@ sys.path.insert(0, '/opt/python')
 
 from common.bedrock_client import BedrockClient
 from common.validation import validate_input
+from common.prompts import (
+    SUGGEST_SYSTEM_PROMPT, SUGGEST_ONE_SYSTEM_PROMPT, SUGGESTION_ANGLES,
+    suggest_user_prompt, suggest_angle_user_prompt
+)
+from common.structured_output import SUGGESTION_TOOL, SUGGESTIONS_TOOL
+from common.suggestion_fanout import fan_out_threads, normalize_suggestion
+from common.tracing import setup_tracing, span, traced_handler
 
+# Spans export per TRACING_EXPORTER (e.g. 'console' -> CloudWatch); Server-Timing is always set
+setup_tracing('c4-suggest')
 
+# 'single': one completion with every suggestion; 'fanout': one small completion
+# per interpretation angle in parallel, returning the first SUGGEST_COUNT
+SUGGEST_MODE = os.getenv('SUGGEST_MODE', 'single').lower()
+SUGGEST_COUNT = int(os.getenv('SUGGEST_COUNT', '3'))
+SUGGEST_FANOUT_MAX_TOKENS = int(os.getenv('SUGGEST_FANOUT_MAX_TOKENS', '600'))
+
+
+def fan_out_suggestions(bedrock: BedrockClient, input_text: str, issues: list) -> tuple:
+    """
+    One Bedrock call per interpretation angle on a thread pool; returns the
+    first SUGGEST_COUNT suggestions and the fan-out timings.
+    """
+    def suggest_from(angle: str):
+        return normalize_suggestion(bedrock.invoke_structured(
+            suggest_angle_user_prompt(input_text, issues, angle),
+            SUGGESTION_TOOL,
+            max_tokens=SUGGEST_FANOUT_MAX_TOKENS,
+            system=SUGGEST_ONE_SYSTEM_PROMPT,
+            cache_system=True
+        ))
+    
+    return fan_out_threads(suggest_from, SUGGESTION_ANGLES, SUGGEST_COUNT)
+
+
+@traced_handler
 def lambda_handler(event, context):
     """
     Generate improvement suggestions for incomplete input
@@ -31,7 +65,8 @@ def lambda_handler(event, context):
                 "description": "string",
                 "improved_text": "string"
             }
-        ]
+        ],
+        "metadata": {"mode": "fanout", "timings": {...}}  (fan-out mode only)
     }
     """
     try:
@@ -40,7 +75,8 @@ def lambda_handler(event, context):
         input_text = body.get('input_text', '')
         
         # Validate input
-        validation = validate_input(input_text)
+        with span('validate'):
+            validation = validate_input(input_text)
         
         # If already valid, no need for suggestions
         if validation.is_valid:
@@ -72,47 +108,29 @@ def lambda_handler(event, context):
         
         # Generate suggestions using Bedrock
         bedrock = BedrockClient()
+        issues = validation.errors + validation.questions
         
-        prompt = f"""You are an expert at translating business/technical descriptions into C4 Context diagram requirements.
-
-A user provided this description:
-"{input_text}"
-
-This description has validation issues:
-{', '.join(validation.errors + validation.questions)}
-
-For C4 Level 1 (Context) diagrams, we need:
-1. THE SYSTEM being built (what software/service)
-2. USERS/ACTORS (who uses it)
-3. FUNCTIONALITY (what does it do)
-4. EXTERNAL SYSTEMS (what does it integrate with)
-
-Based on the user's description, generate 3 different interpretations that would be suitable for C4 diagrams. Each should be a complete, clear description (50-100 words) that includes all 4 required elements.
-
-Format your response as JSON:
-{{
-  "suggestions": [
-    {{
-      "title": "Brief title (5-7 words)",
-      "description": "One sentence explaining this interpretation",
-      "improved_text": "Complete description with system, users, functionality, and external systems"
-    }},
-    ... (2 more suggestions)
-  ]
-}}
-
-Make the suggestions diverse - consider different angles like:
-- Enforcement/prevention system
-- Monitoring/auditing tool
-- Automation/provisioning service
-- Governance/compliance platform
-
-Return ONLY the JSON, no other text."""
-        
-        response_text = bedrock.invoke_claude(prompt, max_tokens=2000)
-        
-        # Parse JSON response
-        response_data = json.loads(response_text)
+        result = {
+            'original_text': input_text,
+            'validation_issues': issues
+        }
+        if SUGGEST_MODE == 'fanout':
+            with span('suggest_fanout'):
+                suggestions, timings = fan_out_suggestions(bedrock, input_text, issues)
+            if not suggestions:
+                raise Exception('No suggestion call succeeded')
+            result['suggestions'] = suggestions
+            result['metadata'] = {'mode': 'fanout', 'timings': timings}
+        else:
+            # Schema-constrained output, with JSON in the text as a fallback
+            response_data = bedrock.invoke_structured(
+                suggest_user_prompt(input_text, issues),
+                SUGGESTIONS_TOOL,
+                max_tokens=2000,
+                system=SUGGEST_SYSTEM_PROMPT,
+                cache_system=True
+            )
+            result['suggestions'] = response_data.get('suggestions', [])
         
         # Return response
         return {
@@ -123,11 +141,7 @@ Return ONLY the JSON, no other text."""
                 'Access-Control-Allow-Headers': 'Content-Type',
                 'Access-Control-Allow-Methods': 'POST,OPTIONS'
             },
-            'body': json.dumps({
-                'original_text': input_text,
-                'validation_issues': validation.errors + validation.questions,
-                'suggestions': response_data.get('suggestions', [])
-            })
+            'body': json.dumps(result)
         }
         
     except Exception as e:
@@ -9,8 +9,13 @@ import sys
 sys.path.insert(0, '/opt/python')
 
 from common.validation import validate_input, ValidationResult
+from common.tracing import setup_tracing, span, traced_handler
 
+# Spans export per TRACING_EXPORTER (e.g. 'console' -> CloudWatch); Server-Timing is always set
+setup_tracing('c4-validate')
 
+
+@traced_handler
 def lambda_handler(event, context):
     """
     Validate input for C4 diagram generation
@@ -35,7 +40,8 @@ def lambda_handler(event, context):
         input_text = body.get('input_text', '')
         
         # Validate
-        result = validate_input(input_text)
+        with span('validate'):
+            result = validate_input(input_text)
         
         # Return response
         return {
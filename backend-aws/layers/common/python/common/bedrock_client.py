@@ -1,27 +1,195 @@
 """
 AWS Bedrock client wrapper for Claude API calls
+
+Calls go through a per-container ProviderPool (common.llm_provider): Bedrock
+first, and the Anthropic API when Bedrock throttles, fails or its circuit
+is open, if LLM_PROVIDERS lists 'anthropic' and ANTHROPIC_API_KEY is set.
 """
 import boto3
 import json
 import os
-from typing import Dict, Any, List
+import time
+from typing import Dict, Any, List, Union
+
+from .hedging import Attempt, Hedger, HedgePolicy
+from .llm_provider import CircuitBreaker, Provider, ProviderPool, build_providers
+from .pricing import CURRENT_PRICE_VERSION, cost_usd
+from .prompts import system_blocks
+from .structured_output import StructuredOutputError, extract_structured, tool_choice
+from .tracing import set_attributes, span
+
+DEFAULT_MODEL_ID = 'anthropic.claude-3-5-sonnet-20240620-v1:0'
+
+# Token counts Bedrock reports for Anthropic models
+USAGE_FIELDS = (
+    'input_tokens',
+    'output_tokens',
+    'cache_read_input_tokens',
+    'cache_creation_input_tokens',
+)
+
+# Per container, so first-token deadlines and the hedge budget span warm
+# invocations; enabled with LLM_HEDGING (set on the generate function)
+hedger = Hedger(HedgePolicy.from_env())
+
+
+def _build_providers() -> List[Provider]:
+    """Providers in LLM_PROVIDERS order; 'bedrock' calls go through BedrockClient itself"""
+    threshold = int(os.getenv('LLM_CIRCUIT_FAILURE_THRESHOLD', '5'))
+    reset_timeout = float(os.getenv('LLM_CIRCUIT_RESET_SECONDS', '30'))
+    providers = []
+    for name in [name.strip() for name in os.getenv('LLM_PROVIDERS', 'bedrock').split(',') if name.strip()]:
+        if name == 'bedrock':
+            providers.append(Provider(name, breaker=CircuitBreaker(threshold, reset_timeout)))
+        else:
+            providers += build_providers(
+                [name],
+                anthropic_api_key=os.getenv('ANTHROPIC_API_KEY'),
+                failure_threshold=threshold,
+                reset_timeout=reset_timeout
+            )
+    return providers
+
+
+def _log_provider_call(provider: Provider, outcome: str, seconds, error):
+    # One JSON line per attempt; per-provider error rate and latency with
+    # CloudWatch Logs Insights
+    record = {
+        'function': os.getenv('AWS_LAMBDA_FUNCTION_NAME'),
+        'provider': provider.name,
+        'outcome': outcome,
+        'latency_ms': round(seconds * 1000, 1) if seconds is not None else None,
+        'circuit': provider.breaker.state,
+        'error': type(error).__name__ if error is not None else None
+    }
+    print(f"[PROVIDER] call {json.dumps(record)}")
+
+
+# Per container, so circuit state carries across warm invocations
+providers = ProviderPool(_build_providers(), observer=_log_provider_call)
 
 
 class BedrockClient:
     """Wrapper for AWS Bedrock Claude API calls"""
     
-    def __init__(self, region: str = None):
+    def __init__(self, region: str = None, model_id: str = None):
         self.region = region or os.getenv('BEDROCK_REGION', 'us-east-1')
-        self.client = boto3.client('bedrock-runtime', region_name=self.region)
-        # Using Claude 3.5 Sonnet for better quality outputs
-        self.model_id = 'anthropic.claude-3-5-sonnet-20240620-v1:0'
+        # BEDROCK_ENDPOINT_URL points at a local fake runtime (backend/loadtest)
+        self.client = boto3.client(
+            'bedrock-runtime',
+            region_name=self.region,
+            endpoint_url=os.getenv('BEDROCK_ENDPOINT_URL') or None
+        )
+        # Using Claude 3.5 Sonnet for better quality outputs unless the caller
+        # routes to another model
+        self.model_id = model_id or os.getenv('BEDROCK_MODEL_ID', DEFAULT_MODEL_ID)
+        # Mark system prompts with cache_control; disable for models without
+        # prompt caching support on Bedrock
+        self.prompt_caching = os.getenv('BEDROCK_PROMPT_CACHING', 'true').lower() == 'true'
+        self.last_usage: Dict[str, int] = {}
+        self.last_latency_ms = 0.0
+        self.last_provider = None
+    
+    def _system_blocks(self, system: Union[str, List[Dict[str, Any]]], cache_system: bool):
+        """Task system prompt after the shared guide, with a cache breakpoint if requested"""
+        if not isinstance(system, str):
+            return system
+        return system_blocks(system, cache=cache_system and self.prompt_caching)
+    
+    def _invoke(self, body: Dict[str, Any]) -> str:
+        return self._invoke_message(body)['content'][0]['text']
+    
+    def _invoke_message(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        with span('bedrock.invoke_model', **{'llm.system': 'aws.bedrock', 'llm.model': self.model_id}) as current:
+            response_body = providers.call_sync(
+                lambda provider, model_id: self._send(provider, model_id, body),
+                self.model_id
+            )
+            self.last_latency_ms = (time.perf_counter() - start) * 1000
+            usage = response_body.get('usage') or {}
+            self.last_usage = {field: usage.get(field) or 0 for field in USAGE_FIELDS}
+            set_attributes(current, **{
+                'llm.provider': self.last_provider,
+                **{f'llm.usage.{field}': value for field, value in self.last_usage.items()}
+            })
+        # One JSON line per call, aggregated per model and function with
+        # CloudWatch Logs Insights
+        record = {
+            'function': os.getenv('AWS_LAMBDA_FUNCTION_NAME'),
+            'model': self.model_id,
+            'provider': self.last_provider,
+            'latency_ms': round(self.last_latency_ms, 1),
+            **self.last_usage,
+            'cost_usd': cost_usd(self.model_id, self.last_usage),
+            'price_version': CURRENT_PRICE_VERSION
+        }
+        print(f"[BEDROCK] usage {json.dumps(record)}")
+        return response_body
+    
+    def _send(self, provider: Provider, model_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """One attempt on `provider`, returning a Bedrock-style response body"""
+        self.last_provider = provider.name
+        if provider.name == 'anthropic':
+            params = {key: value for key, value in body.items() if key != 'anthropic_version'}
+            return provider.client.messages.create(model=model_id, **params).model_dump()
+        if hedger.policy.enabled:
+            return hedger.run_threads(lambda attempt: self._stream_message(body, model_id, attempt), key=model_id)
+        response = self.client.invoke_model(
+            modelId=model_id,
+            body=json.dumps(body)
+        )
+        return json.loads(response['body'].read())
+    
+    def _stream_message(self, body: Dict[str, Any], model_id: str, attempt: Attempt) -> Dict[str, Any]:
+        """
+        invoke_model through the response stream, so the hedger sees the
+        first token, reassembled into the same response body. Stops reading
+        when the attempt loses.
+        """
+        response = self.client.invoke_model_with_response_stream(
+            modelId=model_id,
+            body=json.dumps(body)
+        )
+        stream = response['body']
+        message: Dict[str, Any] = {}
+        blocks: List[Dict[str, Any]] = []
+        partial_json: Dict[int, str] = {}
+        try:
+            for event in stream:
+                if attempt.cancelled:
+                    raise RuntimeError('Hedged attempt abandoned')
+                chunk = json.loads(event['chunk']['bytes'])
+                kind = chunk['type']
+                if kind == 'message_start':
+                    message = chunk['message']
+                elif kind == 'content_block_start':
+                    blocks.append(dict(chunk['content_block']))
+                elif kind == 'content_block_delta':
+                    attempt.first_token()
+                    delta = chunk['delta']
+                    if delta['type'] == 'input_json_delta':
+                        partial_json[chunk['index']] = partial_json.get(chunk['index'], '') + delta['partial_json']
+                    else:
+                        blocks[chunk['index']]['text'] += delta.get('text', '')
+                elif kind == 'message_delta':
+                    message.update(chunk['delta'])
+                    message.setdefault('usage', {}).update(chunk.get('usage') or {})
+        finally:
+            stream.close()
+        
+        for index, text in partial_json.items():
+            blocks[index]['input'] = json.loads(text) if text else {}
+        message['content'] = blocks
+        return message
     
     def invoke_claude(
         self,
         prompt: str,
         max_tokens: int = 2000,
         temperature: float = 1.0,
-        system: str = None
+        system: str = None,
+        cache_system: bool = False
     ) -> str:
         """
         Invoke Claude model via Bedrock
@@ -31,6 +199,7 @@ class BedrockClient:
             max_tokens: Maximum tokens to generate
             temperature: Sampling temperature
             system: System prompt (optional)
+            cache_system: Cache the system prompt across calls (prompt caching)
         
         Returns:
             Generated text response
@@ -45,16 +214,10 @@ class BedrockClient:
         }
         
         if system:
-            body["system"] = system
+            body["system"] = self._system_blocks(system, cache_system)
         
         try:
-            response = self.client.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps(body)
-            )
-            
-            response_body = json.loads(response['body'].read())
-            return response_body['content'][0]['text']
+            return self._invoke(body)
             
         except Exception as e:
             print(f"Error invoking Bedrock: {str(e)}")
@@ -65,7 +228,8 @@ class BedrockClient:
         messages: List[Dict[str, str]],
         max_tokens: int = 2000,
         temperature: float = 1.0,
-        system: str = None
+        system: str = None,
+        cache_system: bool = False
     ) -> str:
         """
         Invoke Claude with full message history
@@ -75,6 +239,7 @@ class BedrockClient:
             max_tokens: Maximum tokens to generate
             temperature: Sampling temperature
             system: System prompt (optional)
+            cache_system: Cache the system prompt across calls (prompt caching)
         
         Returns:
             Generated text response
@@ -87,17 +252,61 @@ class BedrockClient:
         }
         
         if system:
-            body["system"] = system
+            body["system"] = self._system_blocks(system, cache_system)
         
         try:
-            response = self.client.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps(body)
-            )
-            
-            response_body = json.loads(response['body'].read())
-            return response_body['content'][0]['text']
+            return self._invoke(body)
             
         except Exception as e:
             print(f"Error invoking Bedrock: {str(e)}")
             raise
+    
+    def invoke_structured(
+        self,
+        prompt: str,
+        tool: Dict[str, Any],
+        max_tokens: int = 2000,
+        temperature: float = 1.0,
+        system: str = None,
+        cache_system: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Invoke Claude with its answer constrained to a tool's input schema
+        (see common.structured_output)
+        
+        Args:
+            prompt: User prompt
+            tool: Tool definition whose input_schema is the response format
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+            system: System prompt (optional)
+            cache_system: Cache the system prompt across calls (prompt caching)
+        
+        Returns:
+            The tool input, or JSON found in the text if Claude did not call the tool
+        """
+        body = {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": [{"role": "user", "content": prompt}],
+            "tools": [tool],
+            "tool_choice": tool_choice(tool)
+        }
+        
+        if system:
+            body["system"] = self._system_blocks(system, cache_system)
+        
+        try:
+            response_body = self._invoke_message(body)
+        except Exception as e:
+            print(f"Error invoking Bedrock: {str(e)}")
+            raise
+        
+        data, source = extract_structured(response_body.get('content'), tool)
+        # Count with CloudWatch Logs Insights; 'failed' is a wasted call
+        record = {'function': os.getenv('AWS_LAMBDA_FUNCTION_NAME'), 'tool': tool['name'], 'source': source}
+        print(f"[BEDROCK] structured_output {json.dumps(record)}")
+        if data is None:
+            raise StructuredOutputError(f"No {tool['name']} input in the response")
+        return data
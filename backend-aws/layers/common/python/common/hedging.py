@@ -0,0 +1,266 @@
+"""
+Hedged LLM requests.
+
+A small share of Claude calls take several times longer than usual before
+the first token arrives, and they set the p99 of /api/diagrams/generate.
+A Hedger starts the call, and if no first token has arrived by a deadline
+(a percentile of recent time-to-first-token, clamped to a range) it sends
+one identical second request, keeps whichever finishes first and cancels
+the other.
+
+Extra load is capped by a HedgeBudget: every primary request earns
+`budget_percent / 100` of a hedge and a hedge spends one, so hedges never
+exceed that share of requests, even when the upstream is slow for
+everyone (which is exactly when hedging would otherwise double the load).
+
+run() is for asyncio callers (FastAPI), run_threads() for the synchronous
+Lambda handlers, where a losing attempt cannot be interrupted and is told
+to stop through Attempt.cancelled instead. This module has no application
+imports so the Lambda layer ships the same file (common/hedging.py).
+
+    async def call(attempt: Attempt):
+        async with client.messages.stream(...) as stream:
+            async for event in stream:
+                attempt.first_token()
+                ...
+    message = await hedger.run(call, key=model)
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Dict, Mapping, Optional, TypeVar
+
+T = TypeVar('T')
+
+# Time-to-first-token samples kept per key for the deadline percentile
+LATENCY_WINDOW = 200
+# A budget never saves up more than this many hedges for a burst of slow calls
+MAX_SAVED_HEDGES = 10.0
+HEDGE_OUTCOMES = ('not_needed', 'primary_won', 'hedge_won', 'budget_denied')
+
+
+@dataclass
+class HedgePolicy:
+    enabled: bool = False
+    percentile: float = 95.0  # Hedge once the first token is later than this share of recent calls
+    min_delay_ms: float = 500.0
+    max_delay_ms: float = 10000.0  # Also the deadline until min_samples have been seen
+    min_samples: int = 20
+    budget_percent: float = 5.0  # Hedges as a share of requests, at most
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] = os.environ) -> 'HedgePolicy':
+        """Policy from LLM_HEDGE_* environment variables"""
+        return cls(
+            enabled=environ.get('LLM_HEDGING', 'false').lower() == 'true',
+            percentile=float(environ.get('LLM_HEDGE_PERCENTILE', 95.0)),
+            min_delay_ms=float(environ.get('LLM_HEDGE_MIN_DELAY_MS', 500.0)),
+            max_delay_ms=float(environ.get('LLM_HEDGE_MAX_DELAY_MS', 10000.0)),
+            min_samples=int(environ.get('LLM_HEDGE_MIN_SAMPLES', 20)),
+            budget_percent=float(environ.get('LLM_HEDGE_BUDGET_PERCENT', 5.0))
+        )
+
+
+def _percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class HedgeBudget:
+    """Token bucket allowing hedges for at most `percent` of requests"""
+
+    def __init__(self, percent: float):
+        self.ratio = max(0.0, percent) / 100
+        self._lock = threading.Lock()
+        self._credit = 0.0
+
+    def earn(self):
+        with self._lock:
+            self._credit = min(MAX_SAVED_HEDGES, self._credit + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._credit < 1.0:
+                return False
+            self._credit -= 1.0
+            return True
+
+
+class Attempt:
+    """
+    One of the (at most two) identical requests. The call reports its
+    first token through first_token(); a thread-based call should stop
+    reading once `cancelled` is set.
+    """
+
+    def __init__(self, hedger: 'Hedger', key: str, index: int, event):
+        self.hedger = hedger
+        self.key = key
+        self.index = index  # 0 for the primary, 1 for the hedge
+        self.started = time.perf_counter()
+        self.cancelled = False
+        self._event = event  # asyncio.Event or threading.Event
+
+    @property
+    def is_hedge(self) -> bool:
+        return self.index == 1
+
+    def first_token(self):
+        """Mark the first token; only the first call counts"""
+        if not self._event.is_set():
+            self._event.set()
+            self.hedger.observe(self.key, time.perf_counter() - self.started)
+
+
+async def _run_attempt(call: Callable[[Attempt], Awaitable[T]], attempt: Attempt) -> T:
+    result = await call(attempt)
+    # A call that does not stream counts its whole duration as the first token
+    attempt.first_token()
+    return result
+
+
+def _run_attempt_sync(call: Callable[[Attempt], T], attempt: Attempt) -> T:
+    result = call(attempt)
+    attempt.first_token()
+    return result
+
+
+class Hedger:
+    """
+    Hedges calls per `policy`. Deadlines are learned per key (the model, so
+    the fast and large models each get their own), the budget is shared.
+    """
+
+    def __init__(self, policy: HedgePolicy):
+        self.policy = policy
+        self.budget = HedgeBudget(policy.budget_percent)
+        self._lock = threading.Lock()
+        self._first_token: Dict[str, deque] = {}
+        self.outcomes = {outcome: 0 for outcome in HEDGE_OUTCOMES}
+
+    def observe(self, key: str, seconds: float):
+        with self._lock:
+            self._first_token.setdefault(key, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def deadline(self, key: str) -> float:
+        """Seconds to wait for the primary's first token before hedging"""
+        policy = self.policy
+        with self._lock:
+            samples = list(self._first_token.get(key, ()))
+        if len(samples) < policy.min_samples:
+            return policy.max_delay_ms / 1000
+        delay_ms = _percentile(samples, policy.percentile) * 1000
+        return min(policy.max_delay_ms, max(policy.min_delay_ms, delay_ms)) / 1000
+
+    def _record(self, outcome: str):
+        with self._lock:
+            self.outcomes[outcome] += 1
+        if outcome in ('hedge_won', 'budget_denied'):
+            print(f"[HEDGE] {outcome}")
+
+    async def run(self, call: Callable[[Attempt], Awaitable[T]], key: str = 'default') -> T:
+        """
+        Await `call(attempt)`, starting an identical hedge if the primary has
+        no first token by the deadline. Returns the first successful result;
+        raises the last error if both attempts fail.
+        """
+        if not self.policy.enabled:
+            return await _run_attempt(call, Attempt(self, key, 0, asyncio.Event()))
+
+        self.budget.earn()
+        primary = Attempt(self, key, 0, asyncio.Event())
+        tasks = {asyncio.ensure_future(_run_attempt(call, primary))}
+        first_token = asyncio.ensure_future(primary._event.wait())
+        try:
+            await asyncio.wait(tasks | {first_token}, timeout=self.deadline(key), return_when=asyncio.FIRST_COMPLETED)
+            first_token.cancel()
+            primary_task = next(iter(tasks))
+            if primary_task.done() or primary._event.is_set():
+                self._record('not_needed')
+                return await primary_task
+            if not self.budget.try_spend():
+                self._record('budget_denied')
+                return await primary_task
+
+            tasks.add(asyncio.ensure_future(_run_attempt(call, Attempt(self, key, 1, asyncio.Event()))))
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._record('primary_won' if task is primary_task else 'hedge_won')
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            first_token.cancel()
+            for task in tasks:
+                task.cancel()
+
+    def run_threads(self, call: Callable[[Attempt], T], key: str = 'default') -> T:
+        """
+        Thread version of run() for synchronous callers. The losing attempt
+        is abandoned with `cancelled` set rather than awaited.
+        """
+        if not self.policy.enabled:
+            return _run_attempt_sync(call, Attempt(self, key, 0, threading.Event()))
+
+        self.budget.earn()
+        executor = ThreadPoolExecutor(max_workers=2)
+        primary = Attempt(self, key, 0, threading.Event())
+        attempts = [primary]
+        # Each thread runs in a copy of the caller's context so spans nest under the caller's
+        futures = {executor.submit(contextvars.copy_context().run, _run_attempt_sync, call, primary): primary}
+        try:
+            deadline = time.monotonic() + self.deadline(key)
+            primary_future = next(iter(futures))
+            # Wake up when the primary's first token arrives or the call fails
+            while not primary._event.is_set() and not primary_future.done():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                primary._event.wait(min(remaining, 0.05))
+            if primary_future.done() or primary._event.is_set():
+                self._record('not_needed')
+                return primary_future.result()
+            if not self.budget.try_spend():
+                self._record('budget_denied')
+                return primary_future.result()
+
+            hedge = Attempt(self, key, 1, threading.Event())
+            attempts.append(hedge)
+            futures[executor.submit(contextvars.copy_context().run, _run_attempt_sync, call, hedge)] = hedge
+            error: Optional[BaseException] = None
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        self._record('hedge_won' if futures[future].is_hedge else 'primary_won')
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            for attempt in attempts:
+                attempt.cancelled = True
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            keys = {key: list(samples) for key, samples in self._first_token.items()}
+            outcomes = dict(self.outcomes)
+        return {
+            'policy': asdict(self.policy),
+            'outcomes': outcomes,
+            'deadline_ms': {key: round(self.deadline(key) * 1000, 1) for key in keys},
+            'first_token_ms': {
+                key: {'p50': round(_percentile(samples, 50) * 1000, 1), 'p95': round(_percentile(samples, 95) * 1000, 1)}
+                for key, samples in keys.items() if samples
+            },
+        }
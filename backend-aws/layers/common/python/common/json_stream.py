@@ -0,0 +1,164 @@
+"""
+Incremental JSON extraction from streamed LLM output.
+
+The suggest and refine prompts ask for a single JSON object. Fed the text
+deltas of a streamed completion, JSONStreamParser reports each value at a
+watched path as soon as it closes (every `suggestions[i]` object, or the
+`updated_mermaid` string), instead of waiting for the full body. Anything
+before the first `{` (prose, a ```json fence) and after the object closes
+is ignored. The Lambda layer ships the same file (common/json_stream.py)
+for the tolerant parse_json_object.
+
+    parser = JSONStreamParser([('suggestions', '*')])
+    for delta in text_stream:
+        for path, value in parser.feed(delta):
+            ...  # ('suggestions', 0), {...}
+    result = parser.result()
+"""
+import json
+import re
+from typing import Any, List, Optional, Sequence, Tuple
+
+Path = Tuple[Any, ...]
+WILDCARD = '*'
+
+_WHITESPACE = ' \t\r\n'
+# Characters that can end or escape inside a string; everything else is skipped in one step
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+def _matches(path: Path, pattern: Path) -> bool:
+    return len(path) == len(pattern) and all(
+        expected == WILDCARD or expected == actual for actual, expected in zip(path, pattern)
+    )
+
+
+class _Container:
+    __slots__ = ('kind', 'path', 'start', 'key', 'index', 'expect_key')
+
+    def __init__(self, kind: str, path: Path, start: int):
+        self.kind = kind  # 'object' or 'array'
+        self.path = path
+        self.start = start
+        self.key: Optional[str] = None
+        self.index = 0
+        self.expect_key = kind == 'object'
+
+    def child_path(self) -> Path:
+        return self.path + ((self.key,) if self.kind == 'object' else (self.index,))
+
+
+class JSONStreamParser:
+    """
+    Scans streamed text once, tracking the JSON path of every value, and
+    decodes only values whose path matches one of `watch` (tuples of keys
+    and indexes, '*' matching any key or index).
+    """
+
+    def __init__(self, watch: Sequence[Path] = ()):
+        self.watch = [tuple(pattern) for pattern in watch]
+        self._buffer = ''
+        self._position = 0
+        self._stack: List[_Container] = []
+        self._root_start: Optional[int] = None
+        self._root_end: Optional[int] = None
+        # Current string or primitive: (start, path, is_key)
+        self._scalar: Optional[Tuple[int, Path, bool]] = None
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def done(self) -> bool:
+        """True once the top-level object has closed"""
+        return self._root_end is not None
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        """Consume the next piece of text; returns the watched values it completed"""
+        if self.done or not chunk:
+            return []
+        self._buffer += chunk
+        completed: List[Tuple[Path, Any]] = []
+        buffer = self._buffer
+
+        while self._position < len(buffer) and not self.done:
+            position = self._position
+            char = buffer[position]
+            self._position += 1
+
+            if self._root_start is None:
+                if char == '{':
+                    self._root_start = position
+                    self._stack.append(_Container('object', (), position))
+                continue
+
+            if self._in_string:
+                if not self._escaped and char not in '"\\':
+                    special = _STRING_SPECIAL.search(buffer, position)
+                    self._position = special.start() if special else len(buffer)
+                    continue
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    self._end_scalar(position + 1, completed)
+                continue
+
+            if self._scalar is not None and (char in _WHITESPACE or char in ',}]'):
+                self._end_scalar(position, completed)
+
+            container = self._stack[-1]
+            if char in _WHITESPACE:
+                continue
+            if char == '"':
+                self._in_string = True
+                is_key = container.kind == 'object' and container.expect_key
+                self._scalar = (position, container.path if is_key else container.child_path(), is_key)
+            elif char in '{[':
+                self._stack.append(_Container('object' if char == '{' else 'array', container.child_path(), position))
+            elif char in '}]':
+                closed = self._stack.pop()
+                self._complete(closed.path, closed.start, position + 1, completed)
+                if not self._stack:
+                    self._root_end = position + 1
+            elif char == ':':
+                container.expect_key = False
+            elif char == ',':
+                if container.kind == 'object':
+                    container.expect_key = True
+                else:
+                    container.index += 1
+            elif self._scalar is None:
+                # Number, true, false or null
+                self._scalar = (position, container.child_path(), False)
+
+        return completed
+
+    def _end_scalar(self, end: int, completed: List[Tuple[Path, Any]]):
+        start, path, is_key = self._scalar
+        self._scalar = None
+        if is_key:
+            self._stack[-1].key = json.loads(self._buffer[start:end])
+        else:
+            self._complete(path, start, end, completed)
+
+    def _complete(self, path: Path, start: int, end: int, completed: List[Tuple[Path, Any]]):
+        if any(_matches(path, pattern) for pattern in self.watch):
+            completed.append((path, json.loads(self._buffer[start:end])))
+
+    def result(self) -> Any:
+        """The complete top-level object; ValueError if it never closed"""
+        if not self.done:
+            raise ValueError('Incomplete JSON object in response')
+        return json.loads(self._buffer[self._root_start:self._root_end])
+
+
+def parse_json_object(text: str) -> Any:
+    """
+    The first top-level JSON object in a completion, ignoring leading prose,
+    code fences and anything after the object. Raises ValueError.
+    """
+    parser = JSONStreamParser()
+    parser.feed(text)
+    return parser.result()
@@ -0,0 +1,369 @@
+"""
+LLM providers with health tracking, circuit breaking and failover.
+
+Claude is reachable through the Anthropic API and through Bedrock. A
+ProviderPool holds both in preference order, each behind a CircuitBreaker:
+a call goes to the first provider whose circuit is closed, and a throttled,
+overloaded, timed-out or 5xx call is retried on the next one. After
+`failure_threshold` consecutive such failures a provider's circuit opens and
+it receives no traffic for `reset_timeout` seconds, then one probe call
+decides whether it closes again. Client errors (bad request, auth) are
+returned as they are: the next provider would fail the same way.
+
+Models are named by their Anthropic API ID everywhere (routing, usage,
+pricing) and mapped per provider with provider_model(), so a call keeps its
+model when it moves between providers.
+
+Both providers are driven through the anthropic SDK's messages API
+(Anthropic / AnthropicBedrock clients, sync and async), so call sites only
+swap the client. The Lambda layer ships the same file (common/llm_provider.py)
+and dispatches the 'bedrock' provider to BedrockClient instead.
+
+    message = await llm_providers.call(
+        lambda provider, model_id: provider.async_client.messages.create(model=model_id, ...),
+        model='claude-3-haiku-20240307'
+    )
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Iterator, List, Optional, Sequence, TypeVar
+
+try:
+    import anthropic
+except ImportError:  # The Lambda layer only needs it for the direct API fallback
+    anthropic = None
+
+T = TypeVar('T')
+
+PROVIDERS = ('anthropic', 'bedrock')
+# Per-call outcomes for metrics; circuit_open means the provider was skipped
+PROVIDER_OUTCOMES = ('success', 'client_error', 'retryable_error', 'circuit_open')
+
+# Anthropic API model ID -> Bedrock model ID
+BEDROCK_MODEL_IDS = {
+    'claude-3-haiku-20240307': 'anthropic.claude-3-haiku-20240307-v1:0',
+    'claude-3-5-haiku-20241022': 'anthropic.claude-3-5-haiku-20241022-v1:0',
+    'claude-3-5-sonnet-20240620': 'anthropic.claude-3-5-sonnet-20240620-v1:0',
+    'claude-3-5-sonnet-20241022': 'anthropic.claude-3-5-sonnet-20241022-v2:0',
+}
+_API_MODEL_IDS = {bedrock_id: api_id for api_id, bedrock_id in BEDROCK_MODEL_IDS.items()}
+
+# Latency samples kept per provider for percentiles
+LATENCY_WINDOW = 500
+
+# botocore error codes worth retrying on the other provider
+_RETRYABLE_AWS_CODES = (
+    'ThrottlingException', 'ServiceUnavailableException', 'InternalServerException',
+    'ModelTimeoutException', 'ModelNotReadyException', 'ServiceQuotaExceededException',
+)
+
+
+def canonical_model(model: str) -> str:
+    """The Anthropic API ID for a model named either way"""
+    return _API_MODEL_IDS.get(model, model)
+
+
+def provider_model(model: str, provider: str) -> str:
+    """The ID `provider` knows `model` by; unknown models pass through"""
+    model = canonical_model(model)
+    return BEDROCK_MODEL_IDS.get(model, model) if provider == 'bedrock' else model
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Whether a failure says the provider is unhealthy (throttling, overload,
+    timeouts, 5xx, connection errors) rather than the request being bad.
+    """
+    name = type(exc).__name__
+    status_code = getattr(exc, 'status_code', None)
+    response = getattr(exc, 'response', None)
+    error_code = response.get('Error', {}).get('Code', '') if isinstance(response, dict) else ''
+    if error_code:
+        return error_code in _RETRYABLE_AWS_CODES
+    if isinstance(status_code, int):
+        return status_code in (408, 429) or status_code >= 500
+    return any(marker in name for marker in ('Timeout', 'Connection', 'RateLimit', 'Overloaded', 'Throttl'))
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class NoProviderAvailable(Exception):
+    """Raised when every provider's circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures, stays open for
+    `reset_timeout` seconds, then lets a single probe call through
+    (half-open): success closes it, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self) -> bool:
+        """Whether a call may go to this provider now; claims the probe when half-open"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    self.opened += 1
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):
+        """
+        Give back a claimed probe without a verdict, for attempts that ended
+        without a result (cancelled, generator closed); the next call probes.
+        """
+        with self._lock:
+            self._probing = False
+
+
+class Provider:
+    """One way of reaching Claude, with its clients, circuit breaker and counters"""
+
+    def __init__(self, name: str, client: Any = None, async_client: Any = None, breaker: Optional[CircuitBreaker] = None):
+        if name not in PROVIDERS:
+            raise ValueError(f"Unknown LLM provider: {name}")
+        self.name = name
+        self.client = client
+        self.async_client = async_client
+        self.breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+        self.outcomes = {outcome: 0 for outcome in PROVIDER_OUTCOMES}
+        self._latency = deque(maxlen=LATENCY_WINDOW)
+
+    def model_id(self, model: str) -> str:
+        return provider_model(model, self.name)
+
+    def record(self, outcome: str, seconds: Optional[float] = None):
+        with self._lock:
+            self.outcomes[outcome] += 1
+            if seconds is not None:
+                self._latency.append(seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latency = list(self._latency)
+            outcomes = dict(self.outcomes)
+        calls = outcomes['success'] + outcomes['client_error'] + outcomes['retryable_error']
+        return {
+            'circuit': self.breaker.state,
+            'circuit_opened': self.breaker.opened,
+            'calls': calls,
+            'outcomes': outcomes,
+            'error_rate': round(outcomes['retryable_error'] / calls, 4) if calls else 0.0,
+            'latency_ms': {
+                'p50': round(_percentile(latency, 50) * 1000, 1),
+                'p95': round(_percentile(latency, 95) * 1000, 1),
+            },
+        }
+
+
+class ProviderPool:
+    """
+    Providers in preference order. `observer(provider, outcome, seconds,
+    error)` is called for every attempt, e.g. to export metrics.
+    """
+
+    def __init__(
+        self,
+        providers: Sequence[Provider],
+        observer: Optional[Callable[[Provider, str, Optional[float], Optional[BaseException]], None]] = None
+    ):
+        self.providers = list(providers)
+        self.observer = observer
+        self.failovers = 0
+
+    def candidates(self) -> Iterator[Provider]:
+        """
+        Providers to try, in order, skipping open circuits. Raises
+        NoProviderAvailable if none could be tried.
+        """
+        tried = False
+        for provider in self.providers:
+            if not provider.breaker.allow():
+                self._observe(provider, 'circuit_open')
+                continue
+            tried = True
+            yield provider
+        if not tried:
+            raise NoProviderAvailable(
+                'No LLM provider available: ' + (', '.join(p.name for p in self.providers) or 'none configured')
+            )
+
+    def record(self, provider: Provider, seconds: float, error: Optional[BaseException] = None) -> bool:
+        """
+        Record one attempt's result; returns True if the error should be
+        retried on the next provider. Attempts that end without a result go
+        to release() instead.
+        """
+        if error is None:
+            provider.breaker.record_success()
+            self._observe(provider, 'success', seconds)
+            return False
+        if not is_retryable(error):
+            # The provider answered; the request itself was rejected
+            provider.breaker.record_success()
+            self._observe(provider, 'client_error', seconds, error)
+            return False
+        provider.breaker.record_failure()
+        self._observe(provider, 'retryable_error', seconds, error)
+        print(f"[PROVIDER] {provider.name} failed ({type(error).__name__}), circuit {provider.breaker.state}")
+        return True
+
+    def _observe(
+        self,
+        provider: Provider,
+        outcome: str,
+        seconds: Optional[float] = None,
+        error: Optional[BaseException] = None
+    ):
+        provider.record(outcome, seconds)
+        if self.observer is not None:
+            self.observer(provider, outcome, seconds, error)
+
+    def release(self, provider: Provider):
+        """An attempt was abandoned (cancelled or closed) before it finished"""
+        provider.breaker.release()
+
+    def _failed_over(self, previous: Provider, provider: Provider):
+        self.failovers += 1
+        print(f"[PROVIDER] Failing over from {previous.name} to {provider.name}")
+
+    async def call(self, fn: Callable[[Provider, str], Awaitable[T]], model: str) -> T:
+        """
+        Await `fn(provider, model_id)` on the first healthy provider, moving
+        to the next one on retryable errors. Raises the last error.
+        """
+        error: Optional[BaseException] = None
+        previous: Optional[Provider] = None
+        for provider in self.candidates():
+            if previous is not None:
+                self._failed_over(previous, provider)
+            start = time.perf_counter()
+            try:
+                result = await fn(provider, provider.model_id(model))
+            except Exception as e:
+                if not self.record(provider, time.perf_counter() - start, e):
+                    raise
+                error, previous = e, provider
+                continue
+            except BaseException:
+                # Cancelled mid-call: no verdict, but a claimed probe must be freed
+                self.release(provider)
+                raise
+            self.record(provider, time.perf_counter() - start)
+            return result
+        raise error
+
+    def call_sync(self, fn: Callable[[Provider, str], T], model: str) -> T:
+        """Synchronous version of call()"""
+        error: Optional[BaseException] = None
+        previous: Optional[Provider] = None
+        for provider in self.candidates():
+            if previous is not None:
+                self._failed_over(previous, provider)
+            start = time.perf_counter()
+            try:
+                result = fn(provider, provider.model_id(model))
+            except Exception as e:
+                if not self.record(provider, time.perf_counter() - start, e):
+                    raise
+                error, previous = e, provider
+                continue
+            except BaseException:
+                # Cancelled mid-call: no verdict, but a claimed probe must be freed
+                self.release(provider)
+                raise
+            self.record(provider, time.perf_counter() - start)
+            return result
+        raise error
+
+    def stats(self) -> dict:
+        return {
+            'order': [provider.name for provider in self.providers],
+            'failovers': self.failovers,
+            'providers': {provider.name: provider.stats() for provider in self.providers},
+        }
+
+
+def build_providers(
+    names: Sequence[str],
+    anthropic_api_key: Optional[str] = None,
+    bedrock_region: Optional[str] = None,
+    failure_threshold: int = 5,
+    reset_timeout: float = 30.0
+) -> List[Provider]:
+    """
+    anthropic SDK providers in the given order. 'anthropic' is skipped
+    without an API key; 'bedrock' uses the default AWS credential chain
+    (needs boto3).
+    """
+    if anthropic is None:
+        raise ImportError("Install 'anthropic' to call Claude")
+    providers = []
+    for name in names:
+        breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        if name == 'anthropic':
+            if not anthropic_api_key:
+                continue
+            providers.append(Provider(
+                name,
+                anthropic.Anthropic(api_key=anthropic_api_key, http_client=None),
+                anthropic.AsyncAnthropic(api_key=anthropic_api_key, http_client=None),
+                breaker
+            ))
+        elif name == 'bedrock':
+            region = bedrock_region or os.getenv('BEDROCK_REGION', 'us-east-1')
+            providers.append(Provider(
+                name,
+                anthropic.AnthropicBedrock(aws_region=region),
+                anthropic.AsyncAnthropicBedrock(aws_region=region),
+                breaker
+            ))
+        else:
+            raise ValueError(f"Unknown LLM provider: {name}")
+    return providers
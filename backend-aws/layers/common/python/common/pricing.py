@@ -0,0 +1,64 @@
+"""
+Versioned model price table.
+
+Prices are USD per million tokens. When provider prices change, add a new
+version rather than editing an existing one: UsageLog rows store the
+version they were priced with, so historical costs stay reproducible and
+can be re-priced against any version.
+"""
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    input: float
+    output: float
+    cache_read: float  # Prompt-cache hits
+    cache_write: float  # Prompt-cache writes (5 minute TTL)
+
+
+_HAIKU_3 = ModelPrice(input=0.25, output=1.25, cache_read=0.03, cache_write=0.30)
+_HAIKU_3_5 = ModelPrice(input=0.80, output=4.00, cache_read=0.08, cache_write=1.00)
+_SONNET_3_5 = ModelPrice(input=3.00, output=15.00, cache_read=0.30, cache_write=3.75)
+
+PRICE_TABLES: Dict[str, Dict[str, ModelPrice]] = {
+    '2024-12': {
+        # Anthropic API
+        'claude-3-haiku-20240307': _HAIKU_3,
+        'claude-3-5-haiku-20241022': _HAIKU_3_5,
+        'claude-3-5-sonnet-20240620': _SONNET_3_5,
+        'claude-3-5-sonnet-20241022': _SONNET_3_5,
+        # Bedrock (on-demand, us-east-1)
+        'anthropic.claude-3-haiku-20240307-v1:0': _HAIKU_3,
+        'anthropic.claude-3-5-haiku-20241022-v1:0': _HAIKU_3_5,
+        'anthropic.claude-3-5-sonnet-20240620-v1:0': _SONNET_3_5,
+        'anthropic.claude-3-5-sonnet-20241022-v2:0': _SONNET_3_5,
+    },
+}
+
+CURRENT_PRICE_VERSION = '2024-12'
+
+
+def get_price(model: Optional[str], version: Optional[str] = None) -> Optional[ModelPrice]:
+    """Price for a model in a table version (current by default); None if unknown"""
+    table = PRICE_TABLES.get(version or CURRENT_PRICE_VERSION)
+    if table is None:
+        raise KeyError(f"Unknown price table version: {version}")
+    return table.get(model) if model else None
+
+
+def cost_usd(model: Optional[str], usage: Mapping[str, int], version: Optional[str] = None) -> float:
+    """
+    Cost of one call from its token counts (as from llm_usage.usage_to_dict).
+    Unknown models cost 0 so that a missing price never breaks a request.
+    """
+    price = get_price(model, version)
+    if price is None:
+        return 0.0
+    return (
+        (usage.get('input_tokens') or 0) * price.input
+        + (usage.get('output_tokens') or 0) * price.output
+        + (usage.get('cache_read_input_tokens') or 0) * price.cache_read
+        + (usage.get('cache_creation_input_tokens') or 0) * price.cache_write
+    ) / 1_000_000
@@ -0,0 +1,106 @@
+"""
+Schema-constrained output for the suggest and refine calls.
+
+Each call offers Claude a single tool whose input_schema is the response
+format and forces it with tool_choice, so the answer comes back as an
+already-parsed tool_use input instead of free text that may be wrapped in
+fences or prose. If a response has no matching tool_use block (older
+models, a refusal), the text is searched for the JSON object instead
+(parse_json_object), and only when both fail is the call a parse failure.
+
+extract_structured() reports which path produced the result ('tool',
+'text' or 'failed') so callers can count wasted round trips. The Lambda
+layer ships a copy (common/structured_output.py).
+"""
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from .json_stream import parse_json_object
+
+STRUCTURED_SOURCES = ('tool', 'text', 'failed')
+
+_SUGGESTION_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'title': {'type': 'string', 'description': 'Brief title (5-7 words)'},
+        'description': {'type': 'string', 'description': 'One sentence explaining this interpretation'},
+        'improved_text': {
+            'type': 'string',
+            'description': 'Complete description with system, users, functionality, and external systems'
+        },
+    },
+    'required': ['title', 'description', 'improved_text'],
+}
+
+SUGGESTIONS_TOOL = {
+    'name': 'submit_suggestions',
+    'description': 'Submit the interpretations of the description that are suitable for C4 diagrams.',
+    'input_schema': {
+        'type': 'object',
+        'properties': {
+            'suggestions': {'type': 'array', 'items': _SUGGESTION_SCHEMA, 'minItems': 1},
+        },
+        'required': ['suggestions'],
+    },
+}
+
+SUGGESTION_TOOL = {
+    'name': 'submit_suggestion',
+    'description': 'Submit one interpretation of the description that is suitable for a C4 diagram.',
+    'input_schema': _SUGGESTION_SCHEMA,
+}
+
+REFINEMENT_TOOL = {
+    'name': 'submit_refinement',
+    'description': 'Submit the updated Mermaid diagram and what was changed.',
+    'input_schema': {
+        'type': 'object',
+        'properties': {
+            'updated_mermaid': {'type': 'string', 'description': 'Complete updated Mermaid code'},
+            'changes_made': {'type': 'array', 'items': {'type': 'string'}},
+            'explanation': {'type': 'string', 'description': 'Brief explanation of what was modified and why'},
+        },
+        'required': ['updated_mermaid', 'changes_made', 'explanation'],
+    },
+}
+
+
+def tool_choice(tool: dict) -> dict:
+    """Force Claude to answer through `tool`"""
+    return {'type': 'tool', 'name': tool['name']}
+
+
+def _field(block: Any, name: str) -> Any:
+    """Attribute of an SDK content block or key of a Bedrock content dict"""
+    return block.get(name) if isinstance(block, dict) else getattr(block, name, None)
+
+
+def conforms(data: Any, tool: dict) -> bool:
+    """Whether `data` has every top-level field the tool's schema requires"""
+    return isinstance(data, dict) and all(field in data for field in tool['input_schema'].get('required', []))
+
+
+def extract_structured(content: Iterable[Any], tool: dict) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    The response object from a message's content blocks and its source:
+    the forced tool_use input, else a JSON object found in the text.
+    Returns (None, 'failed') when neither conforms to the tool's schema.
+    """
+    texts = []
+    for block in content or []:
+        block_type = _field(block, 'type')
+        if block_type == 'tool_use' and _field(block, 'name') == tool['name']:
+            data = _field(block, 'input')
+            if conforms(data, tool):
+                return data, 'tool'
+        elif block_type == 'text':
+            texts.append(_field(block, 'text') or '')
+
+    try:
+        data = parse_json_object('\n'.join(texts))
+    except ValueError:
+        return None, 'failed'
+    return (data, 'text') if conforms(data, tool) else (None, 'failed')
+
+
+class StructuredOutputError(Exception):
+    """Raised when a response has neither a conforming tool call nor JSON"""
@@ -43,9 +43,13 @@ resource "aws_iam_role_policy" "bedrock_access" {
       {
         Effect = "Allow"
         Action = [
-          "bedrock:InvokeModel"
+          "bedrock:InvokeModel",
+          "bedrock:InvokeModelWithResponseStream"
+        ]
+        Resource = [
+          "arn:aws:bedrock:${var.bedrock_region}::foundation-model/anthropic.claude-3-5-sonnet-20240620-v1:0",
+          "arn:aws:bedrock:${var.bedrock_region}::foundation-model/anthropic.claude-3-haiku-20240307-v1:0"
         ]
-        Resource = "arn:aws:bedrock:${var.bedrock_region}::foundation-model/anthropic.claude-3-5-sonnet-20240620-v1:0"
       },
       {
         Effect = "Allow"
@@ -125,10 +129,12 @@ resource "aws_lambda_function" "validate" {
   
   environment {
     variables = {
-      BEDROCK_REGION   = var.bedrock_region
-      DYNAMODB_TABLE   = var.enable_dynamodb ? aws_dynamodb_table.diagram_history[0].name : ""
-      LOG_LEVEL        = "INFO"
-      ENVIRONMENT      = var.environment
+      BEDROCK_REGION         = var.bedrock_region
+      BEDROCK_PROMPT_CACHING = var.bedrock_prompt_caching ? "true" : "false"
+      TRACING_EXPORTER       = var.tracing_exporter
+      DYNAMODB_TABLE         = var.enable_dynamodb ? aws_dynamodb_table.diagram_history[0].name : ""
+      LOG_LEVEL              = "INFO"
+      ENVIRONMENT            = var.environment
     }
   }
   
@@ -152,10 +158,15 @@ resource "aws_lambda_function" "suggest" {
   
   environment {
     variables = {
-      BEDROCK_REGION   = var.bedrock_region
-      DYNAMODB_TABLE   = var.enable_dynamodb ? aws_dynamodb_table.diagram_history[0].name : ""
-      LOG_LEVEL        = "INFO"
-      ENVIRONMENT      = var.environment
+      BEDROCK_REGION         = var.bedrock_region
+      BEDROCK_PROMPT_CACHING = var.bedrock_prompt_caching ? "true" : "false"
+      TRACING_EXPORTER       = var.tracing_exporter
+      DYNAMODB_TABLE         = var.enable_dynamodb ? aws_dynamodb_table.diagram_history[0].name : ""
+      LOG_LEVEL              = "INFO"
+      ENVIRONMENT            = var.environment
+      SUGGEST_MODE           = var.suggest_mode
+      LLM_PROVIDERS          = var.llm_providers
+      ANTHROPIC_API_KEY      = var.anthropic_api_key
     }
   }
   
@@ -179,10 +190,17 @@ resource "aws_lambda_function" "generate" {
   
   environment {
     variables = {
-      BEDROCK_REGION   = var.bedrock_region
-      DYNAMODB_TABLE   = var.enable_dynamodb ? aws_dynamodb_table.diagram_history[0].name : ""
-      LOG_LEVEL        = "INFO"
-      ENVIRONMENT      = var.environment
+      BEDROCK_REGION           = var.bedrock_region
+      BEDROCK_PROMPT_CACHING   = var.bedrock_prompt_caching ? "true" : "false"
+      TRACING_EXPORTER         = var.tracing_exporter
+      DYNAMODB_TABLE           = var.enable_dynamodb ? aws_dynamodb_table.diagram_history[0].name : ""
+      LOG_LEVEL                = "INFO"
+      ENVIRONMENT              = var.environment
+      MODEL_ROUTING_MODE       = var.model_routing_mode
+      LLM_HEDGING              = var.generate_hedging ? "true" : "false"
+      LLM_HEDGE_BUDGET_PERCENT = tostring(var.generate_hedge_budget_percent)
+      LLM_PROVIDERS            = var.llm_providers
+      ANTHROPIC_API_KEY        = var.anthropic_api_key
     }
   }
   
@@ -206,10 +224,14 @@ resource "aws_lambda_function" "refine" {
   
   environment {
     variables = {
-      BEDROCK_REGION   = var.bedrock_region
-      DYNAMODB_TABLE   = var.enable_dynamodb ? aws_dynamodb_table.diagram_history[0].name : ""
-      LOG_LEVEL        = "INFO"
-      ENVIRONMENT      = var.environment
+      BEDROCK_REGION         = var.bedrock_region
+      BEDROCK_PROMPT_CACHING = var.bedrock_prompt_caching ? "true" : "false"
+      TRACING_EXPORTER       = var.tracing_exporter
+      DYNAMODB_TABLE         = var.enable_dynamodb ? aws_dynamodb_table.diagram_history[0].name : ""
+      LOG_LEVEL              = "INFO"
+      ENVIRONMENT            = var.environment
+      LLM_PROVIDERS          = var.llm_providers
+      ANTHROPIC_API_KEY      = var.anthropic_api_key
     }
   }
   
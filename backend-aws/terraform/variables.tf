@@ -21,6 +21,80 @@ variable "bedrock_region" {
   default     = "us-east-1"
 }
 
+variable "bedrock_prompt_caching" {
+  description = "Cache the static system prompts with Bedrock prompt caching"
+  type        = bool
+  default     = true
+}
+
+variable "tracing_exporter" {
+  description = "OpenTelemetry span export: none, console (JSON spans in CloudWatch) or otlp (collector extension)"
+  type        = string
+  default     = "none"
+  
+  validation {
+    condition     = contains(["none", "console", "otlp"], var.tracing_exporter)
+    error_message = "Tracing exporter must be none, console, or otlp."
+  }
+}
+
+variable "model_routing_mode" {
+  description = "Generate model routing: auto (by input complexity), fast or large"
+  type        = string
+  default     = "auto"
+  
+  validation {
+    condition     = contains(["auto", "fast", "large"], var.model_routing_mode)
+    error_message = "Model routing mode must be auto, fast, or large."
+  }
+}
+
+variable "suggest_mode" {
+  description = "Improvement suggestions: single (one completion) or fanout (one parallel completion per angle)"
+  type        = string
+  default     = "single"
+  
+  validation {
+    condition     = contains(["single", "fanout"], var.suggest_mode)
+    error_message = "Suggest mode must be single or fanout."
+  }
+}
+
+variable "llm_providers" {
+  description = "Claude providers in failover order: bedrock, anthropic (anthropic needs anthropic_api_key)"
+  type        = string
+  default     = "bedrock"
+  
+  validation {
+    condition     = alltrue([for name in split(",", var.llm_providers) : contains(["bedrock", "anthropic"], trimspace(name))])
+    error_message = "LLM providers must be a comma-separated list of bedrock and anthropic."
+  }
+}
+
+variable "anthropic_api_key" {
+  description = "Anthropic API key for failover to the direct API (empty = Bedrock only)"
+  type        = string
+  default     = ""
+  sensitive   = true
+}
+
+variable "generate_hedging" {
+  description = "Send a second identical Bedrock request when a generate call's first token is later than its p95"
+  type        = bool
+  default     = false
+}
+
+variable "generate_hedge_budget_percent" {
+  description = "Maximum extra Bedrock calls from hedging, as a percentage of generate requests"
+  type        = number
+  default     = 5
+  
+  validation {
+    condition     = var.generate_hedge_budget_percent >= 0 && var.generate_hedge_budget_percent <= 100
+    error_message = "Hedge budget must be between 0 and 100 percent."
+  }
+}
+
 variable "enable_dynamodb" {
   description = "Enable DynamoDB for diagram history"
   type        = bool
@@ -1,27 +1,43 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+import time
+from app.core.cache import TTLCache
 from app.core.database import get_db
 from app.core.config import settings
+from app.core.security import pwd_context, password_hasher, HashingOverloadedError
 from app.models.database import User
 from app.models.schemas import UserCreate, UserResponse
 
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
+# Detached User rows keyed by token subject (username)
+principal_cache = TTLCache(ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS, name='principal')
+
+# Usernames deactivated (or whose superuser flag changed) in this process;
+# consulted on the signed-claims path until any token issued before the
+# change has expired
+deactivated_principals = TTLCache(ttl_seconds=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+principal_stats = {
+    'claims_resolved': 0,
+    'db_lookups': 0,
+    'db_lookup_ms': 0.0
+}
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
+    """Verify a password against its hash (blocking; not for request handlers)"""
     return pwd_context.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    """Hash a password"""
+    """Hash a password (blocking; not for request handlers)"""
     return pwd_context.hash(password)
 
 
@@ -38,11 +54,45 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return encoded_jwt
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user from JWT token"""
+def invalidate_principal(username: str):
+    """Drop a cached principal, e.g. after the user is changed or deactivated"""
+    principal_cache.invalidate(username)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_principals(session, flush_context):
+    """Note flushed user changes; the cache is only updated once they commit"""
+    pending = session.info.setdefault('changed_principals', {})
+    for user in list(session.dirty) + list(session.deleted):
+        if not isinstance(user, User):
+            continue
+        state = inspect(user)
+        for username in state.attrs.username.history.deleted or []:
+            pending.setdefault(username, False)
+        # Claims issued before a deactivation or superuser change are stale
+        stale_claims = (
+            (user.is_active is False and state.attrs.is_active.history.has_changes())
+            or state.attrs.is_superuser.history.has_changes()
+        )
+        pending[user.username] = pending.get(user.username, False) or stale_claims
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_principals(session):
+    """Keep the principal cache consistent with committed user changes"""
+    for username, stale_claims in session.info.pop('changed_principals', {}).items():
+        invalidate_principal(username)
+        if stale_claims:
+            deactivated_principals.set(username, True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_principals(session):
+    session.info.pop('changed_principals', None)
+
+
+def _decode_token(token: str) -> dict:
+    """Decode a JWT access token, raising 401 if it is invalid"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -51,15 +101,76 @@ async def get_current_user(
     
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
     
+    if payload.get("sub") is None:
+        raise credentials_exception
+    return payload
+
+
+def _load_principal(username: str, db: Session) -> User:
+    """Return the user for a token subject, from cache or a single DB lookup"""
+    user = principal_cache.get(username)
+    if user is not None:
+        return user
+    
+    started = time.perf_counter()
     user = db.query(User).filter(User.username == username).first()
+    principal_stats['db_lookups'] += 1
+    principal_stats['db_lookup_ms'] += (time.perf_counter() - started) * 1000
+    
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    # Detach so the cached row outlives this request's session
+    db.expunge(user)
+    principal_cache.set(username, user)
+    return user
+
+
+def _principal_from_claims(payload: dict) -> User:
+    """
+    Build a transient principal from signed claims without touching the DB.
+    Only id, username, team_id, is_active and is_superuser are populated.
+    """
+    return User(
+        id=payload["uid"],
+        username=payload["sub"],
+        team_id=payload.get("team_id"),
+        is_active=payload["active"],
+        is_superuser=payload["superuser"]
+    )
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> User:
+    """
+    Get current authenticated user from JWT token.
+    
+    Resolved from signed claims when AUTH_TRUST_TOKEN_CLAIMS is enabled,
+    otherwise from the short-TTL principal cache, falling back to the DB.
+    """
+    payload = _decode_token(token)
+    username = payload["sub"]
+    
+    if (
+        settings.AUTH_TRUST_TOKEN_CLAIMS
+        and "uid" in payload
+        and "active" in payload
+        and "superuser" in payload
+        and deactivated_principals.get(username) is None
+    ):
+        user = _principal_from_claims(payload)
+        principal_stats['claims_resolved'] += 1
+    else:
+        user = _load_principal(username, db)
     
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -67,6 +178,43 @@ async def get_current_user(
     return user
 
 
+async def get_current_user_record(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> User:
+    """Like get_current_user, but always returns the full user row"""
+    payload = _decode_token(token)
+    user = _load_principal(payload["sub"], db)
+    
+    if not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    
+    return user
+
+
+def principal_cache_stats() -> dict:
+    """Cache hit rate and the DB lookup time it saved"""
+    cache = principal_cache.stats()
+    lookups = principal_stats['db_lookups']
+    avg_lookup_ms = principal_stats['db_lookup_ms'] / lookups if lookups else 0.0
+    served_without_db = cache['hits'] + principal_stats['claims_resolved']
+    return {
+        **cache,
+        'claims_resolved': principal_stats['claims_resolved'],
+        'db_lookups': lookups,
+        'avg_db_lookup_ms': avg_lookup_ms,
+        'estimated_ms_saved': served_without_db * avg_lookup_ms
+    }
+
+
+def _hashing_overloaded() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent sign-in requests. Please retry shortly.",
+        headers={"Retry-After": "1"},
+    )
+
+
 @router.post("/register", response_model=UserResponse)
 async def register(user: UserCreate, db: Session = Depends(get_db)):
     """
@@ -83,8 +231,11 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
             detail="Email or username already registered"
         )
     
-    # Create new user
-    hashed_password = get_password_hash(user.password)
+    # Create new user (hashing runs off the event loop)
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except HashingOverloadedError:
+        raise _hashing_overloaded()
     db_user = User(
         email=user.email,
         username=user.username,
@@ -109,7 +260,23 @@ async def login(
     """
     user = db.query(User).filter(User.username == form_data.username).first()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    valid = False
+    try:
+        if user:
+            valid, new_hash = await password_hasher.verify_and_update(
+                form_data.password, user.hashed_password
+            )
+            if valid and new_hash:
+                # Cost parameters changed since this hash was created
+                user.hashed_password = new_hash
+                db.commit()
+        else:
+            # Same work as a real check so unknown usernames are not faster
+            await password_hasher.dummy_verify()
+    except HashingOverloadedError:
+        raise _hashing_overloaded()
+    
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -118,15 +285,34 @@ async def login(
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        # Signed claims let the rate limiter and (optionally) get_current_user
+        # identify the caller without a DB lookup
+        data={
+            "sub": user.username,
+            "uid": user.id,
+            "team_id": user.team_id,
+            "active": user.is_active,
+            "superuser": user.is_superuser
+        },
+        expires_delta=access_token_expires
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: User = Depends(get_current_user_record)):
     """
     Get current user information.
     """
     return current_user
+
+
+@router.get("/cache-stats")
+async def read_principal_cache_stats(current_user: User = Depends(get_current_user_record)):
+    """
+    Principal cache hit rate and estimated latency saved (superusers only).
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not permitted")
+    return principal_cache_stats()
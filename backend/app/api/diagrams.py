@@ -1,20 +1,88 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only, undefer_group
+from typing import List, Optional
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.core.database import get_db
+from app.core.pagination import encode_cursor, decode_cursor, InvalidCursorError
 from app.models.schemas import (
     DiagramGenerateRequest,
     DiagramGenerateResponse,
     DiagramResponse,
-    DiagramListResponse
+    DiagramListResponse,
+    DiagramSummary,
+    DiagramVersionCreate,
+    DiagramVersionSummary,
+    DiagramVersionResponse
 )
 from app.models.database import Diagram, User
 from app.services.diagram_service import DiagramService
-from app.api.auth import get_current_user
+from app.services.llm_provider import NoProviderAvailable
+from app.services.quota_service import QuotaExceededError
+from app.services.version_store import version_store, VersionNotFoundError
+from app.api.auth import get_current_user, get_current_user_record
 
 router = APIRouter(prefix="/api/diagrams", tags=["diagrams"])
 diagram_service = DiagramService()
 
+# Columns always loaded for list responses (see DiagramSummary)
+SUMMARY_COLUMNS = (
+    Diagram.id,
+    Diagram.title,
+    Diagram.diagram_type,
+    Diagram.version,
+    Diagram.created_at,
+    Diagram.updated_at,
+)
+
+# Large text columns a client can opt into with ?include=
+OPTIONAL_COLUMNS = {
+    'description': Diagram.description,
+    'input_text': Diagram.input_text,
+    'mermaid_code': Diagram.mermaid_code,
+}
+
+# Largest page a client can request, so one call can't load a whole history
+MAX_PAGE_SIZE = 100
+
+# Per-user diagram totals; exact counts are only recomputed after the TTL
+diagram_count_cache = TTLCache(ttl_seconds=settings.DIAGRAM_COUNT_CACHE_TTL_SECONDS, name='diagram_count')
+
+
+def charge_quota(action: str):
+    """
+    Dependency counting an `action` request against the caller's team quota:
+    429 when it is used up, and the counter and usage log updated once the
+    endpoint has returned without an error. For the LLM endpoints served
+    outside this router (suggest, refine).
+    """
+    async def dependency(
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+    ):
+        try:
+            diagram_service.quota_service.check(current_user.team_id, db)
+        except QuotaExceededError as e:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=str(e)
+            )
+        yield
+        await diagram_service.record_request(action, current_user.id, db, team_id=current_user.team_id)
+    
+    return dependency
+
+
+def _count_user_diagrams(user_id: int, db: Session) -> int:
+    """Return the user's diagram total, served from cache when fresh"""
+    total = diagram_count_cache.get(user_id)
+    if total is None:
+        total = db.query(Diagram).filter(Diagram.user_id == user_id).count()
+        diagram_count_cache.set(user_id, total)
+    return total
+
 
 @router.post("/generate", response_model=DiagramGenerateResponse)
 async def generate_diagram(
@@ -30,13 +98,29 @@ async def generate_diagram(
     - Optionally saves to database
     - Returns Mermaid code and validation results
     """
+    try:
+        diagram_service.quota_service.check(current_user.team_id, db)
+    except QuotaExceededError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e)
+        )
+    
     try:
         result = await diagram_service.generate_diagram(
             request=request,
             user_id=current_user.id,
-            db=db
+            db=db,
+            team_id=current_user.team_id
         )
+        if result.diagram_id is not None:
+            diagram_count_cache.invalidate(current_user.id)
         return result
+    except NoProviderAvailable as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -44,33 +128,121 @@ async def generate_diagram(
         )
 
 
+@router.get("/routing/stats")
+async def read_model_routing_stats(current_user: User = Depends(get_current_user_record)):
+    """
+    Model routing policy and the per-model call, latency and cost split (superusers only).
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not permitted")
+    return diagram_service.model_router.stats()
+
+
+@router.get("/hedging/stats")
+async def read_hedging_stats(current_user: User = Depends(get_current_user_record)):
+    """
+    Generate hedging policy, outcomes and per-model first-token deadlines (superusers only).
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not permitted")
+    return diagram_service.hedger.stats()
+
+
+@router.get("/providers/stats")
+async def read_provider_stats(current_user: User = Depends(get_current_user_record)):
+    """
+    Per-provider circuit state, call outcomes, error rate and latency (superusers only).
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not permitted")
+    return diagram_service.providers.stats()
+
+
 @router.get("/", response_model=DiagramListResponse)
 async def list_diagrams(
-    page: int = 1,
-    page_size: int = 20,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include: Optional[str] = None,
+    include_total: bool = True,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    List user's diagrams with pagination.
+    List user's diagrams, newest first.
+    
+    - Pass `cursor` (the `next_cursor` of the previous page) for keyset
+      pagination; `page` is ignored in that case
+    - Without a cursor, classic `page`/`page_size` offsets still work;
+      `page_size` is capped at MAX_PAGE_SIZE
+    - `total` is cached per user and can be skipped with `include_total=false`
+    - Only summary columns are returned by default; pass e.g.
+      `include=mermaid_code,description` to also load large text fields
     """
-    skip = (page - 1) * page_size
+    included = [name.strip() for name in include.split(',') if name.strip()] if include else []
+    unknown = [name for name in included if name not in OPTIONAL_COLUMNS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown include field(s): {', '.join(unknown)}. "
+                   f"Allowed: {', '.join(OPTIONAL_COLUMNS)}"
+        )
+    columns = SUMMARY_COLUMNS + tuple(OPTIONAL_COLUMNS[name] for name in included)
     
-    diagrams = db.query(Diagram).filter(
+    # Skip the large text columns unless explicitly requested
+    query = db.query(Diagram).options(
+        load_only(*columns)
+    ).filter(
         Diagram.user_id == current_user.id
-    ).order_by(
-        Diagram.created_at.desc()
-    ).offset(skip).limit(page_size).all()
+    )
     
-    total = db.query(Diagram).filter(
-        Diagram.user_id == current_user.id
-    ).count()
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+        except InvalidCursorError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        # Seek past the last row of the previous page using the composite index
+        query = query.filter(
+            tuple_(Diagram.created_at, Diagram.id) < tuple_(cursor_created_at, cursor_id)
+        )
+    
+    query = query.order_by(
+        Diagram.created_at.desc(),
+        Diagram.id.desc()
+    )
+    
+    if not cursor:
+        query = query.offset((page - 1) * page_size)
+    
+    # Fetch one extra row to know whether another page exists
+    diagrams = query.limit(page_size + 1).all()
+    has_more = len(diagrams) > page_size
+    diagrams = diagrams[:page_size]
+    
+    next_cursor = None
+    if has_more:
+        last = diagrams[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    
+    total = _count_user_diagrams(current_user.id, db) if include_total else None
+    
+    # Read only the loaded columns; touching a deferred one would trigger a
+    # per-row lazy load of exactly the data this projection avoids
+    field_names = [column.key for column in columns]
+    summaries = [
+        DiagramSummary(**{name: getattr(diagram, name) for name in field_names})
+        for diagram in diagrams
+    ]
     
     return DiagramListResponse(
-        diagrams=diagrams,
+        diagrams=summaries,
         total=total,
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        next_cursor=next_cursor
     )
 
 
@@ -83,7 +255,9 @@ async def get_diagram(
     """
     Get a specific diagram by ID.
     """
-    diagram = db.query(Diagram).filter(
+    diagram = db.query(Diagram).options(
+        undefer_group("content")
+    ).filter(
         Diagram.id == diagram_id,
         Diagram.user_id == current_user.id
     ).first()
@@ -97,6 +271,121 @@ async def get_diagram(
     return diagram
 
 
+def _get_user_diagram(diagram_id: int, user_id: int, db: Session) -> Diagram:
+    diagram = db.query(Diagram).filter(
+        Diagram.id == diagram_id,
+        Diagram.user_id == user_id
+    ).first()
+    
+    if not diagram:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Diagram not found"
+        )
+    return diagram
+
+
+@router.post("/{diagram_id}/versions", response_model=DiagramVersionSummary)
+async def create_diagram_version(
+    diagram_id: int,
+    request: DiagramVersionCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Save a new version of a diagram (e.g. after a refinement).
+    The diagram's current content is updated; history is kept as deltas.
+    """
+    diagram = _get_user_diagram(diagram_id, current_user.id, db)
+    
+    try:
+        revision = version_store.commit(
+            diagram,
+            db,
+            mermaid_code=request.mermaid_code,
+            input_text=request.input_text,
+            change_note=request.change_note,
+            user_id=current_user.id,
+            base_version=request.base_version
+        )
+    except VersionNotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except IntegrityError:
+        # Another version of this diagram was saved at the same time
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Diagram was modified concurrently; reload and try again"
+        )
+    
+    return DiagramVersionSummary(
+        version=revision.version,
+        parent_version=revision.parent.version if revision.parent else None,
+        is_snapshot=revision.is_snapshot,
+        change_note=revision.change_note,
+        created_at=revision.created_at
+    )
+
+
+@router.get("/{diagram_id}/versions", response_model=List[DiagramVersionSummary])
+async def list_diagram_versions(
+    diagram_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    List a diagram's versions, oldest first.
+    """
+    diagram = _get_user_diagram(diagram_id, current_user.id, db)
+    revisions = version_store.list_versions(diagram.id, db)
+    versions_by_id = {revision.id: revision.version for revision in revisions}
+    
+    return [
+        DiagramVersionSummary(
+            version=revision.version,
+            parent_version=versions_by_id.get(revision.parent_revision_id),
+            is_snapshot=revision.is_snapshot,
+            change_note=revision.change_note,
+            created_at=revision.created_at
+        )
+        for revision in revisions
+    ]
+
+
+@router.get("/{diagram_id}/versions/{version}", response_model=DiagramVersionResponse)
+async def get_diagram_version(
+    diagram_id: int,
+    version: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the full content of one version, rebuilt from the nearest snapshot.
+    """
+    diagram = _get_user_diagram(diagram_id, current_user.id, db)
+    
+    try:
+        revision, mermaid_code, input_text = version_store.get_version(diagram, version, db)
+    except VersionNotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    
+    return DiagramVersionResponse(
+        version=revision.version,
+        parent_version=revision.parent.version if revision.parent else None,
+        is_snapshot=revision.is_snapshot,
+        change_note=revision.change_note,
+        created_at=revision.created_at,
+        mermaid_code=mermaid_code,
+        input_text=input_text
+    )
+
+
 @router.delete("/{diagram_id}")
 async def delete_diagram(
     diagram_id: int,
@@ -119,5 +408,6 @@ async def delete_diagram(
     
     db.delete(diagram)
     db.commit()
+    diagram_count_cache.invalidate(current_user.id)
     
     return {"message": "Diagram deleted successfully"}
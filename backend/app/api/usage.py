@@ -0,0 +1,190 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.database import get_db
+from app.models.schemas import TeamUsageStats, UsageBreakdown, UsageBreakdownRow
+from app.models.database import Team, UsageLog, User, UserFeedback
+from app.services.pricing import PRICE_TABLES, cost_usd
+from app.services.quota_service import QuotaService, current_period, period_bounds
+from app.api.auth import get_current_user, get_current_user_record
+
+router = APIRouter(prefix="/api/usage", tags=["usage"])
+quota_service = QuotaService()
+
+# group_by dimension -> UsageBreakdownRow field
+BREAKDOWN_DIMENSIONS = {'model': 'model', 'action': 'action', 'team': 'team_id'}
+TOKEN_FIELDS = ('input_tokens', 'output_tokens', 'cache_read_tokens', 'cache_write_tokens')
+
+
+@router.get("/team", response_model=TeamUsageStats)
+async def get_team_usage(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Usage statistics for the current user's team in the current month.
+
+    `quota_remaining` is served from the team's usage counter.
+    """
+    if current_user.team_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User is not a member of a team"
+        )
+
+    team = db.query(Team).filter(Team.id == current_user.team_id).first()
+    if team is None:
+        # team_id can come from token claims and outlive the team
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Team not found"
+        )
+    start, end = period_bounds(current_period())
+
+    total_requests, successful, diagrams, validations, tokens_used, cost_estimate = db.query(
+        func.count(UsageLog.id),
+        func.count(UsageLog.id).filter(UsageLog.success.is_(True)),
+        func.count(UsageLog.id).filter(UsageLog.action == 'generate', UsageLog.success.is_(True)),
+        func.count(UsageLog.id).filter(UsageLog.action == 'validate'),
+        func.coalesce(func.sum(UsageLog.tokens_used), 0),
+        func.coalesce(func.sum(UsageLog.cost_estimate), 0.0)
+    ).filter(
+        UsageLog.team_id == team.id,
+        UsageLog.created_at >= start,
+        UsageLog.created_at < end
+    ).one()
+
+    avg_rating = db.query(
+        func.avg(UserFeedback.diagram_quality_rating)
+    ).join(User, UserFeedback.user_id == User.id).filter(
+        User.team_id == team.id,
+        UserFeedback.created_at >= start,
+        UserFeedback.created_at < end
+    ).scalar()
+
+    return TeamUsageStats(
+        team_id=team.id,
+        team_name=team.name,
+        total_diagrams=diagrams,
+        total_validations=validations,
+        success_rate=successful / total_requests if total_requests else 0.0,
+        avg_quality_rating=float(avg_rating or 0.0),
+        tokens_used=int(tokens_used),
+        cost_estimate=float(cost_estimate),
+        quota_remaining=quota_service.remaining(team.id, db)
+    )
+
+
+@router.get("/breakdown", response_model=UsageBreakdown)
+async def get_usage_breakdown(
+    period: Optional[str] = None,
+    group_by: str = "model,action",
+    team_id: Optional[int] = None,
+    price_version: Optional[str] = None,
+    current_user: User = Depends(get_current_user_record),
+    db: Session = Depends(get_db)
+):
+    """
+    Token counts, latency and cost for one month, grouped by any of
+    `model`, `action` (endpoint) and `team`.
+
+    Non-superusers only see their own team. Costs are the per-call costs
+    stored at logging time unless `price_version` is given, in which case
+    calls with recorded token counts are re-priced with that version of
+    the price table.
+    """
+    dimensions = [dimension.strip() for dimension in group_by.split(',') if dimension.strip()]
+    unknown = [dimension for dimension in dimensions if dimension not in BREAKDOWN_DIMENSIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown group_by dimension(s): {', '.join(unknown)}"
+        )
+    if price_version is not None and price_version not in PRICE_TABLES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown price version")
+    try:
+        start, end = period_bounds(period or current_period())
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Period must be YYYY-MM")
+
+    if not current_user.is_superuser:
+        if current_user.team_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User is not a member of a team"
+            )
+        if team_id not in (None, current_user.team_id):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not permitted")
+        team_id = current_user.team_id
+
+    # Always aggregate per model in SQL so costs can be re-priced, then
+    # fold the rows into the requested dimensions
+    estimated = UsageLog.input_tokens.is_(None)
+    query = db.query(
+        UsageLog.model,
+        UsageLog.action,
+        UsageLog.team_id,
+        func.count(UsageLog.id),
+        func.count(UsageLog.id).filter(estimated),
+        *(func.coalesce(func.sum(getattr(UsageLog, field)), 0) for field in TOKEN_FIELDS),
+        func.coalesce(func.sum(UsageLog.cost_estimate), 0.0),
+        func.coalesce(func.sum(UsageLog.cost_estimate).filter(estimated), 0.0),
+        func.sum(UsageLog.latency_ms),
+        func.count(UsageLog.latency_ms)
+    ).filter(
+        UsageLog.created_at >= start,
+        UsageLog.created_at < end
+    )
+    if team_id is not None:
+        query = query.filter(UsageLog.team_id == team_id)
+
+    groups = {}
+    for row in query.group_by(UsageLog.model, UsageLog.action, UsageLog.team_id).all():
+        model, action, row_team_id, calls, estimated_calls = row[:5]
+        tokens = dict(zip(TOKEN_FIELDS, row[5:9]))
+        stored_cost, estimated_cost, latency_sum, latency_count = row[9:]
+
+        if price_version is not None:
+            cost = estimated_cost + cost_usd(model, {
+                'input_tokens': tokens['input_tokens'],
+                'output_tokens': tokens['output_tokens'],
+                'cache_read_input_tokens': tokens['cache_read_tokens'],
+                'cache_creation_input_tokens': tokens['cache_write_tokens']
+            }, price_version)
+        else:
+            cost = stored_cost
+
+        values = {'model': model, 'action': action, 'team_id': row_team_id}
+        key = tuple(values[BREAKDOWN_DIMENSIONS[dimension]] for dimension in dimensions)
+        group = groups.setdefault(key, {
+            'calls': 0, 'estimated_calls': 0, **{field: 0 for field in TOKEN_FIELDS},
+            'cost_usd': 0.0, 'latency_sum': 0.0, 'latency_count': 0
+        })
+        group['calls'] += calls
+        group['estimated_calls'] += estimated_calls
+        for field in TOKEN_FIELDS:
+            group[field] += int(tokens[field])
+        group['cost_usd'] += float(cost)
+        group['latency_sum'] += float(latency_sum or 0.0)
+        group['latency_count'] += latency_count
+
+    rows = []
+    for key, group in groups.items():
+        latency_sum = group.pop('latency_sum')
+        latency_count = group.pop('latency_count')
+        rows.append(UsageBreakdownRow(
+            **{BREAKDOWN_DIMENSIONS[dimension]: value for dimension, value in zip(dimensions, key)},
+            **group,
+            avg_latency_ms=latency_sum / latency_count if latency_count else None
+        ))
+    rows.sort(key=lambda row: row.cost_usd, reverse=True)
+
+    return UsageBreakdown(
+        start=start,
+        end=end,
+        group_by=dimensions,
+        price_version=price_version,
+        total_cost_usd=sum(row.cost_usd for row in rows),
+        rows=rows
+    )
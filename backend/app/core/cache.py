@@ -0,0 +1,69 @@
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+from app.core.metrics import record_cache
+
+
+class TTLCache:
+    """
+    Small thread-safe in-process cache with per-entry expiry.
+
+    Used for values that are expensive to compute but may be slightly stale
+    (e.g. per-user diagram counts). Entries are evicted lazily on read and
+    the oldest entry is dropped when the cache is full.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10_000, name: Optional[str] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # Caches with a name also report hits/misses to /metrics
+        self.name = name
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if self.name:
+            record_cache(self.name, entry is not None)
+        return entry[1] if entry is not None else None
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        """Store a value, evicting the oldest entry if the cache is full"""
+        expires_at = time.monotonic() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                # Dicts keep insertion order, so the first key is the oldest
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (expires_at, value)
+
+    def invalidate(self, key: Hashable):
+        """Drop a single entry"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters for monitoring"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
@@ -0,0 +1,122 @@
+import os
+import threading
+from typing import Dict, Optional
+from sqlalchemy.types import LargeBinary, TypeDecorator
+from app.core.config import settings
+
+try:
+    import zstandard
+except ImportError:  # Values are stored uncompressed without it
+    zstandard = None
+
+# Every zstd frame starts with these bytes; they can never begin valid
+# UTF-8 text, so compressed and legacy plain values are told apart safely
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+DICT_SUFFIX = '.zdict'
+
+
+class TextCompressor:
+    """
+    zstd compression for text columns, optionally with trained dictionaries.
+
+    Dictionaries are loaded from `dict_dir` (files named `<name>-<id>.zdict`,
+    see train_compression_dict.py). New values use the dictionary with the
+    highest ID; old values are decoded with whichever dictionary their frame
+    names, so dictionaries can be rotated without rewriting existing rows.
+    Values shorter than `min_size` bytes, or with zstandard missing, are
+    stored as plain UTF-8.
+    """
+
+    def __init__(self, level: int = 3, dict_dir: Optional[str] = None, min_size: int = 64):
+        self.level = level
+        self.min_size = min_size
+        self.dictionaries: Dict[int, 'zstandard.ZstdCompressionDict'] = {}
+        self.active_dict_id = 0
+        if zstandard is not None and dict_dir and os.path.isdir(dict_dir):
+            self._load_dictionaries(dict_dir)
+        # Compressor/decompressor objects are not safe for concurrent use
+        self._local = threading.local()
+
+    def _load_dictionaries(self, dict_dir: str):
+        for name in sorted(os.listdir(dict_dir)):
+            if not name.endswith(DICT_SUFFIX):
+                continue
+            with open(os.path.join(dict_dir, name), 'rb') as f:
+                dictionary = zstandard.ZstdCompressionDict(f.read())
+            self.dictionaries[dictionary.dict_id()] = dictionary
+        if self.dictionaries:
+            self.active_dict_id = max(self.dictionaries)
+            print(f"[COMPRESSION] Loaded {len(self.dictionaries)} dictionary(ies), active id {self.active_dict_id}")
+
+    def _compressor(self):
+        compressor = getattr(self._local, 'compressor', None)
+        if compressor is None:
+            dictionary = self.dictionaries.get(self.active_dict_id)
+            compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+            self._local.compressor = compressor
+        return compressor
+
+    def _decompressor(self, dict_id: int):
+        decompressors = getattr(self._local, 'decompressors', None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        decompressor = decompressors.get(dict_id)
+        if decompressor is None:
+            if dict_id and dict_id not in self.dictionaries:
+                raise ValueError(f"Compressed value needs unknown zstd dictionary {dict_id}")
+            decompressor = zstandard.ZstdDecompressor(dict_data=self.dictionaries.get(dict_id))
+            decompressors[dict_id] = decompressor
+        return decompressor
+
+    def compress(self, text: str) -> bytes:
+        data = text.encode('utf-8')
+        if zstandard is None or len(data) < self.min_size:
+            return data
+        compressed = self._compressor().compress(data)
+        return compressed if len(compressed) < len(data) else data
+
+    def decompress(self, data: bytes) -> str:
+        data = bytes(data)
+        if not is_compressed(data):
+            return data.decode('utf-8')  # Short value or written before compression
+        if zstandard is None:
+            raise RuntimeError("Install 'zstandard' to read compressed columns")
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        return self._decompressor(dict_id).decompress(data).decode('utf-8')
+
+    def frame_dict_id(self, data: bytes) -> Optional[int]:
+        """Dictionary ID a stored value was written with (None if uncompressed)"""
+        if zstandard is None or not is_compressed(data):
+            return None
+        return zstandard.get_frame_parameters(bytes(data)).dict_id
+
+
+def is_compressed(data: bytes) -> bool:
+    return bytes(data[:4]) == ZSTD_MAGIC
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text column stored as zstd-compressed bytes (BYTEA). Plain UTF-8 values
+    from before migrate_compressed_columns.py are read back unchanged.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return text_compressor.compress(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value  # str: column not migrated to BYTEA yet
+        return text_compressor.decompress(value)
+
+
+text_compressor = TextCompressor(
+    level=settings.COMPRESSION_LEVEL,
+    dict_dir=settings.COMPRESSION_DICT_DIR,
+    min_size=settings.COMPRESSION_MIN_SIZE
+)
@@ -11,24 +11,72 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str
     DATABASE_POOL_SIZE: int = 20
+    DIAGRAM_COUNT_CACHE_TTL_SECONDS: int = 60
+    DIAGRAM_SNAPSHOT_INTERVAL: int = 10  # Full copy every N revisions, deltas in between
+    # zstd compression of large text columns (see train_compression_dict.py)
+    COMPRESSION_LEVEL: int = 3
+    COMPRESSION_DICT_DIR: str = "compression_dicts"
+    COMPRESSION_MIN_SIZE: int = 64  # Shorter values are stored as plain UTF-8
     
     # Redis
     REDIS_URL: str
+    SINGLE_FLIGHT_USE_REDIS: bool = True  # Coalesce identical generate calls across workers
     
     # AI Services
     ANTHROPIC_API_KEY: str
+    # Providers tried in order with failover (see app/services/llm_provider.py);
+    # 'bedrock' uses the AWS credential chain and needs boto3
+    LLM_PROVIDERS: List[str] = ["anthropic"]
+    BEDROCK_REGION: str = "us-east-1"
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5  # Consecutive throttles/5xx/timeouts before a provider is skipped
+    LLM_CIRCUIT_RESET_SECONDS: float = 30.0
+    
+    # Model Routing (see app/services/model_router.py)
+    MODEL_ROUTING_MODE: str = "auto"  # 'auto', 'fast' or 'large'
+    MODEL_FAST: str = "claude-3-haiku-20240307"
+    MODEL_LARGE: str = "claude-3-5-sonnet-20241022"
+    ROUTING_MAX_FAST_WORDS: int = 150
+    ROUTING_MAX_FAST_COMPONENTS: int = 5
+    ROUTING_MAX_FAST_GAPS: int = 1
+    ROUTING_MIN_FAST_SCORE: float = 70.0
+    
+    # Request hedging for generate (see app/services/hedging.py)
+    LLM_HEDGING: bool = False
+    LLM_HEDGE_PERCENTILE: float = 95.0  # Hedge when the first token is later than this percentile
+    LLM_HEDGE_MIN_DELAY_MS: float = 500.0
+    LLM_HEDGE_MAX_DELAY_MS: float = 10000.0
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_HEDGE_BUDGET_PERCENT: float = 5.0  # Extra upstream calls, as a share of requests, at most
     
     # Security
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 30
+    BCRYPT_ROUNDS: int = 12  # Changing this rehashes passwords on next login
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    # Trust signed uid/team_id/active claims instead of loading the user on
+    # every request. Deactivation then only reaches other workers when the
+    # token expires.
+    AUTH_TRUST_TOKEN_CLAIMS: bool = False
     
     # CORS
     ALLOWED_ORIGINS: List[str] = ["http://localhost:5173", "http://localhost:3000"]
     
+    # Usage Logging (buffered batch writer)
+    USAGE_LOG_BATCH_SIZE: int = 100
+    USAGE_LOG_FLUSH_INTERVAL_SECONDS: float = 2.0
+    USAGE_LOG_QUEUE_SIZE: int = 10000
+    USAGE_LOG_OVERFLOW_POLICY: str = "drop"  # 'drop' or 'block'
+    
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 10
     RATE_LIMIT_PER_HOUR: int = 100
+    RATE_LIMIT_TEAM_PER_MINUTE: int = 60
+    RATE_LIMIT_TEAM_PER_HOUR: int = 1000
+    RATE_LIMIT_CHEAP_MULTIPLIER: int = 10  # Non-LLM endpoints get this many times the limit
+    RATE_LIMIT_BACKEND: str = "memory"  # 'memory' or 'redis'
     
     # ML Configuration
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
@@ -2,6 +2,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
+from .tracing import instrument_engine
 
 engine = create_engine(
     settings.DATABASE_URL,
@@ -9,6 +10,8 @@ engine = create_engine(
     max_overflow=40,
     pool_pre_ping=True
 )
+# Each SQL statement becomes a 'db.query' span and Server-Timing entry
+instrument_engine(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
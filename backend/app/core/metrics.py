@@ -0,0 +1,229 @@
+"""
+Prometheus metrics.
+
+Per-stage latency histograms for the generate path plus counters for cache
+hits, validation outcomes, structured-output parse results and upstream
+errors, and per-LLM-provider call outcomes, latency and circuit state,
+exposed at /metrics. Every
+label value comes from a fixed set defined in code (stage names, cache
+names, outcome and error kinds), never from request data, so series
+cardinality stays bounded.
+
+prometheus_client is optional: without it every metric is a no-op and
+/metrics reports that metrics are unavailable. Under multiple worker
+processes set PROMETHEUS_MULTIPROC_DIR so /metrics aggregates all workers.
+"""
+import os
+import time
+from typing import Optional, Tuple
+
+from app.core.tracing import span
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:  # pragma: no cover - optional dependency
+    prometheus_client = None
+
+# Stages of a generate request (validation pipeline, LLM call, persistence)
+STAGES = (
+    'rule_validation',
+    'embedding',
+    'vector_search',
+    'pattern_recognition',
+    'gap_analysis',
+    'llm_call',
+    'db_commit',
+)
+
+VALIDATION_OUTCOMES = ('valid', 'invalid', 'too_short', 'blocked')
+
+# How a structured LLM response was obtained (see app.services.structured_output)
+STRUCTURED_OUTPUT_ENDPOINTS = ('suggest', 'refine')
+STRUCTURED_OUTPUT_SOURCES = ('tool', 'text', 'failed')
+
+# LLM providers and per-call outcomes (see app.services.llm_provider)
+LLM_PROVIDERS = ('anthropic', 'bedrock')
+LLM_PROVIDER_OUTCOMES = ('success', 'client_error', 'retryable_error', 'circuit_open')
+CIRCUIT_STATE_VALUES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+# Sub-millisecond rule checks up to multi-second LLM calls
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0
+)
+
+
+class _NoopMetric:
+    """Stand-in when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+if prometheus_client is not None:
+    STAGE_SECONDS = Histogram(
+        'c4_stage_duration_seconds',
+        'Time spent in each stage of a request',
+        ['stage'],
+        buckets=LATENCY_BUCKETS
+    )
+    CACHE_REQUESTS = Counter(
+        'c4_cache_requests_total',
+        'Cache lookups by cache and result',
+        ['cache', 'result']
+    )
+    VALIDATIONS = Counter(
+        'c4_validation_outcomes_total',
+        'Input validation results',
+        ['outcome']
+    )
+    UPSTREAM_ERRORS = Counter(
+        'c4_upstream_errors_total',
+        'Failed calls to upstream services by kind of error',
+        ['upstream', 'kind']
+    )
+    STRUCTURED_OUTPUTS = Counter(
+        'c4_structured_output_total',
+        'Structured LLM responses by endpoint and how they were parsed (failed = wasted call)',
+        ['endpoint', 'source']
+    )
+    PROVIDER_CALLS = Counter(
+        'c4_llm_provider_calls_total',
+        'LLM calls by provider and outcome (circuit_open = skipped while the circuit was open)',
+        ['provider', 'outcome']
+    )
+    PROVIDER_SECONDS = Histogram(
+        'c4_llm_provider_duration_seconds',
+        'LLM call latency by provider, failed calls included',
+        ['provider'],
+        buckets=LATENCY_BUCKETS
+    )
+    PROVIDER_CIRCUIT = Gauge(
+        'c4_llm_provider_circuit_state',
+        'Provider circuit breaker state (0 closed, 1 half-open, 2 open)',
+        ['provider'],
+        multiprocess_mode='max'
+    )
+else:
+    STAGE_SECONDS = CACHE_REQUESTS = VALIDATIONS = UPSTREAM_ERRORS = STRUCTURED_OUTPUTS = _NoopMetric()
+    PROVIDER_CALLS = PROVIDER_SECONDS = PROVIDER_CIRCUIT = _NoopMetric()
+
+# Resolve label children once; unknown stages fail loudly instead of
+# creating new series
+_STAGE_HISTOGRAMS = {stage: STAGE_SECONDS.labels(stage=stage) for stage in STAGES}
+
+
+class stage_timer:
+    """
+    Context manager recording the duration of one stage, traced as a span
+    of the same name (see app.core.tracing); yields the span:
+
+        with stage_timer('llm_call') as llm_span:
+            message = await client.messages.create(...)
+    """
+    __slots__ = ('_stage', '_histogram', '_span', '_start')
+
+    def __init__(self, stage: str):
+        self._stage = stage
+        self._histogram = _STAGE_HISTOGRAMS[stage]
+
+    def __enter__(self):
+        self._span = span(self._stage)
+        current = self._span.__enter__()
+        self._start = time.perf_counter()
+        return current
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._start)
+        return self._span.__exit__(exc_type, exc, tb)
+
+
+def observe_stage(stage: str, seconds: float):
+    """
+    Record a stage duration measured by hand, for stages that cannot sit in
+    one `with` block (e.g. an LLM stream consumed across generator yields).
+    """
+    _STAGE_HISTOGRAMS[stage].observe(seconds)
+
+
+def record_cache(cache: str, hit: bool):
+    """Count a lookup in a named cache (names are fixed in code)"""
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def record_validation(outcome: str):
+    if outcome not in VALIDATION_OUTCOMES:
+        raise ValueError(f"Unknown validation outcome: {outcome}")
+    VALIDATIONS.labels(outcome=outcome).inc()
+
+
+def record_structured_output(endpoint: str, source: str):
+    """Count a structured response parsed from a tool call, from text, or not at all"""
+    if endpoint not in STRUCTURED_OUTPUT_ENDPOINTS or source not in STRUCTURED_OUTPUT_SOURCES:
+        raise ValueError(f"Unknown structured output label: {endpoint}/{source}")
+    STRUCTURED_OUTPUTS.labels(endpoint=endpoint, source=source).inc()
+    if source == 'failed':
+        print(f"[PARSE] {endpoint} response had no usable structured output")
+
+
+def record_provider_call(provider: str, outcome: str, seconds: Optional[float], circuit: str):
+    """Count one LLM provider attempt, its latency and the provider's circuit state"""
+    if provider not in LLM_PROVIDERS or outcome not in LLM_PROVIDER_OUTCOMES:
+        raise ValueError(f"Unknown provider label: {provider}/{outcome}")
+    PROVIDER_CALLS.labels(provider=provider, outcome=outcome).inc()
+    if seconds is not None:
+        PROVIDER_SECONDS.labels(provider=provider).observe(seconds)
+    PROVIDER_CIRCUIT.labels(provider=provider).set(CIRCUIT_STATE_VALUES[circuit])
+
+
+def error_kind(exc: BaseException) -> str:
+    """
+    Bounded classification of an upstream exception from the Anthropic SDK,
+    botocore or redis.
+    """
+    name = type(exc).__name__
+    status_code = getattr(exc, 'status_code', None)
+    # botocore ClientError carries the AWS error code in its response dict
+    response = getattr(exc, 'response', None)
+    error_code = response.get('Error', {}).get('Code', '') if isinstance(response, dict) else ''
+
+    if 'Timeout' in name or 'Timeout' in error_code:
+        return 'timeout'
+    if status_code == 429 or 'RateLimit' in name or 'Throttl' in error_code:
+        return 'rate_limit'
+    if status_code == 529 or 'Overloaded' in name:
+        return 'overloaded'
+    if 'Connection' in name:
+        return 'connection'
+    if isinstance(status_code, int) and status_code >= 500:
+        return 'server_error'
+    if isinstance(status_code, int) and status_code >= 400:
+        return 'client_error'
+    return 'other'
+
+
+def record_upstream_error(upstream: str, exc: BaseException):
+    """Count a failed call to 'anthropic', 'bedrock' or 'redis'"""
+    UPSTREAM_ERRORS.labels(upstream=upstream, kind=error_kind(exc)).inc()
+
+
+def render_metrics() -> Tuple[Optional[bytes], str]:
+    """Exposition body and content type; body is None without prometheus_client"""
+    if prometheus_client is None:
+        return None, 'text/plain; charset=utf-8'
+    registry = prometheus_client.REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import CollectorRegistry, multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
@@ -0,0 +1,345 @@
+import json
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis backend is optional
+    aioredis = None
+
+
+# Endpoint classes: LLM-backed endpoints are expensive, everything else is cheap
+EXPENSIVE = 'generate'
+CHEAP = 'default'
+
+DEFAULT_ENDPOINT_CLASSES: Dict[str, str] = {
+    '/api/diagrams/generate': EXPENSIVE,
+    '/api/diagrams/suggest-improvements': EXPENSIVE,
+    '/api/diagrams/suggest-improvements/stream': EXPENSIVE,
+    '/api/diagrams/refine': EXPENSIVE,
+    '/api/diagrams/refine/stream': EXPENSIVE,
+}
+
+DEFAULT_EXEMPT_PATHS = ('/', '/health', '/metrics', '/docs', '/redoc', '/openapi.json')
+
+
+@dataclass
+class Bucket:
+    """A single token bucket: `capacity` tokens, refilled at `refill_per_second`"""
+    key: str
+    capacity: float
+    refill_per_second: float
+
+
+@dataclass
+class RateLimitDecision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_seconds: int
+    retry_after_seconds: int = 0
+
+
+class InMemoryRateLimitBackend:
+    """
+    Process-local token buckets. Suitable for a single worker or as a
+    fallback; each worker enforces its own budget.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._state: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    async def acquire(self, buckets: List[Bucket], cost: float = 1.0) -> RateLimitDecision:
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            allowed = True
+            retry_after = 0.0
+            for bucket in buckets:
+                tokens, updated_at = self._state.get(bucket.key, (bucket.capacity, now))
+                tokens = min(bucket.capacity, tokens + (now - updated_at) * bucket.refill_per_second)
+                levels.append(tokens)
+                if tokens < cost:
+                    allowed = False
+                    retry_after = max(retry_after, (cost - tokens) / bucket.refill_per_second)
+
+            # All-or-nothing: only consume when every bucket has room
+            if allowed:
+                levels = [tokens - cost for tokens in levels]
+            for bucket, tokens in zip(buckets, levels):
+                self._state[bucket.key] = (tokens, now)
+
+            if len(self._state) > self.max_keys:
+                self._prune(now)
+
+        return _decision(buckets, levels, allowed, retry_after)
+
+    def _prune(self, now: float):
+        """Drop the oldest half of the buckets; they refill to full anyway"""
+        by_age = sorted(self._state.items(), key=lambda item: item[1][1])
+        for key, _ in by_age[:len(by_age) // 2]:
+            del self._state[key]
+
+
+# Atomic all-or-nothing check across several buckets.
+# KEYS: bucket keys. ARGV: cost, then (capacity, refill_per_ms) per key.
+# Returns {allowed, remaining levels as JSON, retry_after_ms}.
+TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + tonumber(t[2]) / 1000
+local cost = tonumber(ARGV[1])
+local allowed = 1
+local retry_ms = 0
+local levels = {}
+for i = 1, #KEYS do
+  local capacity = tonumber(ARGV[2 * i])
+  local rate = tonumber(ARGV[2 * i + 1])
+  local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+  local tokens = tonumber(state[1]) or capacity
+  local ts = tonumber(state[2]) or now
+  tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+  if tokens < cost then
+    allowed = 0
+    retry_ms = math.max(retry_ms, (cost - tokens) / rate)
+  end
+  levels[i] = tokens
+end
+for i = 1, #KEYS do
+  local capacity = tonumber(ARGV[2 * i])
+  local rate = tonumber(ARGV[2 * i + 1])
+  if allowed == 1 then
+    levels[i] = levels[i] - cost
+  end
+  redis.call('HSET', KEYS[i], 'tokens', levels[i], 'ts', now)
+  redis.call('PEXPIRE', KEYS[i], math.ceil((capacity - levels[i]) / rate) + 1000)
+end
+return {allowed, cjson.encode(levels), math.ceil(retry_ms)}
+"""
+
+
+class RedisRateLimitBackend:
+    """
+    Token buckets shared by all workers, evaluated atomically in one Lua
+    script round trip per request.
+    """
+
+    def __init__(self, redis_url: str, key_prefix: str = 'ratelimit:'):
+        if aioredis is None:
+            raise ImportError("Install 'redis' to use the Redis rate limit backend")
+        self.redis = aioredis.from_url(redis_url)
+        self.key_prefix = key_prefix
+        self._script = self.redis.register_script(TOKEN_BUCKET_LUA)
+
+    async def acquire(self, buckets: List[Bucket], cost: float = 1.0) -> RateLimitDecision:
+        args: List[float] = [cost]
+        for bucket in buckets:
+            args.extend([bucket.capacity, bucket.refill_per_second / 1000])
+
+        allowed, levels, retry_ms = await self._script(
+            keys=[self.key_prefix + bucket.key for bucket in buckets],
+            args=args
+        )
+        return _decision(buckets, json.loads(levels), bool(allowed), retry_ms / 1000)
+
+
+def _decision(
+    buckets: List[Bucket],
+    levels: List[float],
+    allowed: bool,
+    retry_after: float
+) -> RateLimitDecision:
+    """Summarise the bucket levels for the response headers (tightest bucket wins)"""
+    tightest = min(range(len(buckets)), key=lambda i: levels[i])
+    bucket = buckets[tightest]
+    tokens = max(0.0, levels[tightest])
+    return RateLimitDecision(
+        allowed=allowed,
+        limit=int(bucket.capacity),
+        remaining=int(tokens),
+        reset_seconds=math.ceil((bucket.capacity - tokens) / bucket.refill_per_second),
+        retry_after_seconds=0 if allowed else max(1, math.ceil(retry_after))
+    )
+
+
+class RateLimiter:
+    """
+    Per-user and per-team token buckets, each with a per-minute and a
+    per-hour window, kept separately for every endpoint class.
+
+    `user_limits` / `team_limits` map an endpoint class to
+    (per_minute, per_hour). Unknown classes use the CHEAP limits.
+    """
+
+    def __init__(
+        self,
+        backend,
+        user_limits: Dict[str, Tuple[int, int]],
+        team_limits: Dict[str, Tuple[int, int]]
+    ):
+        self.backend = backend
+        self.user_limits = user_limits
+        self.team_limits = team_limits
+
+    def buckets_for(
+        self,
+        user_key: str,
+        team_key: Optional[str],
+        endpoint_class: str
+    ) -> List[Bucket]:
+        buckets = []
+        scopes = [(user_key, self.user_limits)]
+        if team_key:
+            scopes.append((team_key, self.team_limits))
+
+        for scope_key, limits in scopes:
+            per_minute, per_hour = limits.get(endpoint_class, limits[CHEAP])
+            buckets.append(Bucket(f"{scope_key}:{endpoint_class}:m", per_minute, per_minute / 60))
+            buckets.append(Bucket(f"{scope_key}:{endpoint_class}:h", per_hour, per_hour / 3600))
+        return buckets
+
+    async def check(
+        self,
+        user_key: str,
+        team_key: Optional[str],
+        endpoint_class: str
+    ) -> RateLimitDecision:
+        return await self.backend.acquire(self.buckets_for(user_key, team_key, endpoint_class))
+
+
+def create_rate_limiter(
+    per_minute: int,
+    per_hour: int,
+    team_per_minute: int,
+    team_per_hour: int,
+    cheap_multiplier: int = 10,
+    backend: str = 'memory',
+    redis_url: Optional[str] = None
+) -> RateLimiter:
+    """
+    Build a RateLimiter from the RATE_LIMIT_* settings. The configured limits
+    apply to expensive (LLM) endpoints; cheap endpoints get `cheap_multiplier`
+    times as much.
+    """
+    if backend == 'redis':
+        store = RedisRateLimitBackend(redis_url)
+    elif backend == 'memory':
+        store = InMemoryRateLimitBackend()
+    else:
+        raise ValueError(f"Unknown rate limit backend: {backend}")
+
+    return RateLimiter(
+        store,
+        user_limits={
+            EXPENSIVE: (per_minute, per_hour),
+            CHEAP: (per_minute * cheap_multiplier, per_hour * cheap_multiplier),
+        },
+        team_limits={
+            EXPENSIVE: (team_per_minute, team_per_hour),
+            CHEAP: (team_per_minute * cheap_multiplier, team_per_hour * cheap_multiplier),
+        }
+    )
+
+
+Identity = Tuple[str, Optional[str]]
+
+
+def client_ip_identity(scope: dict) -> Identity:
+    """Identify anonymous callers by client address"""
+    client = scope.get('client')
+    return f"ip:{client[0] if client else 'unknown'}", None
+
+
+def bearer_token_identity(secret_key: str, algorithm: str) -> Callable[[dict], Identity]:
+    """
+    Identify callers by the `sub` and `team_id` claims of their bearer token,
+    falling back to the client address for anonymous or invalid tokens
+    (authentication rejects those later).
+    """
+    from jose import JWTError, jwt
+
+    def identify(scope: dict) -> Identity:
+        for name, value in scope.get('headers', []):
+            if name == b'authorization' and value[:7].lower() == b'bearer ':
+                try:
+                    payload = jwt.decode(value[7:].decode(), secret_key, algorithms=[algorithm])
+                except JWTError:
+                    break
+                team_id = payload.get('team_id')
+                return f"user:{payload.get('sub')}", f"team:{team_id}" if team_id else None
+        return client_ip_identity(scope)
+
+    return identify
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware enforcing RateLimiter decisions.
+
+    Adds RateLimit-Limit / RateLimit-Remaining / RateLimit-Reset headers to
+    every limited response and answers 429 with Retry-After when a bucket is
+    empty. If the backend is unavailable, requests are let through.
+    """
+
+    def __init__(
+        self,
+        app,
+        limiter: RateLimiter,
+        identify: Callable[[dict], Identity] = client_ip_identity,
+        endpoint_classes: Dict[str, str] = None,
+        exempt_paths: Tuple[str, ...] = DEFAULT_EXEMPT_PATHS
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.identify = identify
+        self.endpoint_classes = endpoint_classes or DEFAULT_ENDPOINT_CLASSES
+        self.exempt_paths = frozenset(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] == 'OPTIONS' or scope['path'] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        endpoint_class = self.endpoint_classes.get(scope['path'].rstrip('/'), CHEAP)
+        user_key, team_key = self.identify(scope)
+
+        try:
+            decision = await self.limiter.check(user_key, team_key, endpoint_class)
+        except Exception as e:
+            print(f"[RATE LIMIT] Backend unavailable, allowing request: {str(e)}")
+            await self.app(scope, receive, send)
+            return
+
+        headers = [
+            (b'ratelimit-limit', str(decision.limit).encode()),
+            (b'ratelimit-remaining', str(decision.remaining).encode()),
+            (b'ratelimit-reset', str(decision.reset_seconds).encode()),
+        ]
+
+        if not decision.allowed:
+            body = json.dumps({
+                'detail': 'Rate limit exceeded. Please retry later.',
+                'retry_after': decision.retry_after_seconds
+            }).encode()
+            await send({
+                'type': 'http.response.start',
+                'status': 429,
+                'headers': headers + [
+                    (b'retry-after', str(decision.retry_after_seconds).encode()),
+                    (b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode()),
+                ]
+            })
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+        async def send_with_headers(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', [])) + headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,69 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+from app.core.config import settings
+
+# min/max pin the cost so hashes created with other rounds are flagged by
+# verify_and_update and transparently rehashed on the next login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS
+)
+
+
+class HashingOverloadedError(Exception):
+    """Raised when too many password hash operations are already queued"""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing/verification in a dedicated, bounded thread pool so
+    that the ~250ms of CPU per call never blocks the event loop. bcrypt
+    releases the GIL while hashing, so threads scale across cores.
+
+    At most `max_workers` hashes run at once; beyond `max_pending` queued
+    operations callers get HashingOverloadedError instead of waiting.
+    """
+
+    def __init__(self, context: CryptContext, max_workers: int = 2, max_pending: int = 64):
+        self.context = context
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self._pending = 0
+
+    async def _run(self, func, *args):
+        if self._pending >= self.max_pending:
+            raise HashingOverloadedError("Password hashing queue is full")
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Hash a password with the current cost parameters"""
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password. If it is valid but the stored hash uses outdated
+        parameters, also return a replacement hash.
+        """
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+    async def dummy_verify(self):
+        """Spend the same time as a real verification (unknown usernames)"""
+        await self._run(self.context.dummy_verify)
+
+
+password_hasher = PasswordHasher(
+    pwd_context,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Cross-worker coalescing is optional
+    aioredis = None
+
+
+# Release the lock only if we still own it
+RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def coalescing_key(*parts: Any) -> str:
+    """
+    Stable key for a request. Text parts are whitespace-normalised so that
+    trivially different copies of the same input coalesce.
+    """
+    normalized = [' '.join(part.split()) if isinstance(part, str) else part for part in parts]
+    return hashlib.sha256(json.dumps(normalized).encode()).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls onto one in-flight execution.
+
+    Within a worker, callers with the same key await the same task. Across
+    workers (when a Redis URL is given), the first worker takes a lock and
+    publishes the result; the others wait for it on a pub/sub channel and
+    fall back to running the call themselves if it does not arrive in time.
+    Results must be JSON-serialisable.
+    """
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        namespace: str = 'singleflight',
+        lock_ttl: float = 120.0,
+        result_ttl: float = 30.0,
+        wait_timeout: float = 90.0
+    ):
+        self.namespace = namespace
+        self.lock_ttl_ms = int(lock_ttl * 1000)
+        self.result_ttl_ms = int(result_ttl * 1000)
+        self.wait_timeout = wait_timeout
+
+        self.redis = None
+        if redis_url:
+            if aioredis is None:
+                raise ImportError("Install 'redis' for cross-worker request coalescing")
+            self.redis = aioredis.from_url(redis_url)
+            self._release_lock = self.redis.register_script(RELEASE_LOCK_LUA)
+
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+
+        # Monitoring counters
+        self.executions = 0
+        self.coalesced_local = 0
+        self.coalesced_remote = 0
+        self.remote_fallbacks = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run `fn` once per key across concurrent callers.
+        Returns (result, coalesced) where coalesced is True if this caller
+        reused another request's upstream call.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced_local += 1
+            self._waiters[key] += 1
+            # Shield so one cancelled caller does not cancel the shared call
+            result, _ = await asyncio.shield(task)
+            return result, True
+
+        task = asyncio.ensure_future(self._execute(key, fn))
+        self._inflight[key] = task
+        self._waiters[key] = 0
+        try:
+            return await asyncio.shield(task)
+        finally:
+            waiters = self._waiters.pop(key, 0)
+            self._inflight.pop(key, None)
+            if waiters:
+                print(f"[SINGLE-FLIGHT] {waiters} request(s) coalesced onto {key[:12]}")
+
+    def stats(self) -> dict:
+        return {
+            'in_flight': len(self._inflight),
+            'executions': self.executions,
+            'coalesced_local': self.coalesced_local,
+            'coalesced_remote': self.coalesced_remote,
+            'remote_fallbacks': self.remote_fallbacks
+        }
+
+    async def _execute(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        if self.redis is None:
+            self.executions += 1
+            return await fn(), False
+
+        lock_key = f"{self.namespace}:lock:{key}"
+        result_key = f"{self.namespace}:result:{key}"
+        channel = f"{self.namespace}:done:{key}"
+        token = uuid.uuid4().hex
+
+        try:
+            is_leader = await self.redis.set(lock_key, token, nx=True, px=self.lock_ttl_ms)
+        except Exception as e:
+            print(f"[SINGLE-FLIGHT] Redis unavailable, running locally: {str(e)}")
+            self.executions += 1
+            return await fn(), False
+
+        if is_leader:
+            return await self._lead(fn, lock_key, result_key, channel, token), False
+
+        payload = await self._follow(result_key, channel)
+        if payload is not None and payload.get('ok'):
+            self.coalesced_remote += 1
+            return payload['value'], True
+
+        # Leader failed or timed out: do the work ourselves
+        self.remote_fallbacks += 1
+        self.executions += 1
+        return await fn(), False
+
+    async def _lead(self, fn, lock_key: str, result_key: str, channel: str, token: str) -> Any:
+        self.executions += 1
+        payload = {'ok': False}
+        try:
+            result = await fn()
+            payload = {'ok': True, 'value': result}
+            return result
+        finally:
+            try:
+                message = json.dumps(payload)
+                if payload['ok']:
+                    await self.redis.set(result_key, message, px=self.result_ttl_ms)
+                await self.redis.publish(channel, message)
+                await self._release_lock(keys=[lock_key], args=[token])
+            except Exception as e:
+                print(f"[SINGLE-FLIGHT] Failed to publish result: {str(e)}")
+
+    async def _follow(self, result_key: str, channel: str) -> Optional[dict]:
+        """Wait for the leader's result; None on timeout"""
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+
+            # The leader may have finished before we subscribed
+            cached = await self.redis.get(result_key)
+            if cached is not None:
+                return json.loads(cached)
+
+            deadline = time.monotonic() + self.wait_timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+                if message is not None:
+                    return json.loads(message['data'])
+        except Exception as e:
+            print(f"[SINGLE-FLIGHT] Waiting for remote result failed: {str(e)}")
+            return None
+        finally:
+            await pubsub.reset()
@@ -0,0 +1,296 @@
+"""
+OpenTelemetry tracing and Server-Timing.
+
+span() opens a span for one pipeline step and also records its duration
+for the request's Server-Timing header, so the frontend (and browser dev
+tools) can see where a slow request spent its time without a tracing
+backend. Incoming W3C `traceparent`/`tracestate` headers are honoured, so
+traces started by the frontend or API Gateway continue through the
+backend.
+
+Exporter selection (TRACING_EXPORTER):
+  - none     (default) no spans are exported; Server-Timing still works
+  - otlp     OTLP/HTTP to a local collector (OTEL_EXPORTER_OTLP_ENDPOINT,
+             default http://localhost:4318)
+  - file     one JSON span per line appended to TRACING_FILE
+  - console  one JSON span per line on stdout (CloudWatch on Lambda)
+
+OpenTelemetry is optional: without opentelemetry-sdk every span is a no-op.
+This module has no application imports so the Lambda layer can ship the
+same file (common/tracing.py).
+"""
+import contextvars
+import functools
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+try:
+    from opentelemetry import context as otel_context, propagate, trace
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:  # pragma: no cover - optional dependency
+    trace = None
+
+SERVER_TIMING_HEADER = 'Server-Timing'
+# Longest SQL statement recorded on a span
+STATEMENT_LIMIT = 500
+# Server-Timing entries per response; the slowest are kept
+MAX_SERVER_TIMING_ENTRIES = 12
+
+_tracer = trace.get_tracer('c4-diagrams') if trace is not None else None
+_provider = None
+
+# (name, seconds) of the steps completed in the current request
+_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    'server_timings', default=None
+)
+
+
+def setup_tracing(service_name: str, environ: Mapping[str, str] = os.environ) -> bool:
+    """
+    Install a tracer provider with the exporter named by TRACING_EXPORTER.
+    Returns False when tracing is disabled or OpenTelemetry is missing.
+    """
+    global _provider
+    exporter_name = environ.get('TRACING_EXPORTER', 'none').lower()
+    if exporter_name == 'none':
+        return False
+    if trace is None:
+        print(f"[TRACING] TRACING_EXPORTER={exporter_name} but opentelemetry-sdk is not installed")
+        return False
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+    def one_line(span):
+        return span.to_json(indent=None) + '\n'
+
+    if exporter_name == 'otlp':
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    elif exporter_name == 'file':
+        path = environ.get('TRACING_FILE', 'traces.jsonl')
+        exporter = ConsoleSpanExporter(out=open(path, 'a', buffering=1), formatter=one_line)
+    elif exporter_name == 'console':
+        exporter = ConsoleSpanExporter(formatter=one_line)
+    else:
+        raise ValueError(f"Unknown TRACING_EXPORTER: {exporter_name}")
+
+    _provider = TracerProvider(resource=Resource.create({
+        'service.name': environ.get('OTEL_SERVICE_NAME', service_name)
+    }))
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    print(f"[TRACING] Exporting spans via {exporter_name}")
+    return True
+
+
+def flush(timeout_millis: int = 2000):
+    """Export buffered spans now (call before a Lambda invocation returns)"""
+    if _provider is not None:
+        _provider.force_flush(timeout_millis)
+
+
+def _record_timing(name: str, seconds: float):
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Any]:
+    """
+    Trace one step. Yields the OpenTelemetry span (None without
+    OpenTelemetry); exceptions are recorded on the span and re-raised.
+    """
+    start = time.perf_counter()
+    try:
+        if _tracer is None:
+            yield None
+        else:
+            with _tracer.start_as_current_span(name, attributes=attributes or None) as current:
+                yield current
+    finally:
+        _record_timing(name, time.perf_counter() - start)
+
+
+def set_attributes(current: Any, **attributes):
+    """Set attributes on a span from span(); no-op for None"""
+    if current is not None:
+        for key, value in attributes.items():
+            if value is not None:
+                current.set_attribute(key, value)
+
+
+def format_server_timing(timings: List[Tuple[str, float]], total_seconds: Optional[float] = None) -> str:
+    """
+    Server-Timing header value. Repeated steps (e.g. DB queries) are
+    summed, with the count in the description.
+    """
+    totals: Dict[str, List[float]] = {}
+    for name, seconds in timings:
+        entry = totals.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    slowest = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)[:MAX_SERVER_TIMING_ENTRIES]
+    parts = []
+    for name, (seconds, count) in slowest:
+        part = f"{name};dur={seconds * 1000:.1f}"
+        if count > 1:
+            part += f';desc="{count}x"'
+        parts.append(part)
+    if total_seconds is not None:
+        parts.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ', '.join(parts)
+
+
+@contextmanager
+def server_span(name: str, headers: Mapping[str, str], **attributes) -> Iterator[Any]:
+    """
+    Root span of an incoming request, continuing the caller's trace from
+    its traceparent header, with a fresh Server-Timing collector.
+    """
+    timings_token = _timings.set([])
+    context_token = None
+    try:
+        if _tracer is None:
+            yield None
+            return
+        parent = propagate.extract({key.lower(): value for key, value in headers.items()})
+        context_token = otel_context.attach(parent)
+        with _tracer.start_as_current_span(name, kind=SpanKind.SERVER, attributes=attributes or None) as current:
+            yield current
+    finally:
+        if context_token is not None:
+            otel_context.detach(context_token)
+        _timings.reset(timings_token)
+
+
+def current_timings() -> List[Tuple[str, float]]:
+    return list(_timings.get() or [])
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware: one server span per HTTP request and a Server-Timing
+    header summarising the steps recorded while handling it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode('latin-1'): value.decode('latin-1') for key, value in scope['headers']}
+        started = time.perf_counter()
+        with server_span(
+            scope['method'],
+            headers,
+            **{'http.method': scope['method'], 'http.target': scope['path']}
+        ) as current:
+            async def send_with_timing(message):
+                if message['type'] == 'http.response.start':
+                    set_attributes(current, **{'http.status_code': message['status']})
+                    if current is not None and message['status'] >= 500:
+                        current.set_status(Status(StatusCode.ERROR))
+                    value = format_server_timing(current_timings(), time.perf_counter() - started)
+                    message = {
+                        **message,
+                        'headers': list(message.get('headers', [])) + [
+                            (b'server-timing', value.encode('latin-1'))
+                        ]
+                    }
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
+
+            # Name the span after the matched route template, not the raw path
+            route = getattr(scope.get('route'), 'path', None)
+            if current is not None and route:
+                current.update_name(f"{scope['method']} {route}")
+                current.set_attribute('http.route', route)
+
+
+def instrument_engine(engine):
+    """
+    Trace every SQL statement run through a SQLAlchemy engine as a
+    'db.query' span (statement text only, never parameters).
+    """
+    from sqlalchemy import event
+
+    def finish(context, error=None):
+        started = getattr(context, '_trace_started', None)
+        if started is None:
+            return
+        context._trace_started = None
+        _record_timing('db.query', time.perf_counter() - started)
+        current = getattr(context, '_trace_span', None)
+        if current is not None:
+            if error is not None:
+                current.record_exception(error)
+                current.set_status(Status(StatusCode.ERROR))
+            current.end()
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._trace_started = time.perf_counter()
+        context._trace_span = None
+        if _tracer is not None:
+            context._trace_span = _tracer.start_span('db.query', kind=SpanKind.CLIENT, attributes={
+                'db.system': engine.dialect.name,
+                'db.statement': statement[:STATEMENT_LIMIT]
+            })
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        finish(context)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(exception_context):
+        if exception_context.execution_context is not None:
+            finish(exception_context.execution_context, exception_context.original_exception)
+
+
+def traced_handler(handler):
+    """
+    Lambda handler decorator for API Gateway proxy events: continues the
+    trace from the request's traceparent header, adds a Server-Timing
+    header to the response and flushes spans before returning.
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        started = time.perf_counter()
+        method = event.get('httpMethod', 'INVOKE')
+        resource = event.get('resource') or event.get('path') or ''
+        with server_span(
+            f"{method} {resource}",
+            event.get('headers') or {},
+            **{
+                'http.method': method,
+                'http.route': resource,
+                'faas.invocation_id': getattr(context, 'aws_request_id', None) or ''
+            }
+        ) as current:
+            response = handler(event, context)
+            status_code = response.get('statusCode', 200) if isinstance(response, dict) else 200
+            set_attributes(current, **{'http.status_code': status_code})
+            if current is not None and status_code >= 500:
+                current.set_status(Status(StatusCode.ERROR))
+            timing = format_server_timing(current_timings(), time.perf_counter() - started)
+
+        if isinstance(response, dict):
+            response['headers'] = {
+                **(response.get('headers') or {}),
+                SERVER_TIMING_HEADER: timing,
+                'Access-Control-Expose-Headers': SERVER_TIMING_HEADER
+            }
+        flush()
+        return response
+
+    return wrapper
@@ -1,10 +1,38 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
 import anthropic
+import asyncio
+import json
 import os
+import time
 from dotenv import load_dotenv
+from app.core.rate_limit import RateLimitMiddleware, create_rate_limiter, bearer_token_identity, client_ip_identity
+from app.core.singleflight import SingleFlight, coalescing_key
+from app.core.metrics import (
+    observe_stage, record_cache, record_provider_call, record_structured_output, record_upstream_error,
+    record_validation, render_metrics, stage_timer
+)
+from app.core.tracing import TracingMiddleware, set_attributes, setup_tracing
+from app.services.mermaid_parser import sanitize_mermaid
+from app.services.refine_engine import refine_engine
+from app.services.llm_usage import llm_usage_stats
+from app.services.model_router import ModelRouter, RoutingPolicy, extract_signals
+from app.services.hedging import Attempt, Hedger, HedgePolicy
+from app.services.llm_provider import NoProviderAvailable, Provider, ProviderPool, build_providers
+from app.services.json_stream import JSONStreamParser
+from app.services.structured_output import (
+    REFINEMENT_TOOL, SUGGESTION_TOOL, SUGGESTIONS_TOOL, StructuredOutputError, extract_structured, tool_choice
+)
+from app.services.suggestion_fanout import SUGGESTION_FIELDS, fan_out, normalize_suggestion, suggestion_fanout_stats
+from app.services.prompts import (
+    GENERATE_SYSTEM_PROMPT, SUGGEST_SYSTEM_PROMPT, SUGGEST_ONE_SYSTEM_PROMPT, REFINE_SYSTEM_PROMPT,
+    SUGGESTION_ANGLES, cached_system, generate_user_prompt, suggest_user_prompt, suggest_angle_user_prompt,
+    refine_user_prompt
+)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -12,10 +40,84 @@ load_dotenv()
 # Simple mode - no database/Redis for now
 USE_DATABASE = os.getenv("USE_DATABASE", "false").lower() == "true"
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if USE_DATABASE:
+        # Write usage records still queued when uvicorn stops this worker
+        from app.services.usage_sink import usage_log_sink
+        await asyncio.to_thread(usage_log_sink.close)
+
+
 app = FastAPI(
     title="C4 Diagram Generator API",
     version="1.0.0",
-    description="C4 diagram generation with intelligent validation"
+    description="C4 diagram generation with intelligent validation",
+    lifespan=lifespan
+)
+
+# Identical concurrent generate requests share one Claude call; across workers
+# too with SINGLE_FLIGHT_USE_REDIS=true (the same opt-in as DiagramService)
+SINGLE_FLIGHT_USE_REDIS = os.getenv("SINGLE_FLIGHT_USE_REDIS", "false").lower() == "true"
+generate_single_flight = SingleFlight(
+    redis_url=os.getenv("REDIS_URL") if SINGLE_FLIGHT_USE_REDIS else None,
+    namespace="generate"
+)
+
+# "single": one completion with every suggestion; "fanout": one small completion
+# per interpretation angle in parallel, returning the first SUGGEST_COUNT
+SUGGEST_MODE = os.getenv("SUGGEST_MODE", "single").lower()
+SUGGEST_COUNT = int(os.getenv("SUGGEST_COUNT", "3"))
+SUGGEST_FANOUT_MAX_TOKENS = int(os.getenv("SUGGEST_FANOUT_MAX_TOKENS", "600"))
+
+def observe_provider_call(provider: Provider, outcome: str, seconds: Optional[float], error: Optional[BaseException]):
+    record_provider_call(provider.name, outcome, seconds, provider.breaker.state)
+    if error is not None:
+        record_upstream_error(provider.name, error)
+
+
+# Claude through the Anthropic API and/or Bedrock in LLM_PROVIDERS order; a provider
+# that keeps throttling or failing is skipped for LLM_CIRCUIT_RESET_SECONDS
+llm_providers = ProviderPool(
+    build_providers(
+        [name.strip() for name in os.getenv("LLM_PROVIDERS", "anthropic").split(",") if name.strip()],
+        anthropic_api_key=os.getenv("ANTHROPIC_API_KEY"),
+        bedrock_region=os.getenv("BEDROCK_REGION"),
+        failure_threshold=int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5")),
+        reset_timeout=float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+    ),
+    observer=observe_provider_call
+)
+
+# Generate calls with no first token by a percentile deadline get one hedged
+# duplicate, within a budget (LLM_HEDGING / LLM_HEDGE_* env vars)
+generate_hedger = Hedger(HedgePolicy.from_env())
+
+# Simple inputs go to the fast model, complex ones to the larger model (MODEL_* / ROUTING_* env vars)
+model_router = ModelRouter(RoutingPolicy.from_env(
+    fast_model="claude-3-haiku-20240307",
+    large_model="claude-3-5-sonnet-20241022"
+))
+
+# Rate limiting: token buckets per user/team and endpoint class. Added before
+# CORS so CORS wraps it and browsers can read 429s and their Retry-After
+app.add_middleware(
+    RateLimitMiddleware,
+    limiter=create_rate_limiter(
+        per_minute=int(os.getenv("RATE_LIMIT_PER_MINUTE", "10")),
+        per_hour=int(os.getenv("RATE_LIMIT_PER_HOUR", "100")),
+        team_per_minute=int(os.getenv("RATE_LIMIT_TEAM_PER_MINUTE", "60")),
+        team_per_hour=int(os.getenv("RATE_LIMIT_TEAM_PER_HOUR", "1000")),
+        cheap_multiplier=int(os.getenv("RATE_LIMIT_CHEAP_MULTIPLIER", "10")),
+        backend=os.getenv("RATE_LIMIT_BACKEND", "memory"),
+        redis_url=os.getenv("REDIS_URL")
+    ),
+    # Identify by token subject when auth is configured, else by client IP
+    identify=(
+        bearer_token_identity(os.getenv("SECRET_KEY"), os.getenv("ALGORITHM", "HS256"))
+        if os.getenv("SECRET_KEY") else client_ip_identity
+    )
 )
 
 # CORS middleware
@@ -25,8 +127,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "Retry-After", "Server-Timing"],
 )
 
+# Tracing: a span per request and pipeline step (TRACING_EXPORTER=otlp|file|console),
+# plus a Server-Timing header. Added last so it wraps the other middleware.
+setup_tracing("c4-diagram-api")
+app.add_middleware(TracingMiddleware)
+
+if USE_DATABASE:
+    # Persistence, accounts, quotas and history (app.api.*) need the database
+    # settings. Registered before the simple-mode routes below: Starlette serves
+    # the first match, so POST /api/diagrams/generate goes to DiagramService
+    from app.api import auth, diagrams, feedback, usage
+
+    app.include_router(auth.router)
+    app.include_router(diagrams.router)
+    app.include_router(feedback.router)
+    app.include_router(usage.router)
+
+    def quota_dependencies(action: str) -> list:
+        """Suggest and refine count against the caller's team quota, like generate"""
+        return [Depends(diagrams.charge_quota(action))]
+else:
+    def quota_dependencies(action: str) -> list:
+        """Simple mode has no accounts, so nothing is counted"""
+        return []
+
 
 class DiagramRequest(BaseModel):
     input_text: str
@@ -51,6 +178,7 @@ class SuggestionResponse(BaseModel):
     original_text: str
     validation_issues: list[str]
     suggestions: list[SuggestionOption]
+    metadata: Optional[dict] = None
 
 
 class RefinementRequest(BaseModel):
@@ -68,6 +196,7 @@ class RefinementResponse(BaseModel):
 class DiagramResponse(BaseModel):
     mermaid_code: str
     validation: ValidationResult
+    metadata: Optional[dict] = None
 
 
 def validate_input(text: str) -> ValidationResult:
@@ -223,65 +352,57 @@ def validate_input(text: str) -> ValidationResult:
     return ValidationResult(is_valid=True, errors=errors, warnings=warnings, suggestions=suggestions, questions=questions)
 
 
-def generate_improvement_suggestions(original_text: str, validation_result: ValidationResult) -> list[SuggestionOption]:
+def run_validation(text: str) -> ValidationResult:
+    """
+    validate_input with its latency and outcome recorded in the metrics.
+    """
+    with stage_timer("rule_validation"):
+        validation = validate_input(text)
+    
+    if validation.is_valid:
+        outcome = "valid"
+    elif any("too short" in error or "Empty input" in error for error in validation.errors):
+        outcome = "too_short"
+    elif any("gibberish" in error for error in validation.errors):
+        outcome = "blocked"
+    else:
+        outcome = "invalid"
+    record_validation(outcome)
+    return validation
+
+
+async def generate_improvement_suggestions(original_text: str, validation_result: ValidationResult) -> list[SuggestionOption]:
     """
     Use Claude to generate improved versions of the input text that would pass validation.
     """
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    if not api_key:
+    if not llm_providers.providers:
         return []
     
-    # Build a prompt for Claude to generate suggestions
-    prompt = f"""You are an expert at translating business/technical descriptions into C4 Context diagram requirements.
-
-A user provided this description:
-"{original_text}"
-
-This description has validation issues:
-{', '.join(validation_result.errors + validation_result.questions)}
-
-For C4 Level 1 (Context) diagrams, we need:
-1. THE SYSTEM being built (what software/service)
-2. USERS/ACTORS (who uses it)
-3. FUNCTIONALITY (what does it do)
-4. EXTERNAL SYSTEMS (what does it integrate with)
-
-Based on the user's description, generate 3 different interpretations that would be suitable for C4 diagrams. Each should be a complete, clear description (50-100 words) that includes all 4 required elements.
-
-Format your response as JSON:
-{{
-  "suggestions": [
-    {{
-      "title": "Brief title (5-7 words)",
-      "description": "One sentence explaining this interpretation",
-      "improved_text": "Complete description with system, users, functionality, and external systems"
-    }},
-    ... (2 more suggestions)
-  ]
-}}
-
-Make the suggestions diverse - consider different angles like:
-- Enforcement/prevention system
-- Monitoring/auditing tool
-- Automation/provisioning service
-- Governance/compliance platform
-
-Return ONLY the JSON, no other text."""
+    # Fixed instructions go in the cached system prompt; only the input varies
+    prompt = suggest_user_prompt(original_text, validation_result.errors + validation_result.questions)
 
     try:
-        client = anthropic.Anthropic(api_key=api_key, http_client=None)
-        
-        message = client.messages.create(
-            model="claude-3-haiku-20240307",
-            max_tokens=2000,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        response_text = message.content[0].text.strip()
+        model = "claude-3-haiku-20240307"
+        start = time.perf_counter()
+        with stage_timer("llm_call"):
+            message = await llm_providers.call(
+                lambda provider, model_id: provider.async_client.messages.create(
+                    model=model_id,
+                    max_tokens=2000,
+                    system=cached_system(SUGGEST_SYSTEM_PROMPT),
+                    tools=[SUGGESTIONS_TOOL],
+                    tool_choice=tool_choice(SUGGESTIONS_TOOL),
+                    messages=[{"role": "user", "content": prompt}]
+                ),
+                model
+            )
+        llm_usage_stats.record("suggest", message.usage, model, time.perf_counter() - start)
         
-        # Parse JSON response
-        import json
-        response_data = json.loads(response_text)
+        # Schema-constrained tool input, or JSON found in the text as a fallback
+        response_data, source = extract_structured(message.content, SUGGESTIONS_TOOL)
+        record_structured_output("suggest", source)
+        if response_data is None:
+            raise StructuredOutputError("No suggestions in the response")
         
         suggestions = []
         for item in response_data.get("suggestions", []):
@@ -298,72 +419,164 @@ Return ONLY the JSON, no other text."""
         return []
 
 
-def refine_diagram(current_mermaid: str, original_context: str, refinement_instruction: str) -> dict:
+async def fan_out_suggestions(
+    original_text: str,
+    validation_result: ValidationResult,
+    timings: Optional[dict] = None
+) -> AsyncIterator[tuple]:
+    """
+    Ask for one suggestion per interpretation angle in parallel and yield
+    (SuggestionOption, seconds) as each arrives, up to SUGGEST_COUNT.
+    """
+    if not llm_providers.providers:
+        return
+    
+    model = "claude-3-haiku-20240307"
+    issues = validation_result.errors + validation_result.questions
+    
+    async def suggest_from(angle: str) -> Optional[dict]:
+        start = time.perf_counter()
+        with stage_timer("llm_call") as llm_span:
+            set_attributes(llm_span, **{"llm.model": model, "suggest.angle": angle})
+            message = await llm_providers.call(
+                lambda provider, model_id: provider.async_client.messages.create(
+                    model=model_id,
+                    max_tokens=SUGGEST_FANOUT_MAX_TOKENS,
+                    system=cached_system(SUGGEST_ONE_SYSTEM_PROMPT),
+                    tools=[SUGGESTION_TOOL],
+                    tool_choice=tool_choice(SUGGESTION_TOOL),
+                    messages=[{"role": "user", "content": suggest_angle_user_prompt(original_text, issues, angle)}]
+                ),
+                model
+            )
+        llm_usage_stats.record("suggest", message.usage, model, time.perf_counter() - start)
+        data, source = extract_structured(message.content, SUGGESTION_TOOL)
+        record_structured_output("suggest", source)
+        return normalize_suggestion(data)
+    
+    async for suggestion, elapsed in fan_out(suggest_from, SUGGESTION_ANGLES, SUGGEST_COUNT, timings):
+        yield SuggestionOption(**suggestion), elapsed
+
+
+async def stream_json_completion(
+    endpoint: str,
+    system: str,
+    prompt: str,
+    tool: dict,
+    watch: list,
+    result: dict
+) -> AsyncIterator[tuple]:
+    """
+    Stream a Claude completion constrained to `tool`'s schema, yielding each
+    watched (path, value) as soon as it closes (see JSONStreamParser). The
+    tool input streams as partial JSON; plain text is parsed the same way
+    as a fallback. The complete object is stored in result["value"].
+    A provider that fails before anything was yielded fails over to the next.
+    """
+    if not llm_providers.providers:
+        raise Exception("No LLM provider configured")
+    
+    model = "claude-3-haiku-20240307"
+    error: Optional[Exception] = None
+    start = time.perf_counter()
+    try:
+        for provider in llm_providers.candidates():
+            parser = JSONStreamParser(watch)
+            yielded = False
+            attempt_start = time.perf_counter()
+            try:
+                async with provider.async_client.messages.stream(
+                    model=provider.model_id(model),
+                    max_tokens=2000,
+                    system=cached_system(system),
+                    tools=[tool],
+                    tool_choice=tool_choice(tool),
+                    messages=[{"role": "user", "content": prompt}]
+                ) as stream:
+                    async for event in stream:
+                        if event.type != "content_block_delta":
+                            continue
+                        delta = event.delta
+                        chunk = delta.partial_json if delta.type == "input_json_delta" else getattr(delta, "text", "")
+                        for path, value in parser.feed(chunk):
+                            yielded = True
+                            yield path, value
+                    message = await stream.get_final_message()
+            except Exception as e:
+                if not llm_providers.record(provider, time.perf_counter() - attempt_start, e) or yielded:
+                    raise
+                error = e
+                continue
+            except BaseException:
+                # Client disconnected (generator closed) or task cancelled mid-stream
+                llm_providers.release(provider)
+                raise
+            llm_providers.record(provider, time.perf_counter() - attempt_start)
+            break
+        else:
+            raise error
+    finally:
+        observe_stage("llm_call", time.perf_counter() - start)
+    
+    llm_usage_stats.record(endpoint, message.usage, model, time.perf_counter() - start)
+    result["value"], source = extract_structured(message.content, tool)
+    record_structured_output(endpoint, source)
+
+
+def ensure_suggestable(validation: ValidationResult):
+    """Reject inputs that are already valid, gibberish or too short to improve."""
+    if validation.is_valid:
+        raise HTTPException(
+            status_code=400,
+            detail="Input is already valid. Use /api/diagrams/generate instead."
+        )
+    
+    if any("gibberish" in error.lower() or "too short" in error.lower() for error in validation.errors):
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "Cannot generate suggestions for this input",
+                "errors": validation.errors,
+                "suggestions": validation.suggestions
+            }
+        )
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def refine_diagram(current_mermaid: str, original_context: str, refinement_instruction: str) -> dict:
     """
     Use Claude to refine an existing Mermaid diagram based on user instructions.
     """
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    if not api_key:
-        raise Exception("Anthropic API key not configured")
-    
-    prompt = f"""You are an expert at modifying Mermaid C4 diagrams based on user instructions.
-
-CURRENT DIAGRAM:
-```
-{current_mermaid}
-```
-
-ORIGINAL CONTEXT:
-{original_context}
-
-USER'S REFINEMENT REQUEST:
-"{refinement_instruction}"
-
-Your task:
-1. Understand what the user wants to change
-2. Modify the Mermaid diagram accordingly
-3. Maintain proper Mermaid syntax
-4. Keep the diagram clean and legible
-
-CRITICAL RULES:
-- Use standard Mermaid flowchart syntax (graph LR or graph TD)
-- Node IDs must be alphanumeric (no spaces, no special chars)
-- NEVER use reserved words as node IDs: "system", "application", "graph", "class", "end"
-- Keep labels SHORT and clear
-- Maintain consistent styling with classDef
-- Use icons: 👤 for users, 🔷 for systems, 📦 for external systems, 💾 for databases
-
-Common modifications:
-- REMOVE: Delete specified nodes and their connections
-- ADD: Insert new nodes with appropriate connections
-- EDIT LABEL: Change the text inside brackets [...]
-- REPOSITION: Adjust node order (left/right in LR, top/bottom in TD)
-- SIMPLIFY: Remove unnecessary details or nodes
-- ENHANCE: Add more detail or connections
-
-Format your response as JSON:
-{{
-  "updated_mermaid": "Complete updated Mermaid code",
-  "changes_made": ["List of changes", "Another change"],
-  "explanation": "Brief explanation of what was modified and why"
-}}
-
-Return ONLY the JSON, no markdown code blocks."""
+    if not llm_providers.providers:
+        raise Exception("No LLM provider configured")
+    
+    prompt = refine_user_prompt(current_mermaid, original_context, refinement_instruction)
 
     try:
-        client = anthropic.Anthropic(api_key=api_key, http_client=None)
-        
-        message = client.messages.create(
-            model="claude-3-haiku-20240307",
-            max_tokens=2000,
-            messages=[{"role": "user", "content": prompt}]
-        )
+        model = "claude-3-haiku-20240307"
+        start = time.perf_counter()
+        with stage_timer("llm_call"):
+            message = await llm_providers.call(
+                lambda provider, model_id: provider.async_client.messages.create(
+                    model=model_id,
+                    max_tokens=2000,
+                    system=cached_system(REFINE_SYSTEM_PROMPT),
+                    tools=[REFINEMENT_TOOL],
+                    tool_choice=tool_choice(REFINEMENT_TOOL),
+                    messages=[{"role": "user", "content": prompt}]
+                ),
+                model
+            )
+        llm_usage_stats.record("refine", message.usage, model, time.perf_counter() - start)
         
-        response_text = message.content[0].text.strip()
-        
-        # Parse JSON response
-        import json
-        response_data = json.loads(response_text)
+        # Schema-constrained tool input, or JSON found in the text as a fallback
+        response_data, source = extract_structured(message.content, REFINEMENT_TOOL)
+        record_structured_output("refine", source)
+        if response_data is None:
+            raise StructuredOutputError("No updated diagram in the response")
         
         return response_data
         
@@ -375,63 +588,11 @@ Return ONLY the JSON, no markdown code blocks."""
 
 
 def build_prompt(context: str) -> str:
-    """Build the prompt for Claude to generate C4 diagram."""
-    return f"""You are an expert software architect. Based on the following solution context, generate a clear, legible architecture diagram using Mermaid flowchart syntax (NOT C4Context).
-
-Solution Context:
-{context}
-
-CRITICAL SYNTAX RULES:
-1. Use standard Mermaid flowchart syntax with LEFT-TO-RIGHT (LR) direction
-2. Node IDs MUST be simple alphanumeric (no spaces, no special chars): User, S3Bucket, TransferSystem
-3. NEVER use reserved words as node IDs: "system", "application", "graph", "class", "end"
-4. If you need to use a reserved word, prefix it: node_system, node_application
-5. Labels go inside brackets and can have any text: User[👤 User<br/>Uploads files]
-
-CORRECT SYNTAX EXAMPLES:
-✓ User[👤 User]
-✓ S3Bucket[📦 Amazon S3]
-✓ TransferSys[🔷 Transfer System]
-✓ SFTPServer[📦 SFTP Server]
-
-TEMPLATE TO FOLLOW:
-```
-graph LR
-    %% Define nodes with clear IDs and styled labels
-    UserNode[👤 User<br/>Description]
-    MainSystem[🔷 System Name<br/>Description]
-    ExternalSvc[📦 External System<br/>Description]
-    
-    %% Define relationships with clear labels
-    UserNode -->|Action description| MainSystem
-    MainSystem -->|Action description| ExternalSvc
-    
-    %% Apply styling
-    classDef userStyle fill:#08427B,stroke:#052E56,color:#fff
-    classDef systemStyle fill:#1168BD,stroke:#0B4884,color:#fff
-    classDef externalStyle fill:#999,stroke:#666,color:#fff
-    
-    class UserNode userStyle
-    class MainSystem systemStyle
-    class ExternalSvc externalStyle
-```
-
-RULES FOR LEGIBLE DIAGRAMS:
-1. ALWAYS use "graph LR" (Left-to-Right) for simple diagrams (≤5 elements)
-2. Use "graph TD" (Top-Down) only for complex hierarchies (>5 elements)
-3. Keep labels SHORT (max 3-4 words per line)
-4. Use <br/> to break long text into multiple lines
-5. Add icons: 👤 for users, 🔷 for systems, 📦 for external systems, 💾 for databases
-6. Use clear, descriptive relationship labels on arrows
-7. Apply consistent styling with classDef
-
-STYLING GUIDE:
-- Users/Actors: Dark blue (#08427B)
-- Main Systems: Blue (#1168BD)
-- External Systems: Gray (#999)
-- Databases/Storage: Green (#2E7D32)
-
-Generate a clean, horizontal, legible diagram following these rules. Return ONLY the Mermaid code without markdown code blocks."""
+    """
+    Build the variable part of the generate prompt. The rules and template
+    are sent separately as the cached GENERATE_SYSTEM_PROMPT.
+    """
+    return generate_user_prompt(context)
 
 
 @app.get("/")
@@ -449,35 +610,73 @@ async def health_check():
     return {"status": "healthy"}
 
 
-@app.post("/api/diagrams/suggest-improvements", response_model=SuggestionResponse)
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: per-stage latency, cache hits, validation outcomes, upstream errors."""
+    body, content_type = render_metrics()
+    if body is None:
+        return Response("prometheus_client is not installed\n", status_code=503, media_type=content_type)
+    return Response(body, media_type=content_type)
+
+
+@app.get("/api/diagrams/generate/stats")
+async def generate_stats():
+    """Request coalescing and hedging counters for the generate endpoint."""
+    return {**generate_single_flight.stats(), "hedging": generate_hedger.stats()}
+
+
+@app.get("/api/llm/routing")
+async def llm_routing():
+    """Model routing policy with the per-model call, latency and cost split."""
+    return model_router.stats()
+
+
+@app.get("/api/llm/providers")
+async def llm_provider_stats():
+    """Per-provider circuit state, call outcomes, error rate and latency."""
+    return llm_providers.stats()
+
+
+@app.get("/api/llm/usage")
+async def llm_usage():
+    """Token counts and cost per endpoint and model, including prompt-cache reads and writes."""
+    return llm_usage_stats.stats()
+
+
+@app.get("/api/diagrams/refine/stats")
+async def refine_stats():
+    """Share of refinements served by the local engine vs the LLM."""
+    return refine_engine.stats()
+
+
+@app.get("/api/diagrams/suggest/stats")
+async def suggest_stats():
+    """Time to first and last suggestion in fan-out mode."""
+    return {"mode": SUGGEST_MODE, **suggestion_fanout_stats.stats()}
+
+
+@app.post("/api/diagrams/suggest-improvements", response_model=SuggestionResponse, dependencies=quota_dependencies("suggest"))
 async def suggest_improvements(request: DiagramRequest):
     """
     Analyze input and suggest improved versions that would pass validation.
     This is called when validation fails but the input isn't complete gibberish.
     """
     # Validate input
-    validation = validate_input(request.input_text)
+    validation = run_validation(request.input_text)
     
-    # If it's valid, no need for suggestions
-    if validation.is_valid:
-        raise HTTPException(
-            status_code=400,
-            detail="Input is already valid. Use /api/diagrams/generate instead."
-        )
-    
-    # If it's gibberish or too short, don't generate suggestions
-    if any("gibberish" in error.lower() or "too short" in error.lower() for error in validation.errors):
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "message": "Cannot generate suggestions for this input",
-                "errors": validation.errors,
-                "suggestions": validation.suggestions
-            }
-        )
+    # Valid, gibberish or too short inputs get no suggestions
+    ensure_suggestable(validation)
     
     # Generate improvement suggestions using Claude
-    suggestions = generate_improvement_suggestions(request.input_text, validation)
+    metadata = None
+    if SUGGEST_MODE == "fanout":
+        timings = {}
+        suggestions = [
+            suggestion async for suggestion, _ in fan_out_suggestions(request.input_text, validation, timings)
+        ]
+        metadata = {"mode": "fanout", "timings": timings}
+    else:
+        suggestions = await generate_improvement_suggestions(request.input_text, validation)
     
     if not suggestions:
         raise HTTPException(
@@ -488,22 +687,91 @@ async def suggest_improvements(request: DiagramRequest):
     return SuggestionResponse(
         original_text=request.input_text,
         validation_issues=validation.errors + validation.questions,
-        suggestions=suggestions
+        suggestions=suggestions,
+        metadata=metadata
     )
 
 
-@app.post("/api/diagrams/refine", response_model=RefinementResponse)
+@app.post("/api/diagrams/suggest-improvements/stream", dependencies=quota_dependencies("suggest"))
+async def suggest_improvements_stream(request: DiagramRequest):
+    """
+    Suggestions as Server-Sent Events: a `suggestion` event as each one is
+    ready, then `done` with the timings (or `error` if none came back). In
+    fan-out mode each angle's call is one suggestion; otherwise the single
+    completion is parsed as it streams and each suggestions[i] is sent as
+    soon as its object closes.
+    """
+    validation = run_validation(request.input_text)
+    ensure_suggestable(validation)
+    issues = validation.errors + validation.questions
+    
+    async def single_completion(timings: dict):
+        start = time.perf_counter()
+        elapsed = []
+        try:
+            async for _, item in stream_json_completion(
+                "suggest",
+                SUGGEST_SYSTEM_PROMPT,
+                suggest_user_prompt(request.input_text, issues),
+                SUGGESTIONS_TOOL,
+                [("suggestions", "*")],
+                {}
+            ):
+                if isinstance(item, dict) and all(isinstance(item.get(field), str) for field in SUGGESTION_FIELDS):
+                    elapsed.append(time.perf_counter() - start)
+                    yield SuggestionOption(**{field: item[field] for field in SUGGESTION_FIELDS}), elapsed[-1]
+        except Exception as e:
+            # Keep whatever suggestions already streamed
+            print(f"Error streaming suggestions: {str(e)}")
+        timings.update({
+            "returned": len(elapsed),
+            "first_ms": round(elapsed[0] * 1000, 1) if elapsed else None,
+            "last_ms": round(elapsed[-1] * 1000, 1) if elapsed else None
+        })
+    
+    async def events():
+        timings = {}
+        if SUGGEST_MODE == "fanout":
+            suggestions = fan_out_suggestions(request.input_text, validation, timings)
+        else:
+            suggestions = single_completion(timings)
+        index = 0
+        async for suggestion, elapsed in suggestions:
+            yield sse_event("suggestion", {
+                "index": index,
+                "suggestion": suggestion.model_dump(),
+                "elapsed_ms": round(elapsed * 1000, 1)
+            })
+            index += 1
+        if index == 0:
+            yield sse_event("error", {"detail": "Failed to generate suggestions. Please try rephrasing your input."})
+        else:
+            yield sse_event("done", {"validation_issues": issues, "mode": SUGGEST_MODE, "timings": timings})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/diagrams/refine", response_model=RefinementResponse, dependencies=quota_dependencies("refine"))
 async def refine_diagram_endpoint(request: RefinementRequest):
     """
     Refine an existing diagram based on user instructions.
     Supports operations like: remove, add, edit labels, reposition, simplify, enhance.
+    Simple edits are applied locally; everything else goes to Claude.
     """
     try:
-        result = refine_diagram(
-            request.current_mermaid,
-            request.original_context,
-            request.refinement_instruction
-        )
+        result = refine_engine.try_refine(request.current_mermaid, request.refinement_instruction)
+        refine_engine.record(served_locally=result is not None)
+        record_cache("refine_local", result is not None)
+        if result is None:
+            result = await refine_diagram(
+                request.current_mermaid,
+                request.original_context,
+                request.refinement_instruction
+            )
         
         return RefinementResponse(
             updated_mermaid=result["updated_mermaid"],
@@ -518,12 +786,66 @@ async def refine_diagram_endpoint(request: RefinementRequest):
         )
 
 
+@app.post("/api/diagrams/refine/stream", dependencies=quota_dependencies("refine"))
+async def refine_diagram_stream(request: RefinementRequest):
+    """
+    Refinement as Server-Sent Events: `updated_mermaid` as soon as that field
+    of the streamed response closes, then `done` with the full result (or
+    `error`). Local edits are sent at once without calling Claude.
+    """
+    result = refine_engine.try_refine(request.current_mermaid, request.refinement_instruction)
+    refine_engine.record(served_locally=result is not None)
+    record_cache("refine_local", result is not None)
+    
+    async def events():
+        if result is not None:
+            yield sse_event("updated_mermaid", {"updated_mermaid": result["updated_mermaid"]})
+            yield sse_event("done", {**result, "served_locally": True})
+            return
+        
+        streamed = {}
+        parsed = {}
+        try:
+            async for _, updated_mermaid in stream_json_completion(
+                "refine",
+                REFINE_SYSTEM_PROMPT,
+                refine_user_prompt(request.current_mermaid, request.original_context, request.refinement_instruction),
+                REFINEMENT_TOOL,
+                [("updated_mermaid",)],
+                parsed
+            ):
+                streamed["updated_mermaid"] = updated_mermaid
+                yield sse_event("updated_mermaid", {"updated_mermaid": updated_mermaid})
+        except Exception as e:
+            print(f"Error streaming refinement: {str(e)}")
+            if "updated_mermaid" not in streamed:
+                yield sse_event("error", {"detail": f"Failed to refine diagram: {str(e)}"})
+                return
+        
+        value = parsed.get("value") if isinstance(parsed.get("value"), dict) else {}
+        if "updated_mermaid" not in streamed and "updated_mermaid" not in value:
+            yield sse_event("error", {"detail": "Failed to refine diagram: no updated diagram in the response"})
+            return
+        yield sse_event("done", {
+            "updated_mermaid": value.get("updated_mermaid", streamed.get("updated_mermaid")),
+            "changes_made": value.get("changes_made", []),
+            "explanation": value.get("explanation", ""),
+            "served_locally": False
+        })
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.post("/api/diagrams/generate", response_model=DiagramResponse)
 async def generate_diagram(request: DiagramRequest):
     """Generate C4 diagram from input text."""
     
     # Validate input
-    validation = validate_input(request.input_text)
+    validation = run_validation(request.input_text)
     
     if not validation.is_valid:
         raise HTTPException(
@@ -536,42 +858,68 @@ async def generate_diagram(request: DiagramRequest):
             }
         )
     
-    # Get Anthropic API key from environment
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="Anthropic API key not configured")
+    # Anthropic API key and/or Bedrock from LLM_PROVIDERS
+    if not llm_providers.providers:
+        raise HTTPException(status_code=500, detail="No LLM provider configured (set ANTHROPIC_API_KEY or LLM_PROVIDERS)")
     
     # Generate diagram using Claude
     try:
-        # Create client without proxy settings
-        client = anthropic.Anthropic(
-            api_key=api_key,
-            http_client=None  # Don't use custom http client
-        )
         prompt = build_prompt(request.input_text)
+        routing = model_router.route(extract_signals(request.input_text, validation))
         
-        message = client.messages.create(
-            model="claude-3-haiku-20240307",
-            max_tokens=2000,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
+        async def stream_attempt(client, model_id: str, attempt: Attempt) -> anthropic.types.Message:
+            # Streamed so the hedger sees the first token; the loser is cancelled mid-stream
+            async with client.messages.stream(
+                model=model_id,
+                max_tokens=2000,
+                system=cached_system(GENERATE_SYSTEM_PROMPT),
+                messages=[
+                    {"role": "user", "content": prompt}
+                ]
+            ) as stream:
+                async for event in stream:
+                    if event.type == "content_block_delta":
+                        attempt.first_token()
+                return await stream.get_final_message()
+        
+        async def hedged_call(provider: Provider, model_id: str) -> anthropic.types.Message:
+            # Hedges go to the same provider; failover happens around them
+            return await generate_hedger.run(
+                lambda attempt: stream_attempt(provider.async_client, model_id, attempt),
+                key=model_id
+            )
         
-        mermaid_code = message.content[0].text.strip()
+        async def call_claude() -> str:
+            start = time.perf_counter()
+            with stage_timer("llm_call") as llm_span:
+                set_attributes(llm_span, **{"llm.model": routing.model})
+                message = await llm_providers.call(hedged_call, routing.model)
+            elapsed = time.perf_counter() - start
+            usage = llm_usage_stats.record("generate", message.usage, routing.model, elapsed)
+            model_router.record(routing.model, elapsed, usage)
+            return message.content[0].text.strip()
         
-        # Clean up the response - remove markdown code blocks if present
-        mermaid_code = mermaid_code.replace("```mermaid\n", "")
-        mermaid_code = mermaid_code.replace("```mermaid", "")
-        mermaid_code = mermaid_code.replace("```\n", "")
-        mermaid_code = mermaid_code.replace("```", "")
-        mermaid_code = mermaid_code.strip()
+        mermaid_code, coalesced = await generate_single_flight.do(
+            coalescing_key(request.input_text, routing.model),
+            call_claude
+        )
+        record_cache("generate_coalescing", coalesced)
+        
+        # Clean up the response - strip markdown code blocks and fix reserved node IDs
+        mermaid_code = sanitize_mermaid(mermaid_code)
         
         return DiagramResponse(
             mermaid_code=mermaid_code,
-            validation=validation
+            validation=validation,
+            metadata={
+                "model": routing.model,
+                "routing": routing.metadata(),
+                "coalesced": coalesced
+            }
         )
         
+    except NoProviderAvailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         import traceback
         print(f"Error generating diagram: {str(e)}")
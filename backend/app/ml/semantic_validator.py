@@ -5,6 +5,7 @@ from typing import List, Tuple, Optional
 from sqlalchemy.orm import Session
 from app.models.database import ValidatedInput, LearnedPattern
 from app.core.config import settings
+from app.core.metrics import stage_timer
 
 
 class SemanticValidator:
@@ -32,32 +33,34 @@ class SemanticValidator:
         Returns list of (ValidatedInput, similarity_score) tuples.
         """
         # Generate embedding for input
-        input_embedding = self.encode_text(input_text)
+        with stage_timer('embedding'):
+            input_embedding = self.encode_text(input_text)
         
-        # Query validated inputs with embeddings
-        validated_inputs = db.query(ValidatedInput).filter(
-            ValidatedInput.embedding.isnot(None),
-            ValidatedInput.user_feedback == 'valid'
-        ).all()
-        
-        if not validated_inputs:
-            return []
-        
-        # Calculate similarities
-        similarities = []
-        for validated in validated_inputs:
-            if validated.embedding:
-                # Convert pgvector to numpy array
-                stored_embedding = np.array(validated.embedding)
-                similarity = cosine_similarity(
-                    input_embedding.reshape(1, -1),
-                    stored_embedding.reshape(1, -1)
-                )[0][0]
-                similarities.append((validated, float(similarity)))
-        
-        # Sort by similarity and return top_k
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return similarities[:top_k]
+        with stage_timer('vector_search'):
+            # Query validated inputs with embeddings
+            validated_inputs = db.query(ValidatedInput).filter(
+                ValidatedInput.embedding.isnot(None),
+                ValidatedInput.user_feedback == 'valid'
+            ).all()
+            
+            if not validated_inputs:
+                return []
+            
+            # Calculate similarities
+            similarities = []
+            for validated in validated_inputs:
+                if validated.embedding:
+                    # Convert pgvector to numpy array
+                    stored_embedding = np.array(validated.embedding)
+                    similarity = cosine_similarity(
+                        input_embedding.reshape(1, -1),
+                        stored_embedding.reshape(1, -1)
+                    )[0][0]
+                    similarities.append((validated, float(similarity)))
+            
+            # Sort by similarity and return top_k
+            similarities.sort(key=lambda x: x[1], reverse=True)
+            return similarities[:top_k]
     
     def validate_semantically(
         self, 
@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, Boolean, ARRAY
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, Boolean, ARRAY, Index, UniqueConstraint
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from pgvector.sqlalchemy import Vector
 from app.core.database import Base
+from app.core.compression import CompressedText
 
 
 class User(Base):
@@ -40,11 +41,12 @@ class ValidatedInput(Base):
     __tablename__ = "validated_inputs"
     
     id = Column(Integer, primary_key=True, index=True)
-    input_text = Column(Text, nullable=False)
+    input_text = Column(CompressedText, nullable=False)
     embedding = Column(Vector(384))  # Dimension for all-MiniLM-L6-v2
     validation_score = Column(Float)
     user_feedback = Column(String)  # 'valid', 'invalid', 'needs_improvement'
-    generated_diagram = Column(Text)
+    # Deferred: loaded (and decompressed) only when accessed
+    generated_diagram = deferred(Column(CompressedText))
     pattern_type = Column(String(50))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -54,12 +56,24 @@ class ValidatedInput(Base):
 
 class Diagram(Base):
     __tablename__ = "diagrams"
+    __table_args__ = (
+        # Serves the per-user history listing (ORDER BY created_at DESC, id DESC)
+        # for both keyset and offset pagination. The INCLUDE columns cover the
+        # summary projection so list pages can be answered by index-only scans.
+        Index(
+            "ix_diagrams_user_id_created_at_id",
+            "user_id", "created_at", "id",
+            postgresql_include=["title", "diagram_type", "version", "updated_at"]
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     description = Column(Text)
-    input_text = Column(Text, nullable=False)
-    mermaid_code = Column(Text, nullable=False)
+    # Compressed and deferred: loaded and decompressed together on first
+    # access, or up front with undefer_group("content")
+    input_text = deferred(Column(CompressedText, nullable=False), group="content")
+    mermaid_code = deferred(Column(CompressedText, nullable=False), group="content")
     diagram_type = Column(String(50))  # 'context', 'container', 'component'
     version = Column(Integer, default=1)
     parent_id = Column(Integer, ForeignKey("diagrams.id"))  # For versioning
@@ -70,6 +84,38 @@ class Diagram(Base):
     
     user = relationship("User", back_populates="diagrams")
     parent = relationship("Diagram", remote_side=[id])
+    revisions = relationship("DiagramRevision", back_populates="diagram", cascade="all, delete-orphan")
+
+
+class DiagramRevision(Base):
+    """
+    One version of a diagram. Every few versions store full text
+    (snapshots); the rest store line-level deltas against their parent
+    revision. The Diagram row keeps the latest content materialized.
+    """
+    __tablename__ = "diagram_revisions"
+    __table_args__ = (
+        UniqueConstraint("diagram_id", "version", name="uq_diagram_revisions_diagram_version"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    diagram_id = Column(Integer, ForeignKey("diagrams.id", ondelete="CASCADE"), nullable=False)
+    parent_revision_id = Column(Integer, ForeignKey("diagram_revisions.id"), index=True)
+    version = Column(Integer, nullable=False)
+    is_snapshot = Column(Boolean, nullable=False, default=False)
+    delta_depth = Column(Integer, nullable=False, default=0)  # Deltas since the nearest snapshot
+    # Full text on snapshots, NULL on deltas
+    mermaid_code = deferred(Column(CompressedText), group="content")
+    input_text = deferred(Column(CompressedText), group="content")
+    # Encoded line deltas against the parent revision (see line_delta)
+    mermaid_delta = Column(Text)
+    input_delta = Column(Text)
+    change_note = Column(Text)  # e.g. the refinement instruction
+    user_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    diagram = relationship("Diagram", back_populates="revisions")
+    parent = relationship("DiagramRevision", remote_side=[id])
 
 
 class UserFeedback(Base):
@@ -105,17 +151,52 @@ class LearnedPattern(Base):
 
 class UsageLog(Base):
     __tablename__ = "usage_logs"
+    __table_args__ = (
+        # Quota reconciliation and team stats scan one team's month at a time
+        Index("ix_usage_logs_team_id_created_at", "team_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     team_id = Column(Integer, ForeignKey("teams.id"))
     action = Column(String(50))  # 'generate', 'validate', 'save'
     input_length = Column(Integer)
-    tokens_used = Column(Integer)
-    cost_estimate = Column(Float)
+    # Token counts as reported by the API; NULL on rows logged before they
+    # were captured (tokens_used/cost_estimate on those rows are estimates)
+    model = Column(String(100))
+    input_tokens = Column(Integer)
+    output_tokens = Column(Integer)
+    cache_read_tokens = Column(Integer)
+    cache_write_tokens = Column(Integer)
+    latency_ms = Column(Float)
+    tokens_used = Column(Integer)  # Sum of all token counts above
+    cost_estimate = Column(Float)  # USD, priced with price_version
+    price_version = Column(String(20))
     success = Column(Boolean)
     error_message = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     user = relationship("User")
     team = relationship("Team", back_populates="usage_logs")
+
+
+class TeamUsageCounter(Base):
+    """
+    Per-team monthly request counter used for quota enforcement.
+    Incremented atomically on each quota-counted call and periodically
+    reconciled against UsageLog.
+    """
+    __tablename__ = "team_usage_counters"
+    __table_args__ = (
+        UniqueConstraint("team_id", "period", name="uq_team_usage_counters_team_period"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
+    period = Column(String(7), nullable=False)  # 'YYYY-MM'
+    request_count = Column(Integer, nullable=False, default=0)
+    quota_limit = Column(Integer)  # Team.api_quota_per_month when the period started
+    reconciled_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    team = relationship("Team")
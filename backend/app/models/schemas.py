@@ -82,11 +82,51 @@ class DiagramResponse(BaseModel):
         from_attributes = True
 
 
+class DiagramSummary(BaseModel):
+    """
+    Lightweight diagram projection for history listings.
+    Large text columns are only populated when requested via `include`.
+    """
+    id: int
+    title: str
+    diagram_type: Optional[str]
+    version: int
+    created_at: datetime
+    updated_at: Optional[datetime]
+    description: Optional[str] = None
+    input_text: Optional[str] = None
+    mermaid_code: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class DiagramVersionCreate(BaseModel):
+    mermaid_code: str = Field(..., min_length=1)
+    input_text: Optional[str] = None  # Defaults to the base version's input
+    change_note: Optional[str] = Field(None, max_length=1000)
+    base_version: Optional[int] = None  # Branch from an older version
+
+
+class DiagramVersionSummary(BaseModel):
+    version: int
+    parent_version: Optional[int] = None
+    is_snapshot: bool
+    change_note: Optional[str] = None
+    created_at: datetime
+
+
+class DiagramVersionResponse(DiagramVersionSummary):
+    mermaid_code: str
+    input_text: str
+
+
 class DiagramListResponse(BaseModel):
-    diagrams: List[DiagramResponse]
-    total: int
+    diagrams: List[DiagramSummary]
+    total: Optional[int] = None  # Cached; omitted when include_total=false
     page: int
     page_size: int
+    next_cursor: Optional[str] = None  # Opaque keyset cursor for the next page
 
 
 # Analytics Schemas
@@ -105,6 +145,29 @@ class TeamUsageStats(UsageStats):
     quota_remaining: int
 
 
+class UsageBreakdownRow(BaseModel):
+    model: Optional[str] = None
+    action: Optional[str] = None
+    team_id: Optional[int] = None
+    calls: int
+    estimated_calls: int  # Rows logged before token counts were captured
+    input_tokens: int
+    output_tokens: int
+    cache_read_tokens: int
+    cache_write_tokens: int
+    cost_usd: float
+    avg_latency_ms: Optional[float] = None
+
+
+class UsageBreakdown(BaseModel):
+    start: datetime
+    end: datetime
+    group_by: List[str]
+    price_version: Optional[str] = None  # Set when costs were re-priced
+    total_cost_usd: float
+    rows: List[UsageBreakdownRow]
+
+
 # Learning System Schemas
 class SimilarPattern(BaseModel):
     pattern_name: str
@@ -1,10 +1,23 @@
-from anthropic import Anthropic
 from sqlalchemy.orm import Session
 from app.core.config import settings
+from app.core.metrics import record_cache, record_provider_call, record_upstream_error, stage_timer
+from app.core.tracing import set_attributes, span
+from app.core.singleflight import SingleFlight, coalescing_key
 from app.models.database import Diagram, UsageLog
 from app.models.schemas import DiagramGenerateRequest, DiagramGenerateResponse, ValidationResult
 from app.services.validation_service import ValidationService
-from typing import Optional
+from app.services.usage_sink import usage_log_sink
+from app.services.quota_service import QuotaService
+from app.services.mermaid_parser import sanitize_mermaid, strip_code_fences
+from app.services.prompts import GENERATE_SYSTEM_PROMPT, cached_system, generate_user_prompt
+from app.services.llm_usage import USAGE_FIELDS, llm_usage_stats
+from app.services.model_router import ModelRouter, RoutingPolicy, extract_signals
+from app.services.hedging import Attempt, Hedger, HedgePolicy
+from app.services.llm_provider import Provider, ProviderPool, build_providers
+from app.services.pricing import CURRENT_PRICE_VERSION, cost_usd
+from datetime import datetime, timezone
+import time
+from typing import Optional, Tuple
 
 
 class DiagramService:
@@ -13,24 +26,60 @@ class DiagramService:
     """
     
     def __init__(self):
-        self.client = Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+        # Anthropic API and/or Bedrock, with circuit breaking and failover
+        self.providers = ProviderPool(
+            build_providers(
+                settings.LLM_PROVIDERS,
+                anthropic_api_key=settings.ANTHROPIC_API_KEY,
+                bedrock_region=settings.BEDROCK_REGION,
+                failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=settings.LLM_CIRCUIT_RESET_SECONDS
+            ),
+            observer=self._observe_provider_call
+        )
+        # Identical concurrent requests share one Claude call (across workers via Redis)
+        self.single_flight = SingleFlight(
+            redis_url=settings.REDIS_URL if settings.SINGLE_FLIGHT_USE_REDIS else None,
+            namespace='generate'
+        )
         self.validation_service = ValidationService()
+        self.quota_service = QuotaService()
+        self.model_router = ModelRouter(RoutingPolicy(
+            fast_model=settings.MODEL_FAST,
+            large_model=settings.MODEL_LARGE,
+            mode=settings.MODEL_ROUTING_MODE,
+            max_fast_words=settings.ROUTING_MAX_FAST_WORDS,
+            max_fast_components=settings.ROUTING_MAX_FAST_COMPONENTS,
+            max_fast_gaps=settings.ROUTING_MAX_FAST_GAPS,
+            min_fast_score=settings.ROUTING_MIN_FAST_SCORE
+        ))
+        # Slow first tokens get one duplicate request, within a budget
+        self.hedger = Hedger(HedgePolicy(
+            enabled=settings.LLM_HEDGING,
+            percentile=settings.LLM_HEDGE_PERCENTILE,
+            min_delay_ms=settings.LLM_HEDGE_MIN_DELAY_MS,
+            max_delay_ms=settings.LLM_HEDGE_MAX_DELAY_MS,
+            min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+            budget_percent=settings.LLM_HEDGE_BUDGET_PERCENT
+        ))
     
     async def generate_diagram(
         self,
         request: DiagramGenerateRequest,
         user_id: int,
-        db: Session
+        db: Session,
+        team_id: Optional[int] = None
     ) -> DiagramGenerateResponse:
         """
         Generate a C4 diagram from solution overview text.
         """
         # Step 1: Validate input
-        validation = await self.validation_service.validate_with_learning(
-            request.input_text,
-            user_id,
-            db
-        )
+        with span('validate'):
+            validation = await self.validation_service.validate_with_learning(
+                request.input_text,
+                user_id,
+                db
+            )
         
         if not validation.is_valid:
             # Return validation errors without generating
@@ -41,40 +90,58 @@ class DiagramService:
                 metadata={'generated': False, 'reason': 'validation_failed'}
             )
         
-        # Step 2: Build intelligent prompt
-        prompt = self._build_prompt(request.input_text, request.diagram_type)
+        # Step 2: Build intelligent prompt and pick a model for its complexity
+        with span('route') as route_span:
+            prompt = self._build_prompt(request.input_text, request.diagram_type)
+            routing = self.model_router.route(
+                extract_signals(request.input_text, validation, request.diagram_type)
+            )
+            set_attributes(route_span, **{'llm.model': routing.model, 'llm.tier': routing.tier})
         
-        # Step 3: Generate diagram with Claude
+        # Step 3: Generate diagram with Claude, coalescing identical in-flight requests
         try:
-            mermaid_code = await self._generate_with_claude(prompt)
+            (mermaid_code, call), coalesced = await self.single_flight.do(
+                coalescing_key(request.input_text, request.diagram_type, routing.model),
+                lambda: self._generate_with_claude(prompt, routing.model)
+            )
+            record_cache('generate_coalescing', coalesced)
+            if coalesced:
+                # The leader's request pays for the call; followers used no tokens
+                call = {'model': routing.model}
             
             # Step 4: Sanitize generated code
-            mermaid_code = self._sanitize_mermaid_code(mermaid_code)
+            with span('sanitize'):
+                mermaid_code = self._sanitize_mermaid_code(mermaid_code)
             
             # Step 5: Save diagram if requested
             diagram_id = None
             if request.save_diagram:
-                diagram = Diagram(
-                    title=request.title or f"Diagram - {request.diagram_type}",
-                    description=request.input_text[:500],
-                    input_text=request.input_text,
-                    mermaid_code=mermaid_code,
-                    diagram_type=request.diagram_type,
-                    user_id=user_id
-                )
-                db.add(diagram)
-                db.commit()
-                db.refresh(diagram)
-                diagram_id = diagram.id
+                with span('save'):
+                    diagram = Diagram(
+                        title=request.title or f"Diagram - {request.diagram_type}",
+                        description=request.input_text[:500],
+                        input_text=request.input_text,
+                        mermaid_code=mermaid_code,
+                        diagram_type=request.diagram_type,
+                        user_id=user_id
+                    )
+                    db.add(diagram)
+                    with stage_timer('db_commit'):
+                        db.commit()
+                    db.refresh(diagram)
+                    diagram_id = diagram.id
             
-            # Step 6: Log usage
-            self._log_usage(
-                user_id=user_id,
-                action='generate',
-                input_length=len(request.input_text),
-                success=True,
-                db=db
-            )
+            # Step 6: Log usage and count it against the team quota
+            with span('usage'):
+                self.quota_service.increment(team_id, db)
+                await self._log_usage(
+                    user_id=user_id,
+                    team_id=team_id,
+                    action='generate',
+                    input_length=len(request.input_text),
+                    success=True,
+                    call=call
+                )
             
             return DiagramGenerateResponse(
                 diagram_id=diagram_id,
@@ -83,148 +150,150 @@ class DiagramService:
                 metadata={
                     'generated': True,
                     'diagram_type': request.diagram_type,
-                    'model': 'claude-3-haiku-20240307'
+                    'model': routing.model,
+                    'routing': routing.metadata(),
+                    'coalesced': coalesced
                 }
             )
             
         except Exception as e:
             # Log failure
-            self._log_usage(
+            await self._log_usage(
                 user_id=user_id,
+                team_id=team_id,
                 action='generate',
                 input_length=len(request.input_text),
                 success=False,
                 error_message=str(e),
-                db=db
+                call={'model': routing.model}
             )
             raise
     
-    def _build_prompt(self, context: str, diagram_type: str) -> str:
+    async def record_request(self, action: str, user_id: int, db: Session, team_id: Optional[int] = None):
         """
-        Build intelligent prompt for Claude based on context analysis.
+        Count a successful suggest or refine request against the team quota
+        and log it, as generate_diagram does for generate. Reconciliation
+        rebuilds counters from these usage rows.
         """
-        base_prompt = f"""You are an expert software architect. Generate a clear, legible {diagram_type} diagram using Mermaid flowchart syntax.
-
-Solution Context:
-{context}
-
-CRITICAL SYNTAX RULES:
-1. Use standard Mermaid flowchart syntax: "graph LR" (Left-to-Right) or "graph TD" (Top-Down)
-2. Node IDs MUST be simple alphanumeric (no spaces, no special chars): UserNode, S3Bucket, TransferSys
-3. NEVER use reserved words as node IDs: "system", "application", "graph", "class", "end"
-4. If you need to use a reserved word, prefix it: node_system, node_application
-5. Labels go inside brackets: UserNode[👤 User<br/>Description]
-
-TEMPLATE:
-```
-graph LR
-    UserNode[👤 User<br/>Description]
-    MainSys[🔷 System Name<br/>Description]
-    ExternalSvc[📦 External System<br/>Description]
-    
-    UserNode -->|Action| MainSys
-    MainSys -->|Action| ExternalSvc
+        self.quota_service.increment(team_id, db)
+        await self._log_usage(
+            user_id=user_id,
+            team_id=team_id,
+            action=action,
+            input_length=None,
+            success=True
+        )
     
-    classDef userStyle fill:#08427B,stroke:#052E56,color:#fff
-    classDef systemStyle fill:#1168BD,stroke:#0B4884,color:#fff
-    classDef externalStyle fill:#999,stroke:#666,color:#fff
+    def _build_prompt(self, context: str, diagram_type: str) -> str:
+        """
+        Build the per-request part of the prompt. Syntax rules and the
+        template live in the cached GENERATE_SYSTEM_PROMPT.
+        """
+        return generate_user_prompt(context, diagram_type)
     
-    class UserNode userStyle
-    class MainSys systemStyle
-    class ExternalSvc externalStyle
-```
-
-RULES:
-- Use "graph LR" for simple flows (≤5 elements)
-- Use "graph TD" for complex hierarchies (>5 elements)
-- Keep labels SHORT (max 3-4 words per line)
-- Use <br/> for line breaks
-- Add icons: 👤 users, 🔷 systems, 📦 external, 💾 databases
-- Clear relationship labels on arrows
+    async def _generate_with_claude(self, prompt: str, model: str) -> Tuple[str, dict]:
+        """
+        Call Claude API to generate diagram.
 
-Generate ONLY the Mermaid code without markdown blocks."""
+        Returns the Mermaid code and the call's model, latency and token
+        counts for usage logging.
+        """
+        start = time.perf_counter()
+        with stage_timer('llm_call') as llm_span:
+            set_attributes(llm_span, **{'llm.model': model})
+            # Failover between providers around hedging within one provider
+            message = await self.providers.call(
+                lambda provider, model_id: self.hedger.run(
+                    lambda attempt: self._stream_message(prompt, provider, model_id, attempt),
+                    key=model_id
+                ),
+                model
+            )
+            elapsed = time.perf_counter() - start
+            usage = llm_usage_stats.record('generate', message.usage, model, elapsed)
+            set_attributes(llm_span, **{f'llm.usage.{field}': value for field, value in usage.items()})
+        
+        self.model_router.record(model, elapsed, usage)
+        call = {'model': model, 'latency_ms': elapsed * 1000, **usage}
         
-        return base_prompt
+        # Clean up markdown blocks (and any prose around them) if present
+        return strip_code_fences(message.content[0].text), call
     
-    async def _generate_with_claude(self, prompt: str) -> str:
+    async def _stream_message(self, prompt: str, provider: Provider, model_id: str, attempt: Attempt):
         """
-        Call Claude API to generate diagram.
+        One generate call, streamed so the hedger can see the first token.
+        Cancelling it (the losing attempt) closes the stream.
         """
-        message = self.client.messages.create(
-            model='claude-3-haiku-20240307',
+        async with provider.async_client.messages.stream(
+            model=model_id,
             max_tokens=2000,
+            system=cached_system(GENERATE_SYSTEM_PROMPT),
             messages=[
                 {
                     'role': 'user',
                     'content': prompt
                 }
             ]
-        )
-        
-        mermaid_code = message.content[0].text.strip()
-        
-        # Clean up markdown blocks if present
-        mermaid_code = mermaid_code.replace('```mermaid\n', '')
-        mermaid_code = mermaid_code.replace('```mermaid', '')
-        mermaid_code = mermaid_code.replace('```\n', '')
-        mermaid_code = mermaid_code.replace('```', '')
-        
-        return mermaid_code.strip()
+        ) as stream:
+            async for event in stream:
+                if event.type == 'content_block_delta':
+                    attempt.first_token()
+            return await stream.get_final_message()
+    
+    @staticmethod
+    def _observe_provider_call(provider: Provider, outcome: str, seconds: Optional[float], error: Optional[BaseException]):
+        record_provider_call(provider.name, outcome, seconds, provider.breaker.state)
+        if error is not None:
+            record_upstream_error(provider.name, error)
     
     def _sanitize_mermaid_code(self, code: str) -> str:
         """
         Sanitize generated Mermaid code to fix common issues.
-        """
-        reserved_words = ['graph', 'subgraph', 'end', 'class', 'classDef', 'click', 'style', 'system', 'application']
         
-        lines = code.split('\n')
-        sanitized_lines = []
-        node_id_map = {}
-        
-        for line in lines:
-            sanitized_line = line
-            
-            # Fix node IDs that are reserved words
-            for word in reserved_words:
-                if f'{word}[' in sanitized_line.lower() or f'{word}(' in sanitized_line.lower():
-                    sanitized_line = sanitized_line.replace(f'{word}[', f'node_{word}[')
-                    sanitized_line = sanitized_line.replace(f'{word}(', f'node_{word}(')
-                    node_id_map[word] = f'node_{word}'
-            
-            sanitized_lines.append(sanitized_line)
-        
-        return '\n'.join(sanitized_lines)
+        Parses the diagram once and renames reserved node IDs everywhere they
+        are referenced (edges, class assignments, styles), not just where the
+        node is declared.
+        """
+        return sanitize_mermaid(code)
     
-    def _log_usage(
+    async def _log_usage(
         self,
         user_id: int,
         action: str,
-        input_length: int,
+        input_length: Optional[int],
         success: bool,
         error_message: Optional[str] = None,
-        db: Session = None
+        team_id: Optional[int] = None,
+        call: Optional[dict] = None
     ):
         """
         Log API usage for analytics and cost tracking.
-        """
-        if not db:
-            return
         
-        # Estimate tokens (rough approximation)
-        tokens_used = input_length // 4 if success else 0
-        
-        # Estimate cost (Claude Haiku pricing: ~$0.25 per 1M input tokens)
-        cost_estimate = (tokens_used / 1_000_000) * 0.25
-        
-        usage_log = UsageLog(
-            user_id=user_id,
-            action=action,
-            input_length=input_length,
-            tokens_used=tokens_used,
-            cost_estimate=cost_estimate,
-            success=success,
-            error_message=error_message
-        )
+        `call` carries the model, latency and token counts reported by the
+        API (see _generate_with_claude); cost is priced from them with the
+        current price table version. Records are handed to the buffered
+        usage sink and written in batches off the request path.
+        """
+        call = call or {}
+        model = call.get('model')
+        tokens = {field: call.get(field) or 0 for field in USAGE_FIELDS}
         
-        db.add(usage_log)
-        db.commit()
+        await usage_log_sink.submit_async({
+            'user_id': user_id,
+            'team_id': team_id,
+            'action': action,
+            'input_length': input_length,
+            'model': model,
+            'input_tokens': tokens['input_tokens'],
+            'output_tokens': tokens['output_tokens'],
+            'cache_read_tokens': tokens['cache_read_input_tokens'],
+            'cache_write_tokens': tokens['cache_creation_input_tokens'],
+            'latency_ms': call.get('latency_ms'),
+            'tokens_used': sum(tokens.values()),
+            'cost_estimate': cost_usd(model, tokens),
+            'price_version': CURRENT_PRICE_VERSION,
+            'success': success,
+            'error_message': error_message,
+            # Stamp now; the batch may be flushed a few seconds later
+            'created_at': datetime.now(timezone.utc)
+        })
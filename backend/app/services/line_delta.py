@@ -0,0 +1,68 @@
+"""
+Line-level delta encoding for diagram revisions.
+
+A delta is a list of replace operations `[start, end, [lines...]]` against
+the previous text's lines: lines[start:end] of the old text are replaced by
+the given lines. Operations are ordered and refer to old-text positions, so
+they are applied in one forward pass. Deltas are stored as compact JSON.
+"""
+import json
+from difflib import SequenceMatcher
+from typing import Iterable, List
+
+# Store a full copy when a delta would be at least this fraction of the text
+SNAPSHOT_SIZE_RATIO = 0.5
+
+
+def diff_lines(old: str, new: str) -> list:
+    """Return the operations turning `old` into `new`"""
+    old_lines = old.split('\n')
+    new_lines = new.split('\n')
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    return [
+        [i1, i2, new_lines[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
+
+def apply_delta(old: str, ops: list) -> str:
+    """Apply operations produced by diff_lines to `old`"""
+    old_lines = old.split('\n')
+    result: List[str] = []
+    pos = 0
+    for start, end, lines in ops:
+        result.extend(old_lines[pos:start])
+        result.extend(lines)
+        pos = end
+    result.extend(old_lines[pos:])
+    return '\n'.join(result)
+
+
+def encode_delta(ops: list) -> str:
+    return json.dumps(ops, separators=(',', ':'), ensure_ascii=False)
+
+
+def decode_delta(payload: str) -> list:
+    return json.loads(payload)
+
+
+def make_delta(old: str, new: str) -> str:
+    """Encoded delta from `old` to `new`"""
+    return encode_delta(diff_lines(old, new))
+
+
+def reconstruct(snapshot: str, deltas: Iterable[str]) -> str:
+    """Rebuild a text from a snapshot and the encoded deltas that follow it"""
+    text = snapshot
+    for payload in deltas:
+        text = apply_delta(text, decode_delta(payload))
+    return text
+
+
+def needs_snapshot(delta_depth: int, delta_size: int, full_size: int, interval: int) -> bool:
+    """
+    Whether the next revision should be stored in full: every `interval`
+    revisions, or when the delta is nearly as large as the text itself.
+    """
+    return delta_depth + 1 >= interval or delta_size >= full_size * SNAPSHOT_SIZE_RATIO
@@ -0,0 +1,85 @@
+import threading
+from typing import Any, Dict, Optional
+
+from app.services.pricing import cost_usd
+
+USAGE_FIELDS = (
+    'input_tokens',
+    'output_tokens',
+    'cache_read_input_tokens',
+    'cache_creation_input_tokens',
+)
+
+
+def usage_to_dict(usage: Any) -> Dict[str, int]:
+    """
+    Token counts from an Anthropic SDK usage object or a Bedrock usage dict.
+    Cache fields are missing on older SDKs/models and count as 0.
+    """
+    if usage is None:
+        return {field: 0 for field in USAGE_FIELDS}
+    if isinstance(usage, dict):
+        return {field: usage.get(field) or 0 for field in USAGE_FIELDS}
+    return {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+
+
+class LLMUsageStats:
+    """
+    In-process token counters per endpoint and model, including prompt-cache
+    reads and writes, priced with the current price table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+    def record(
+        self,
+        endpoint: str,
+        usage: Any,
+        model: Optional[str] = None,
+        latency_seconds: Optional[float] = None
+    ) -> Dict[str, int]:
+        counts = usage_to_dict(usage)
+        cost = cost_usd(model, counts)
+        with self._lock:
+            totals = self._totals.setdefault(endpoint, {}).setdefault(model or 'unknown', {
+                'calls': 0, **{field: 0 for field in USAGE_FIELDS}, 'cost_usd': 0.0, 'latency_seconds': 0.0
+            })
+            totals['calls'] += 1
+            for field, value in counts.items():
+                totals[field] += value
+            totals['cost_usd'] += cost
+            totals['latency_seconds'] += latency_seconds or 0.0
+        return counts
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for endpoint, models in self._totals.items():
+                endpoint_totals = {'calls': 0, **{field: 0 for field in USAGE_FIELDS}, 'cost_usd': 0.0}
+                by_model = {}
+                for model, totals in models.items():
+                    for key in endpoint_totals:
+                        endpoint_totals[key] += totals[key]
+                    by_model[model] = {
+                        'calls': totals['calls'],
+                        **{field: totals[field] for field in USAGE_FIELDS},
+                        'cost_usd': round(totals['cost_usd'], 6),
+                        'avg_latency_ms': totals['latency_seconds'] / totals['calls'] * 1000
+                    }
+                prompt_tokens = (
+                    endpoint_totals['input_tokens']
+                    + endpoint_totals['cache_read_input_tokens']
+                    + endpoint_totals['cache_creation_input_tokens']
+                )
+                result[endpoint] = {
+                    **endpoint_totals,
+                    'cost_usd': round(endpoint_totals['cost_usd'], 6),
+                    'cache_hit_ratio': endpoint_totals['cache_read_input_tokens'] / prompt_tokens if prompt_tokens else 0.0,
+                    'models': by_model
+                }
+            return result
+
+
+llm_usage_stats = LLMUsageStats()
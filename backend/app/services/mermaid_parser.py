@@ -0,0 +1,467 @@
+"""
+Mermaid flowchart parser, sanitizer and serializer.
+
+Parses the flowchart subset we generate (nodes, labels, edges, classDefs,
+class assignments, styles, subgraphs) into a compact graph AST in a single
+pass over the text, so fixes such as renaming reserved node IDs are applied
+consistently to every statement that references a node before the graph is
+serialized back to Mermaid.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# IDs that break Mermaid's parser, plus words our prompts forbid as IDs
+RESERVED_IDS = {
+    'graph', 'flowchart', 'subgraph', 'end', 'class', 'classdef', 'click',
+    'style', 'linkstyle', 'direction', 'system', 'application'
+}
+
+DIRECTIONS = {'TB', 'TD', 'BT', 'RL', 'LR'}
+
+# Node shapes, longest opener first: opener -> closer
+SHAPES = [
+    ('([', '])'), ('[[', ']]'), ('[(', ')]'), ('((', '))'), ('{{', '}}'),
+    ('[/', '/]'), ('[\\', '\\]'), ('[', ']'), ('(', ')'), ('{', '}'), ('>', ']'),
+]
+
+# Characters that must be quoted inside a label
+LABEL_SPECIAL_CHARS = re.compile(r'[()\[\]{}]')
+
+HEADER_RE = re.compile(r'^(graph|flowchart)(?:\s+(TB|TD|BT|RL|LR))?\s*;?$', re.IGNORECASE)
+ID_RE = re.compile(r'\w+')
+LINK_RE = re.compile(r'(?:[<ox](?=[-=.]))?(?:-{2,}|={2,}|-\.+-|~{3,})[>ox]?')
+TEXT_LINK_CLOSE_RE = re.compile(r'\s(-{2,}[>ox]?|={2,}[>ox]?|\.+-[>ox]?)')
+FENCE_RE = re.compile(r'```[A-Za-z]*[ \t]*\n?(.*?)```', re.DOTALL)
+
+
+@dataclass
+class Node:
+    id: str
+    label: Optional[str] = None
+    shape: Tuple[str, str] = ('[', ']')
+
+    def render(self) -> str:
+        if self.label is None:
+            return self.id
+        return f"{self.id}{self.shape[0]}{self.label}{self.shape[1]}"
+
+
+@dataclass(eq=False)
+class Edge:
+    source: str
+    target: str
+    link: str = '-->'
+    label: Optional[str] = None
+    # Whether the node's shape/label was written inline on this edge
+    source_inline: bool = False
+    target_inline: bool = False
+
+
+@dataclass
+class Statement:
+    """One source line. `kind` selects which fields are meaningful."""
+    kind: str  # header, node, edge, classDef, class, style, click, subgraph, end, comment, blank, raw
+    indent: str = ''
+    text: str = ''  # header/comment/raw text, subgraph title, style or click arguments
+    node_ids: List[str] = field(default_factory=list)
+    class_name: str = ''
+    edge: Optional[Edge] = None
+    # For node statements: False if the line is a bare reference (e.g. inside a subgraph)
+    declares: bool = True
+
+
+@dataclass
+class MermaidGraph:
+    direction: str = 'LR'
+    keyword: str = 'graph'
+    nodes: Dict[str, Node] = field(default_factory=dict)
+    edges: List[Edge] = field(default_factory=list)
+    class_defs: Dict[str, str] = field(default_factory=dict)
+    class_assignments: Dict[str, str] = field(default_factory=dict)  # node id -> class
+    statements: List[Statement] = field(default_factory=list)
+
+    def rename_node(self, old_id: str, new_id: str):
+        """Rename a node everywhere it is referenced"""
+        if old_id == new_id:
+            return
+        self.nodes = {
+            (new_id if node_id == old_id else node_id): node
+            for node_id, node in self.nodes.items()
+        }
+        if new_id in self.nodes:
+            self.nodes[new_id].id = new_id
+        for edge in self.edges:
+            if edge.source == old_id:
+                edge.source = new_id
+            if edge.target == old_id:
+                edge.target = new_id
+        if old_id in self.class_assignments:
+            self.class_assignments[new_id] = self.class_assignments.pop(old_id)
+        for statement in self.statements:
+            statement.node_ids = [new_id if node_id == old_id else node_id for node_id in statement.node_ids]
+
+    def remove_node(self, node_id: str):
+        """Remove a node with its declarations, edges, classes and styles"""
+        self.nodes.pop(node_id, None)
+        self.class_assignments.pop(node_id, None)
+        removed = [edge for edge in self.edges if node_id in (edge.source, edge.target)]
+        self.edges = [edge for edge in self.edges if node_id not in (edge.source, edge.target)]
+
+        # Neighbours whose shape/label was only written inline on a removed edge
+        orphaned = []
+        for edge in removed:
+            for other, inline in ((edge.source, edge.source_inline), (edge.target, edge.target_inline)):
+                if other != node_id and inline and other not in orphaned:
+                    orphaned.append(other)
+
+        kept_edges = {id(edge) for edge in self.edges}
+        kept = []
+        for statement in self.statements:
+            if statement.kind == 'edge':
+                if id(statement.edge) not in kept_edges:
+                    continue
+            elif statement.kind == 'class':
+                statement.node_ids = [nid for nid in statement.node_ids if nid != node_id]
+                if not statement.node_ids:
+                    continue
+            elif statement.kind in ('node', 'style', 'click') and statement.node_ids == [node_id]:
+                continue
+            kept.append(statement)
+        self.statements = kept
+
+        for other in orphaned:
+            edge = next((e for e in self.edges if other in (e.source, e.target)), None)
+            if edge is None:
+                self.add_node(self.nodes[other])
+            elif edge.source == other:
+                edge.source_inline = True
+            else:
+                edge.target_inline = True
+
+    def add_edge(self, edge: Edge, indent: str = '    '):
+        """Append an edge after the last existing edge (or at the end)"""
+        self.edges.append(edge)
+        statement = Statement(kind='edge', indent=indent, node_ids=[edge.source, edge.target], edge=edge)
+        last_edge = max(
+            (i for i, s in enumerate(self.statements) if s.kind == 'edge'),
+            default=len(self.statements) - 1
+        )
+        self.statements.insert(last_edge + 1, statement)
+
+    def add_node(self, node: Node, indent: str = '    '):
+        """Declare a new node after the last top-level node declaration"""
+        self.nodes[node.id] = node
+        last_node, depth = 0, 0
+        for i, statement in enumerate(self.statements):
+            if statement.kind == 'subgraph':
+                depth += 1
+            elif statement.kind == 'end':
+                depth -= 1
+            elif statement.kind in ('header', 'node') and depth == 0:
+                last_node = i
+        self.statements.insert(
+            last_node + 1,
+            Statement(kind='node', indent=indent, node_ids=[node.id])
+        )
+
+
+class MermaidParseError(ValueError):
+    """Raised when the input is not a Mermaid flowchart"""
+
+
+def strip_code_fences(text: str) -> str:
+    """
+    Return the contents of the first fenced code block, or the text with
+    any stray fences removed. Handles leading prose before the fence.
+    """
+    match = FENCE_RE.search(text)
+    if match:
+        return match.group(1).strip()
+    return text.replace('```', '').strip()
+
+
+def _parse_node_ref(line: str, pos: int) -> Tuple[Optional[Node], int]:
+    """Parse `id` or `id<shape>label<close>` starting at pos"""
+    match = ID_RE.match(line, pos)
+    if not match:
+        return None, pos
+    node = Node(id=match.group(0))
+    pos = match.end()
+
+    for opener, closer in SHAPES:
+        if line.startswith(opener, pos):
+            start = pos + len(opener)
+            if line.startswith('"', start):
+                # Quoted label: may contain brackets
+                quote_end = line.find('"', start + 1)
+                if quote_end == -1 or not line.startswith(closer, quote_end + 1):
+                    return None, pos
+                end = quote_end + 1
+            else:
+                end = line.find(closer, start)
+                if end == -1:
+                    return None, pos
+            node.label = line[start:end]
+            node.shape = (opener, closer)
+            return node, end + len(closer)
+    return node, pos
+
+
+def _parse_group(line: str, pos: int) -> Tuple[List[Node], int]:
+    """Parse `A & B[label] & C`"""
+    nodes = []
+    while True:
+        node, new_pos = _parse_node_ref(line, pos)
+        if node is None:
+            return nodes, pos
+        nodes.append(node)
+        pos = new_pos
+        ampersand = re.compile(r'\s*&\s*').match(line, pos)
+        if not ampersand:
+            return nodes, pos
+        pos = ampersand.end()
+
+
+def _parse_link(line: str, pos: int) -> Tuple[Optional[str], Optional[str], int]:
+    """Parse a link operator with optional `-- text -->` or `|text|` label"""
+    match = LINK_RE.match(line, pos)
+    if not match:
+        return None, None, pos
+    link = match.group(0)
+    pos = match.end()
+    label = None
+
+    # `A -- text --> B` form: an open operator followed by text
+    if link in ('--', '==', '-.') and pos < len(line) and line[pos].isspace():
+        close = TEXT_LINK_CLOSE_RE.search(line, pos)
+        if not close:
+            return None, None, pos
+        label = line[pos:close.start()].strip()
+        link = _normalise_text_link(link, close.group(1))
+        pos = close.end()
+
+    pipe = re.compile(r'\s*\|([^|]*)\|').match(line, pos)
+    if pipe:
+        label = pipe.group(1)
+        pos = pipe.end()
+    return link, label, pos
+
+
+def _normalise_text_link(opener: str, closer: str) -> str:
+    """Turn `-- text -->` style operators into the equivalent `-->|text|` link"""
+    if opener == '-.':
+        return '-.-' + ('>' if closer.endswith('>') else '')
+    head = closer[-1] if closer[-1] in '>ox' else ''
+    return opener[0] * 2 + head if head else opener[0] * 3
+
+
+def _parse_chain(line: str, indent: str, graph: MermaidGraph) -> Optional[List[Statement]]:
+    """Parse a node declaration or an edge chain; None if the line is not one"""
+    first, pos = _parse_group(line, 0)
+    if not first:
+        return None
+    groups = [first]
+
+    links = []
+    while True:
+        ws = re.compile(r'\s*').match(line, pos).end()
+        link, label, new_pos = _parse_link(line, ws)
+        if link is None:
+            break
+        new_pos = re.compile(r'\s*').match(line, new_pos).end()
+        group, after = _parse_group(line, new_pos)
+        if not group:
+            return None
+        links.append((link, label))
+        groups.append(group)
+        pos = after
+
+    if line[pos:].strip():
+        return None  # Unparsed trailing content
+
+    inline_seen = set()
+    for group in groups:
+        for node in group:
+            existing = graph.nodes.get(node.id)
+            if existing is None:
+                graph.nodes[node.id] = node
+            elif node.label is not None and existing.label is None:
+                existing.label = node.label
+                existing.shape = node.shape
+
+    if not links:
+        return [
+            Statement(kind='node', indent=indent, node_ids=[node.id], declares=node.label is not None)
+            for node in first
+        ]
+
+    statements = []
+    for (link, label), sources, targets in zip(links, groups, groups[1:]):
+        for source in sources:
+            for target in targets:
+                edge = Edge(
+                    source=source.id,
+                    target=target.id,
+                    link=link,
+                    label=label,
+                    source_inline=source.label is not None and source.id not in inline_seen,
+                    target_inline=target.label is not None and target.id not in inline_seen
+                )
+                if edge.source_inline:
+                    inline_seen.add(source.id)
+                if edge.target_inline:
+                    inline_seen.add(target.id)
+                graph.edges.append(edge)
+                statements.append(Statement(
+                    kind='edge', indent=indent, node_ids=[source.id, target.id], edge=edge
+                ))
+    return statements
+
+
+def parse_mermaid(code: str) -> MermaidGraph:
+    """Parse Mermaid flowchart code into a MermaidGraph"""
+    graph = MermaidGraph()
+    seen_header = False
+
+    for raw_line in code.split('\n'):
+        stripped = raw_line.strip()
+        indent = raw_line[:len(raw_line) - len(raw_line.lstrip())]
+        line = stripped[:-1].rstrip() if stripped.endswith(';') else stripped
+        keyword = line.split(None, 1)[0] if line else ''
+        rest = line[len(keyword):].strip()
+        keyword_lower = keyword.lower()
+
+        if not line:
+            graph.statements.append(Statement(kind='blank'))
+        elif line.startswith('%%'):
+            graph.statements.append(Statement(kind='comment', indent=indent, text=stripped))
+        elif not seen_header and HEADER_RE.match(line):
+            header = HEADER_RE.match(line)
+            graph.keyword = header.group(1)
+            graph.direction = (header.group(2) or 'TD').upper()
+            graph.statements.append(Statement(kind='header', indent=indent))
+            seen_header = True
+        elif keyword_lower == 'subgraph' and rest:
+            # `subgraph id [title]` / `subgraph id`: the id can be renamed
+            title_id = ID_RE.match(rest)
+            statement = Statement(kind='subgraph', indent=indent, text=rest)
+            if title_id is not None and (title_id.end() == len(rest) or rest[title_id.end()] in ' ['):
+                statement.node_ids = [title_id.group(0)]
+                statement.text = rest[title_id.end():]
+            graph.statements.append(statement)
+        elif line == 'end':
+            graph.statements.append(Statement(kind='end', indent=indent))
+        elif keyword == 'classDef' and rest:
+            name, _, styles = rest.partition(' ')
+            graph.class_defs[name] = styles.strip()
+            graph.statements.append(Statement(kind='classDef', indent=indent, class_name=name, text=styles.strip()))
+        elif keyword == 'class' and rest:
+            ids, _, class_name = rest.rpartition(' ')
+            node_ids = [node_id.strip() for node_id in ids.split(',') if node_id.strip()]
+            for node_id in node_ids:
+                graph.class_assignments[node_id] = class_name
+            graph.statements.append(Statement(kind='class', indent=indent, node_ids=node_ids, class_name=class_name))
+        elif keyword in ('style', 'click') and rest:
+            node_id, _, args = rest.partition(' ')
+            graph.statements.append(Statement(kind=keyword, indent=indent, node_ids=[node_id], text=args))
+        else:
+            statements = None
+            if keyword_lower not in ('linkstyle', 'direction'):
+                statements = _parse_chain(line, indent, graph)
+            if statements is None:
+                graph.statements.append(Statement(kind='raw', indent=indent, text=stripped))
+            else:
+                graph.statements.extend(statements)
+
+    if not seen_header:
+        raise MermaidParseError("Missing 'graph' or 'flowchart' header")
+    return graph
+
+
+def serialize_mermaid(graph: MermaidGraph) -> str:
+    """Render a MermaidGraph back to Mermaid code"""
+    lines = []
+    for statement in graph.statements:
+        kind = statement.kind
+        if kind == 'blank':
+            lines.append('')
+            continue
+
+        if kind == 'header':
+            body = f"{graph.keyword} {graph.direction}"
+        elif kind == 'node':
+            node = graph.nodes[statement.node_ids[0]]
+            body = node.render() if statement.declares else node.id
+        elif kind == 'edge':
+            body = _render_edge(graph, statement.edge)
+        elif kind == 'classDef':
+            body = f"classDef {statement.class_name} {statement.text}".rstrip()
+        elif kind == 'class':
+            body = f"class {','.join(statement.node_ids)} {statement.class_name}"
+        elif kind in ('style', 'click'):
+            body = f"{kind} {statement.node_ids[0]} {statement.text}".rstrip()
+        elif kind == 'subgraph':
+            body = f"subgraph {''.join(statement.node_ids)}{statement.text}"
+        elif kind == 'end':
+            body = 'end'
+        else:  # comment, raw
+            body = statement.text
+        lines.append(statement.indent + body)
+    return '\n'.join(lines)
+
+
+def _render_edge(graph: MermaidGraph, edge: Edge) -> str:
+    source = graph.nodes[edge.source].render() if edge.source_inline else edge.source
+    target = graph.nodes[edge.target].render() if edge.target_inline else edge.target
+    link = edge.link if edge.label is None else f"{edge.link}|{edge.label}|"
+    return f"{source} {link} {target}"
+
+
+def quote_label(label: str) -> str:
+    """Quote labels containing bracket characters Mermaid would misparse"""
+    if label.startswith('"') or not LABEL_SPECIAL_CHARS.search(label):
+        return label
+    return '"' + label.replace('"', '#quot;') + '"'
+
+
+def sanitize_graph(graph: MermaidGraph) -> Dict[str, str]:
+    """
+    Fix common LLM mistakes in place:
+    - rename node/subgraph IDs that are reserved words (everywhere they occur)
+    - quote labels that contain bracket characters
+
+    Returns the ID rewrites that were applied.
+    """
+    referenced = set(graph.nodes)
+    for statement in graph.statements:
+        referenced.update(statement.node_ids)
+
+    node_id_map = {}
+    for node_id in list(referenced):
+        if node_id.lower() in RESERVED_IDS:
+            new_id = f"node_{node_id}"
+            while new_id in referenced:
+                new_id = f"_{new_id}"
+            referenced.add(new_id)
+            node_id_map[node_id] = new_id
+
+    for old_id, new_id in node_id_map.items():
+        graph.rename_node(old_id, new_id)
+
+    for node in graph.nodes.values():
+        if node.label is not None:
+            node.label = quote_label(node.label)
+
+    return node_id_map
+
+
+def sanitize_mermaid(code: str) -> str:
+    """Strip fences, parse, sanitize and re-serialize Mermaid code"""
+    code = strip_code_fences(code)
+    try:
+        graph = parse_mermaid(code)
+    except MermaidParseError:
+        return code
+    sanitize_graph(graph)
+    return serialize_mermaid(graph)
@@ -0,0 +1,186 @@
+"""
+Complexity-based model routing.
+
+Simple inputs (short, few components, few gaps, high validation score) go
+to the fast model; anything else goes to the larger model. The thresholds
+are a RoutingPolicy, built from settings or environment variables, and
+the router keeps per-model latency and cost counters.
+"""
+import os
+import re
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from app.services.pricing import cost_usd
+
+# Technology and component terms counted as distinct diagram elements
+COMPONENT_PATTERN = re.compile(
+    r'\b(api(?: gateway)?|database|db|cache|queue|storage|s3|sftp|lambda|ec2|rds|dynamodb|'
+    r'kafka|redis|postgres(?:ql)?|mysql|server|service|application|platform|dashboard|'
+    r'frontend|backend|mobile app|web app|load balancer|cdn|vpc|function|bucket|'
+    r'warehouse|pipeline|gateway|identity provider|sso|email|sms|webhook)s?\b'
+)
+
+FAST = 'fast'
+LARGE = 'large'
+
+
+@dataclass
+class RoutingPolicy:
+    fast_model: str
+    large_model: str
+    mode: str = 'auto'  # 'auto', 'fast' (always fast) or 'large' (always large)
+    max_fast_words: int = 150
+    max_fast_components: int = 5
+    max_fast_gaps: int = 1
+    min_fast_score: float = 70.0
+    large_diagram_types: Tuple[str, ...] = ('container', 'component')
+
+    @classmethod
+    def from_env(cls, fast_model: str, large_model: str, environ: Mapping[str, str] = os.environ) -> 'RoutingPolicy':
+        """Policy from MODEL_* / ROUTING_* environment variables"""
+        return cls(
+            fast_model=environ.get('MODEL_FAST', fast_model),
+            large_model=environ.get('MODEL_LARGE', large_model),
+            mode=environ.get('MODEL_ROUTING_MODE', 'auto'),
+            max_fast_words=int(environ.get('ROUTING_MAX_FAST_WORDS', 150)),
+            max_fast_components=int(environ.get('ROUTING_MAX_FAST_COMPONENTS', 5)),
+            max_fast_gaps=int(environ.get('ROUTING_MAX_FAST_GAPS', 1)),
+            min_fast_score=float(environ.get('ROUTING_MIN_FAST_SCORE', 70.0))
+        )
+
+
+@dataclass
+class RoutingSignals:
+    word_count: int
+    component_count: int
+    gap_count: int
+    validation_score: Optional[float] = None
+    diagram_type: Optional[str] = None
+
+
+@dataclass
+class RoutingDecision:
+    model: str
+    tier: str
+    reasons: List[str] = field(default_factory=list)
+    signals: Optional[RoutingSignals] = None
+
+    def metadata(self) -> dict:
+        """Routing details for response metadata"""
+        return {
+            'model': self.model,
+            'tier': self.tier,
+            'reasons': self.reasons,
+            'signals': asdict(self.signals) if self.signals else None
+        }
+
+
+def count_components(text: str) -> int:
+    """Number of distinct component/technology terms in the text"""
+    return len({match.group(1) for match in COMPONENT_PATTERN.finditer(text.lower())})
+
+
+def _field(obj: Any, name: str, default=None):
+    if obj is None:
+        return default
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def extract_signals(input_text: str, validation: Any = None, diagram_type: Optional[str] = None) -> RoutingSignals:
+    """
+    Signals from the input and an already computed validation result
+    (either backend's ValidationResult, or a dict). Gap findings come from
+    gap_analysis when present, else from warnings and questions.
+    """
+    gap_analysis = _field(validation, 'gap_analysis')
+    if gap_analysis:
+        gap_count = sum(
+            len(gap_analysis.get(key) or [])
+            for key in ('missing_components', 'missing_actors', 'missing_relationships', 'ambiguous_terms')
+        )
+    else:
+        gap_count = len(_field(validation, 'warnings', []) or []) + len(_field(validation, 'questions', []) or [])
+
+    return RoutingSignals(
+        word_count=len(input_text.split()),
+        component_count=count_components(input_text),
+        gap_count=gap_count,
+        validation_score=_field(validation, 'score'),
+        diagram_type=diagram_type
+    )
+
+
+class ModelRouter:
+    """
+    Chooses a model per request and records the latency and cost split.
+    """
+
+    def __init__(self, policy: RoutingPolicy):
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Dict[str, Any]] = {}
+
+    def route(self, signals: RoutingSignals) -> RoutingDecision:
+        policy = self.policy
+        if policy.mode in (FAST, LARGE):
+            model = policy.fast_model if policy.mode == FAST else policy.large_model
+            return RoutingDecision(model=model, tier=policy.mode, reasons=[f'mode={policy.mode}'], signals=signals)
+
+        reasons = []
+        if signals.word_count > policy.max_fast_words:
+            reasons.append(f'{signals.word_count} words > {policy.max_fast_words}')
+        if signals.component_count > policy.max_fast_components:
+            reasons.append(f'{signals.component_count} components > {policy.max_fast_components}')
+        if signals.gap_count > policy.max_fast_gaps:
+            reasons.append(f'{signals.gap_count} gaps > {policy.max_fast_gaps}')
+        if signals.validation_score is not None and signals.validation_score < policy.min_fast_score:
+            reasons.append(f'score {signals.validation_score:.0f} < {policy.min_fast_score:.0f}')
+        if signals.diagram_type in policy.large_diagram_types:
+            reasons.append(f'{signals.diagram_type} diagram')
+
+        if reasons:
+            return RoutingDecision(model=policy.large_model, tier=LARGE, reasons=reasons, signals=signals)
+        return RoutingDecision(model=policy.fast_model, tier=FAST, reasons=['simple input'], signals=signals)
+
+    def record(self, model: str, latency_seconds: float, usage: Optional[Dict[str, int]] = None):
+        """Record one completed upstream call (usage as from llm_usage.usage_to_dict)"""
+        cost = cost_usd(model, usage or {})
+        with self._lock:
+            entry = self._calls.setdefault(model, {'latencies': [], 'calls': 0, 'cost_usd': 0.0})
+            entry['calls'] += 1
+            entry['cost_usd'] += cost
+            entry['latencies'].append(latency_seconds)
+            if len(entry['latencies']) > 1000:
+                del entry['latencies'][:-1000]  # Recent window for percentiles
+
+    def stats(self) -> dict:
+        with self._lock:
+            total_calls = sum(entry['calls'] for entry in self._calls.values())
+            total_cost = sum(entry['cost_usd'] for entry in self._calls.values())
+            models = {}
+            for model, entry in self._calls.items():
+                latencies = sorted(entry['latencies'])
+                models[model] = {
+                    'calls': entry['calls'],
+                    'share': entry['calls'] / total_calls if total_calls else 0.0,
+                    'cost_usd': round(entry['cost_usd'], 6),
+                    'cost_share': entry['cost_usd'] / total_cost if total_cost else 0.0,
+                    'latency_p50_ms': _percentile(latencies, 50) * 1000,
+                    'latency_p95_ms': _percentile(latencies, 95) * 1000,
+                }
+            return {
+                'policy': asdict(self.policy),
+                'total_calls': total_calls,
+                'total_cost_usd': round(total_cost, 6),
+                'models': models
+            }
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
@@ -0,0 +1,363 @@
+"""
+Prompts for diagram generation, improvement suggestions and refinement.
+
+Every call's system prompt is two blocks: DIAGRAM_GUIDE, the C4 and Mermaid
+reference with worked examples shared by all tasks, then the task's own
+fixed prompt (rules, output format), followed by a small user message built
+from the request. The prompt-caching breakpoint sits on the task block, so
+the tool definitions, the guide and the task prompt are cached together.
+Keep request-specific text out of both blocks, or every call becomes a
+cache miss.
+
+Models only cache prefixes above a minimum length (1024 tokens for Sonnet,
+2048 for Haiku); shorter prefixes are silently not cached. The guide is what
+takes every task's prefix past the Haiku minimum (see MIN_CACHEABLE_TOKENS
+and tests/test_prompts.py), so keep that in mind before trimming it.
+"""
+
+# Smallest prefix, in tokens, that each model family will cache
+MIN_CACHEABLE_TOKENS = {'haiku': 2048, 'sonnet': 1024}
+
+DIAGRAM_GUIDE = """REFERENCE: C4 CONTEXT DIAGRAMS IN MERMAID
+
+This reference applies to every diagram task: generating a diagram from a solution overview, suggesting clearer overviews, and refining an existing diagram. Task-specific instructions and the required output format follow it.
+
+1. WHAT A C4 CONTEXT (LEVEL 1) DIAGRAM SHOWS
+A context diagram shows one software system in its environment: the people who use it and the other systems it depends on or feeds. It answers "what is this system, who uses it and what does it talk to", not "how is it built".
+- People / actors: human users, roles or personas (customer, support agent, administrator, partner staff). One node per distinct role, not per individual.
+- The system in scope: the software being built or described, drawn as a single node. Do not split it into containers, services, functions or databases at this level unless the user explicitly asks for internal detail.
+- External systems: anything outside the team's ownership that the system interacts with: SaaS products (Stripe, SendGrid, Slack, Jira, Salesforce), cloud services used as black boxes (Amazon S3, Amazon SES), partner systems (a partner SFTP server, a bank API) and other internal systems owned by other teams (data warehouse, identity provider).
+- Data stores: show a database or bucket only when it is shared with or owned outside the system, or when the user explicitly names it as part of the context.
+- Relationships: one arrow per meaningful interaction, labelled with a short verb phrase from the source's point of view ("Uploads invoices", "Sends receipts via", "Reads orders from"). Add the protocol only when it matters (HTTPS, SFTP, webhook).
+
+A description is complete enough for a context diagram when it names (a) the system being built, (b) at least one user or actor, (c) what the system does for them and (d) the external systems it integrates with. Vague inputs ("a platform for stuff", a list of technologies, movie plots) are missing one or more of these.
+
+2. MERMAID FLOWCHART SYNTAX
+Use standard flowchart syntax, never the experimental C4Context syntax.
+- Direction: "graph LR" (left to right) for up to five elements, "graph TD" (top down) for larger diagrams with a clear hierarchy.
+- Node IDs: simple alphanumeric CamelCase, no spaces, dashes or punctuation: Customer, InvoicePortal, PaymentGateway, S3Bucket. IDs are never shown; labels are.
+- Reserved words must never be node IDs: system, application, graph, class, end, subgraph, style, click, default. Prefix them instead: node_system, node_application, or better, use a descriptive ID (InvoiceSystem).
+- Labels go in square brackets and may contain any text: Customer[👤 Customer<br/>Uploads invoices]. Use <br/> for line breaks; keep each line to 3-4 words.
+- Edges: Source -->|Label| Target. Use one edge per interaction and keep labels short.
+- Comments start with %% and are ignored by the renderer.
+- Styling: declare classDef once per element kind, then assign with "class Id1,Id2 styleName". Do not style individual nodes inline unless highlighting one element.
+
+Icons, used as the first character of every label:
+- 👤 person or role
+- 🔷 the system in scope
+- 📦 external system or service
+- 💾 database or storage
+
+Colour palette (classDef names are conventions used across all diagrams):
+- classDef userStyle fill:#08427B,stroke:#052E56,color:#fff
+- classDef systemStyle fill:#1168BD,stroke:#0B4884,color:#fff
+- classDef externalStyle fill:#999,stroke:#666,color:#fff
+- classDef dbStyle fill:#2E7D32,stroke:#1B5E20,color:#fff
+
+3. COMMON MISTAKES TO AVOID
+- Using "system" or "end" as a node ID: the diagram fails to render.
+- Wrapping the code in ``` fences or adding prose before or after it when raw Mermaid is requested.
+- Long labels on one line: the diagram becomes wide and unreadable; break them with <br/>.
+- Drawing every microservice or Lambda function of the system in scope: that is a container diagram, not a context diagram.
+- Unlabelled arrows, or arrows labelled only with a protocol ("HTTPS") and no action.
+- Referencing a node ID in an edge or class line that was never declared, or declaring the same ID twice with different labels.
+- Dropping the classDef/class lines when editing a diagram: every node must keep a style.
+
+4. WORKED EXAMPLES
+
+Example A - invoice processing
+Overview: "Build a web application where customers upload invoices that are stored in S3 and processed by a Lambda function that sends a confirmation email through SendGrid."
+graph LR
+    Customer[👤 Customer<br/>Uploads invoices]
+    InvoicePortal[🔷 Invoice Portal<br/>Stores and processes invoices]
+    S3Bucket[📦 Amazon S3<br/>Invoice storage]
+    SendGrid[📦 SendGrid<br/>Email delivery]
+
+    Customer -->|Uploads invoices| InvoicePortal
+    InvoicePortal -->|Stores files in| S3Bucket
+    InvoicePortal -->|Sends confirmations via| SendGrid
+    SendGrid -->|Emails confirmation| Customer
+
+    classDef userStyle fill:#08427B,stroke:#052E56,color:#fff
+    classDef systemStyle fill:#1168BD,stroke:#0B4884,color:#fff
+    classDef externalStyle fill:#999,stroke:#666,color:#fff
+
+    class Customer userStyle
+    class InvoicePortal systemStyle
+    class S3Bucket,SendGrid externalStyle
+Note: the Lambda function is part of the Invoice Portal at this level, so it is not drawn separately.
+
+Example B - internal support platform
+Overview: "An internal platform for support staff to manage tickets, integrated with Jira and Slack, storing ticket history in a PostgreSQL database owned by the data team."
+graph LR
+    SupportAgent[👤 Support Agent<br/>Handles tickets]
+    TeamLead[👤 Team Lead<br/>Reviews escalations]
+    TicketHub[🔷 Ticket Hub<br/>Manages support tickets]
+    Jira[📦 Jira<br/>Engineering issues]
+    Slack[📦 Slack<br/>Team notifications]
+    HistoryDB[💾 Ticket History DB<br/>PostgreSQL, data team]
+
+    SupportAgent -->|Creates and updates tickets| TicketHub
+    TeamLead -->|Reviews escalations in| TicketHub
+    TicketHub -->|Opens linked issues in| Jira
+    TicketHub -->|Posts alerts to| Slack
+    TicketHub -->|Archives history to| HistoryDB
+
+    classDef userStyle fill:#08427B,stroke:#052E56,color:#fff
+    classDef systemStyle fill:#1168BD,stroke:#0B4884,color:#fff
+    classDef externalStyle fill:#999,stroke:#666,color:#fff
+    classDef dbStyle fill:#2E7D32,stroke:#1B5E20,color:#fff
+
+    class SupportAgent,TeamLead userStyle
+    class TicketHub systemStyle
+    class Jira,Slack externalStyle
+    class HistoryDB dbStyle
+
+Example C - scheduled file transfer (more than five elements, so top down)
+Overview: "A nightly job transfers files from the partner SFTP server to S3, validates them and loads the records into the data warehouse for analysts. Operators get alerts in PagerDuty when a transfer fails."
+graph TD
+    Operator[👤 Operator<br/>Monitors transfers]
+    Analyst[👤 Analyst<br/>Queries partner data]
+    TransferService[🔷 Partner Transfer Service<br/>Nightly file ingestion]
+    PartnerSFTP[📦 Partner SFTP Server<br/>Source files]
+    S3Landing[📦 Amazon S3<br/>Landing bucket]
+    Warehouse[💾 Data Warehouse<br/>Analytics store]
+    PagerDuty[📦 PagerDuty<br/>On-call alerts]
+
+    TransferService -->|Downloads files via SFTP| PartnerSFTP
+    TransferService -->|Stores raw files in| S3Landing
+    TransferService -->|Loads validated records into| Warehouse
+    TransferService -->|Raises failure alerts in| PagerDuty
+    PagerDuty -->|Pages| Operator
+    Analyst -->|Queries| Warehouse
+
+    classDef userStyle fill:#08427B,stroke:#052E56,color:#fff
+    classDef systemStyle fill:#1168BD,stroke:#0B4884,color:#fff
+    classDef externalStyle fill:#999,stroke:#666,color:#fff
+    classDef dbStyle fill:#2E7D32,stroke:#1B5E20,color:#fff
+
+    class Operator,Analyst userStyle
+    class TransferService systemStyle
+    class PartnerSFTP,S3Landing,PagerDuty externalStyle
+    class Warehouse dbStyle
+
+Example D - turning a vague description into a usable one
+Input: "something to stop people leaving cloud buckets public"
+Issues: no users identified, no external systems named.
+Improved overview (enforcement angle): "A Bucket Guard service that continuously scans the company's AWS accounts for S3 buckets with public access, automatically blocks public access on non-compliant buckets, and notifies the owning team in Slack. Security engineers configure exemptions and review the enforcement log in a web dashboard; findings are also sent to the central SIEM for auditing."
+Why it works: it names the system (Bucket Guard), the users (security engineers, owning teams), what it does (scan, block, notify, review) and the external systems (AWS accounts / S3, Slack, SIEM), in about 60 words. Other useful angles for the same input are a monitoring/auditing tool that only reports, an automation service that provisions buckets safely from the start, and a governance platform that tracks exceptions and approvals.
+
+Example E - refining a diagram
+Current diagram: Example A. Instruction: "add Stripe for payments and remove the confirmation email back to the customer".
+Changes: add PaymentGateway[📦 Stripe<br/>Card payments] with the edge InvoicePortal -->|Charges invoices via| PaymentGateway, add PaymentGateway to the externalStyle class line, and delete the edge SendGrid -->|Emails confirmation| Customer. Every other node, edge and style line is kept exactly as it was; node IDs are never renamed during a refinement unless the user asks for it.
+
+END OF REFERENCE"""
+
+
+GENERATE_SYSTEM_PROMPT = """You are an expert software architect. Based on the solution context provided by the user, generate a clear, legible architecture diagram using Mermaid flowchart syntax (NOT C4Context).
+
+CRITICAL SYNTAX RULES:
+1. Use standard Mermaid flowchart syntax with LEFT-TO-RIGHT (LR) direction
+2. Node IDs MUST be simple alphanumeric (no spaces, no special chars): User, S3Bucket, TransferSystem
+3. NEVER use reserved words as node IDs: "system", "application", "graph", "class", "end"
+4. If you need to use a reserved word, prefix it: node_system, node_application
+5. Labels go inside brackets and can have any text: User[👤 User<br/>Uploads files]
+
+CORRECT SYNTAX EXAMPLES:
+✓ User[👤 User]
+✓ S3Bucket[📦 Amazon S3]
+✓ TransferSys[🔷 Transfer System]
+✓ SFTPServer[📦 SFTP Server]
+
+TEMPLATE TO FOLLOW:
+```
+graph LR
+    %% Define nodes with clear IDs and styled labels
+    UserNode[👤 User<br/>Description]
+    MainSystem[🔷 System Name<br/>Description]
+    ExternalSvc[📦 External System<br/>Description]
+
+    %% Define relationships with clear labels
+    UserNode -->|Action description| MainSystem
+    MainSystem -->|Action description| ExternalSvc
+
+    %% Apply styling
+    classDef userStyle fill:#08427B,stroke:#052E56,color:#fff
+    classDef systemStyle fill:#1168BD,stroke:#0B4884,color:#fff
+    classDef externalStyle fill:#999,stroke:#666,color:#fff
+
+    class UserNode userStyle
+    class MainSystem systemStyle
+    class ExternalSvc externalStyle
+```
+
+RULES FOR LEGIBLE DIAGRAMS:
+1. ALWAYS use "graph LR" (Left-to-Right) for simple diagrams (≤5 elements)
+2. Use "graph TD" (Top-Down) only for complex hierarchies (>5 elements)
+3. Keep labels SHORT (max 3-4 words per line)
+4. Use <br/> to break long text into multiple lines
+5. Add icons: 👤 for users, 🔷 for systems, 📦 for external systems, 💾 for databases
+6. Use clear, descriptive relationship labels on arrows
+7. Apply consistent styling with classDef
+
+STYLING GUIDE:
+- Users/Actors: Dark blue (#08427B)
+- Main Systems: Blue (#1168BD)
+- External Systems: Gray (#999)
+- Databases/Storage: Green (#2E7D32)
+
+Generate a clean, horizontal, legible diagram following these rules. Return ONLY the Mermaid code without markdown code blocks."""
+
+
+SUGGEST_SYSTEM_PROMPT = """You are an expert at translating business/technical descriptions into C4 Context diagram requirements.
+
+The user provides a description that failed validation, together with the validation issues.
+
+For C4 Level 1 (Context) diagrams, we need:
+1. THE SYSTEM being built (what software/service)
+2. USERS/ACTORS (who uses it)
+3. FUNCTIONALITY (what does it do)
+4. EXTERNAL SYSTEMS (what does it integrate with)
+
+Based on the user's description, generate 3 different interpretations that would be suitable for C4 diagrams. Each should be a complete, clear description (50-100 words) that includes all 4 required elements.
+
+Format your response as JSON:
+{
+  "suggestions": [
+    {
+      "title": "Brief title (5-7 words)",
+      "description": "One sentence explaining this interpretation",
+      "improved_text": "Complete description with system, users, functionality, and external systems"
+    },
+    ... (2 more suggestions)
+  ]
+}
+
+Make the suggestions diverse - consider different angles like:
+- Enforcement/prevention system
+- Monitoring/auditing tool
+- Automation/provisioning service
+- Governance/compliance platform
+
+Return ONLY the JSON, no other text."""
+
+
+# Fan-out mode: one short completion per interpretation angle, sent in parallel
+SUGGEST_ONE_SYSTEM_PROMPT = """You are an expert at translating business/technical descriptions into C4 Context diagram requirements.
+
+The user provides a description that failed validation, the validation issues and one interpretation angle.
+
+For C4 Level 1 (Context) diagrams, we need:
+1. THE SYSTEM being built (what software/service)
+2. USERS/ACTORS (who uses it)
+3. FUNCTIONALITY (what does it do)
+4. EXTERNAL SYSTEMS (what does it integrate with)
+
+Write ONE interpretation of the description from the given angle, as a complete, clear description (50-100 words) that includes all 4 required elements.
+
+Format your response as JSON:
+{
+  "title": "Brief title (5-7 words)",
+  "description": "One sentence explaining this interpretation",
+  "improved_text": "Complete description with system, users, functionality, and external systems"
+}
+
+Return ONLY the JSON, no other text."""
+
+# One request per angle; the first ones to finish are shown
+SUGGESTION_ANGLES = [
+    "Enforcement/prevention system",
+    "Monitoring/auditing tool",
+    "Automation/provisioning service",
+    "Governance/compliance platform",
+]
+
+
+REFINE_SYSTEM_PROMPT = """You are an expert at modifying Mermaid C4 diagrams based on user instructions.
+
+The user provides the current diagram, the original context and a refinement request.
+
+Your task:
+1. Understand what the user wants to change
+2. Modify the Mermaid diagram accordingly
+3. Maintain proper Mermaid syntax
+4. Keep the diagram clean and legible
+
+CRITICAL RULES:
+- Use standard Mermaid flowchart syntax (graph LR or graph TD)
+- Node IDs must be alphanumeric (no spaces, no special chars)
+- NEVER use reserved words as node IDs: "system", "application", "graph", "class", "end"
+- Keep labels SHORT and clear
+- Maintain consistent styling with classDef
+- Use icons: 👤 for users, 🔷 for systems, 📦 for external systems, 💾 for databases
+
+Common modifications:
+- REMOVE: Delete specified nodes and their connections
+- ADD: Insert new nodes with appropriate connections
+- EDIT LABEL: Change the text inside brackets [...]
+- REPOSITION: Adjust node order (left/right in LR, top/bottom in TD)
+- SIMPLIFY: Remove unnecessary details or nodes
+- ENHANCE: Add more detail or connections
+
+Format your response as JSON:
+{
+  "updated_mermaid": "Complete updated Mermaid code",
+  "changes_made": ["List of changes", "Another change"],
+  "explanation": "Brief explanation of what was modified and why"
+}
+
+Return ONLY the JSON, no markdown code blocks."""
+
+
+def generate_user_prompt(context: str, diagram_type: str = None) -> str:
+    """Variable part of the generate prompt"""
+    prompt = f"Solution Context:\n{context}"
+    if diagram_type:
+        prompt = f"Diagram type: {diagram_type}\n\n{prompt}"
+    return prompt
+
+
+def suggest_user_prompt(original_text: str, issues: list) -> str:
+    """Variable part of the suggestions prompt"""
+    return f"""A user provided this description:
+"{original_text}"
+
+This description has validation issues:
+{', '.join(issues)}"""
+
+
+def suggest_angle_user_prompt(original_text: str, issues: list, angle: str) -> str:
+    """Variable part of a fan-out suggestion prompt"""
+    return f"""{suggest_user_prompt(original_text, issues)}
+
+Interpretation angle: {angle}"""
+
+
+def refine_user_prompt(current_mermaid: str, original_context: str, refinement_instruction: str) -> str:
+    """Variable part of the refine prompt"""
+    return f"""CURRENT DIAGRAM:
+```
+{current_mermaid}
+```
+
+ORIGINAL CONTEXT:
+{original_context}
+
+USER'S REFINEMENT REQUEST:
+"{refinement_instruction}\""""
+
+
+def system_blocks(prompt: str, cache: bool = True) -> list:
+    """
+    The shared guide followed by a task's system prompt, with an ephemeral
+    cache breakpoint after the task prompt when `cache` is set.
+    """
+    task = {"type": "text", "text": prompt}
+    if cache:
+        task["cache_control"] = {"type": "ephemeral"}
+    return [{"type": "text", "text": DIAGRAM_GUIDE}, task]
+
+
+def cached_system(prompt: str) -> list:
+    """System blocks for a task prompt, cached with the tools and guide before it"""
+    return system_blocks(prompt)
@@ -0,0 +1,152 @@
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models.database import Team, TeamUsageCounter, UsageLog
+
+# Actions that count against Team.api_quota_per_month
+QUOTA_ACTIONS = ('generate', 'suggest', 'refine')
+
+
+class QuotaExceededError(Exception):
+    """Raised when a team has used up its monthly quota"""
+
+    def __init__(self, team_id: int, quota_limit: int):
+        self.team_id = team_id
+        self.quota_limit = quota_limit
+        super().__init__(f"Team {team_id} has reached its monthly quota of {quota_limit} requests")
+
+
+def current_period(now: Optional[datetime] = None) -> str:
+    """Quota period key ('YYYY-MM', UTC)"""
+    return (now or datetime.now(timezone.utc)).strftime('%Y-%m')
+
+
+def period_bounds(period: str) -> Tuple[datetime, datetime]:
+    """Start (inclusive) and end (exclusive) of a quota period"""
+    start = datetime.strptime(period, '%Y-%m').replace(tzinfo=timezone.utc)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+
+class QuotaService:
+    """
+    Team quota enforcement backed by per-team monthly counters.
+
+    A check is a single lookup on the (team_id, period) unique index; usage
+    is recorded with one atomic upsert. Counters are periodically reconciled
+    against UsageLog (see reconcile_quotas.py).
+    """
+
+    def get_counter(self, team_id: int, db: Session, period: Optional[str] = None) -> Optional[TeamUsageCounter]:
+        """Current counter row for a team (one indexed read)"""
+        return db.query(TeamUsageCounter).filter(
+            TeamUsageCounter.team_id == team_id,
+            TeamUsageCounter.period == (period or current_period())
+        ).first()
+
+    def remaining(self, team_id: int, db: Session) -> int:
+        """Requests left in the current period"""
+        counter = self.get_counter(team_id, db)
+        if counter is not None and counter.quota_limit is not None:
+            return max(0, counter.quota_limit - counter.request_count)
+
+        # First request of the month: nothing counted yet
+        quota_limit = db.query(Team.api_quota_per_month).filter(Team.id == team_id).scalar()
+        used = counter.request_count if counter is not None else 0
+        return max(0, (quota_limit or 0) - used)
+
+    def check(self, team_id: Optional[int], db: Session):
+        """Raise QuotaExceededError if the team has no requests left"""
+        if team_id is None:
+            return
+
+        counter = self.get_counter(team_id, db)
+        if counter is None or counter.quota_limit is None:
+            return  # Nothing used yet this period
+        if counter.request_count >= counter.quota_limit:
+            raise QuotaExceededError(team_id, counter.quota_limit)
+
+    def increment(self, team_id: Optional[int], db: Session, amount: int = 1):
+        """Atomically add `amount` to the team's counter for the current period"""
+        if team_id is None:
+            return
+
+        quota_limit = select(Team.api_quota_per_month).where(Team.id == team_id).scalar_subquery()
+        stmt = insert(TeamUsageCounter).values(
+            team_id=team_id,
+            period=current_period(),
+            request_count=amount,
+            quota_limit=quota_limit
+        ).on_conflict_do_update(
+            constraint='uq_team_usage_counters_team_period',
+            set_={
+                'request_count': TeamUsageCounter.request_count + amount,
+                'updated_at': func.now()
+            }
+        )
+        db.execute(stmt)
+        db.commit()
+
+    def reconcile(self, db: Session, period: Optional[str] = None) -> int:
+        """
+        Recompute counters from successful quota-counted UsageLog rows.
+
+        For past periods the logged count is authoritative. For the current
+        period the counter is never lowered, because usage records are
+        written asynchronously and may still be in flight.
+
+        Returns the number of teams reconciled.
+        """
+        period = period or current_period()
+        start, end = period_bounds(period)
+        is_current = period == current_period()
+
+        logged = dict(db.query(
+            UsageLog.team_id,
+            func.count(UsageLog.id)
+        ).filter(
+            UsageLog.team_id.isnot(None),
+            UsageLog.created_at >= start,
+            UsageLog.created_at < end,
+            UsageLog.action.in_(QUOTA_ACTIONS),
+            UsageLog.success.is_(True)
+        ).group_by(UsageLog.team_id).all())
+
+        # Include teams that have a counter but no logged usage
+        counted_teams = db.query(TeamUsageCounter.team_id).filter(
+            TeamUsageCounter.period == period
+        ).all()
+        team_ids = set(logged) | {team_id for (team_id,) in counted_teams}
+
+        quotas = dict(db.query(Team.id, Team.api_quota_per_month).filter(
+            Team.id.in_(team_ids)
+        ).all()) if team_ids else {}
+
+        for team_id in team_ids:
+            count = logged.get(team_id, 0)
+            stmt = insert(TeamUsageCounter).values(
+                team_id=team_id,
+                period=period,
+                request_count=count,
+                quota_limit=quotas.get(team_id),
+                reconciled_at=func.now()
+            )
+            new_count = func.greatest(TeamUsageCounter.request_count, count) if is_current else count
+            stmt = stmt.on_conflict_do_update(
+                constraint='uq_team_usage_counters_team_period',
+                set_={
+                    'request_count': new_count,
+                    'quota_limit': stmt.excluded.quota_limit,
+                    'reconciled_at': func.now(),
+                    'updated_at': func.now()
+                }
+            )
+            db.execute(stmt)
+
+        db.commit()
+        return len(team_ids)
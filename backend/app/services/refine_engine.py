@@ -0,0 +1,279 @@
+"""
+Local refinement engine.
+
+Handles simple, unambiguous refinement instructions (remove a node, rename
+a label, add an edge, switch direction, restyle a node) directly on the
+parsed Mermaid graph, without a round trip to the LLM. Anything it cannot
+classify, or that refers to a node it cannot resolve uniquely, returns None
+so the caller falls back to the LLM.
+"""
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.services.mermaid_parser import (
+    Edge, MermaidGraph, MermaidParseError, Statement,
+    parse_mermaid, quote_label, serialize_mermaid, strip_code_fences
+)
+
+DIRECTION_WORDS = {
+    'lr': 'LR', 'left to right': 'LR', 'horizontal': 'LR', 'horizontally': 'LR',
+    'rl': 'RL', 'right to left': 'RL',
+    'td': 'TD', 'tb': 'TD', 'top down': 'TD', 'top to bottom': 'TD',
+    'vertical': 'TD', 'vertically': 'TD',
+    'bt': 'BT', 'bottom to top': 'BT', 'bottom up': 'BT',
+}
+
+COLOR_NAMES = {
+    'red': '#d9534f', 'green': '#5cb85c', 'blue': '#1168BD', 'orange': '#f0ad4e',
+    'yellow': '#ffd966', 'purple': '#8e44ad', 'grey': '#999999', 'gray': '#999999',
+    'black': '#000000', 'white': '#ffffff', 'pink': '#f9a8d4',
+}
+
+# One clause only: compound instructions go to the LLM
+COMPOUND_RE = re.compile(r'\b(?:and|then|also)\b|[;,]', re.IGNORECASE)
+
+REMOVE_RE = re.compile(r'^(?:remove|delete|drop)\s+(?P<node>.+)$', re.IGNORECASE)
+RENAME_RE = re.compile(
+    r'^(?:rename|relabel)\s+(?P<node>.+?)\s+(?:to|as)\s+(?P<label>.+)$', re.IGNORECASE
+)
+ADD_EDGE_RE = re.compile(
+    r'^(?:connect|link|(?:add|draw)\s+(?:an?\s+)?(?:edge|arrow|connection|link)\s+from)\s+'
+    r'(?P<source>.+?)\s+(?:to|with)\s+(?P<target>.+?)'
+    r'(?:\s+(?:labell?ed|with\s+label|saying)\s+(?P<label>.+))?$',
+    re.IGNORECASE
+)
+DIRECTION_RE = re.compile(
+    r'^(?:switch|change|set|make|flip|lay\s*out|render)\s+(?:the\s+)?'
+    r'(?:diagram|layout|direction|orientation|graph|it)?\s*(?:to\s+|as\s+)?'
+    r'(?P<direction>[a-z -]+?)(?:\s+layout)?$',
+    re.IGNORECASE
+)
+RESTYLE_RE = re.compile(
+    r'^(?:make|color|colour|paint|style|highlight)\s+(?P<node>.+?)\s+(?:in\s+)?'
+    r'(?P<color>#[0-9a-f]{3}(?:[0-9a-f]{3})?|' + '|'.join(COLOR_NAMES) + r')$',
+    re.IGNORECASE
+)
+
+
+class AmbiguousInstruction(Exception):
+    """Raised when an instruction matches but cannot be applied safely"""
+
+
+def _normalise(text: str) -> str:
+    """Lowercase, strip quotes, icons, markup and filler words"""
+    text = text.strip().strip('"\'').lower()
+    text = re.sub(r'<br\s*/?>', ' ', text)
+    text = re.sub(r'[^\w\s]', ' ', text)
+    words = [word for word in text.split() if word not in ('the', 'a', 'an')]
+    if words and words[-1] in ('node', 'box', 'component'):
+        words = words[:-1]
+    return ' '.join(words)
+
+
+def _label_text(label: Optional[str]) -> str:
+    """First line of a label (the name), without icons or quotes"""
+    if label is None:
+        return ''
+    first_line = re.split(r'<br\s*/?>', label.strip('"'), maxsplit=1)[0]
+    return _normalise(first_line)
+
+
+def resolve_node(graph: MermaidGraph, reference: str) -> str:
+    """
+    Map a user reference ("the SFTP server", "S3Bucket") to a node ID.
+    Exact ID or name matches win; otherwise the reference must be contained
+    in exactly one node name.
+    """
+    wanted = _normalise(reference)
+    if not wanted:
+        raise AmbiguousInstruction("Empty node reference")
+
+    exact = [
+        node_id for node_id, node in graph.nodes.items()
+        if _normalise(node_id) == wanted or _label_text(node.label) == wanted
+    ]
+    if len(exact) == 1:
+        return exact[0]
+    if exact:
+        raise AmbiguousInstruction(f"'{reference}' matches several nodes")
+
+    partial = [
+        node_id for node_id, node in graph.nodes.items()
+        if re.search(rf'\b{re.escape(wanted)}\b', _label_text(node.label))
+    ]
+    if len(partial) != 1:
+        raise AmbiguousInstruction(f"Cannot resolve '{reference}' to a single node")
+    return partial[0]
+
+
+def _display_name(graph: MermaidGraph, node_id: str) -> str:
+    label = graph.nodes[node_id].label
+    if not label:
+        return node_id
+    name = re.split(r'<br\s*/?>', label.strip('"'), maxsplit=1)[0]
+    return re.sub(r'^[^\w(]+', '', name).strip() or node_id
+
+
+def _remove(graph: MermaidGraph, match) -> List[str]:
+    node_id = resolve_node(graph, match.group('node'))
+    name = _display_name(graph, node_id)
+    connections = sum(1 for edge in graph.edges if node_id in (edge.source, edge.target))
+    graph.remove_node(node_id)
+    return [f"Removed {name} and its {connections} connection(s)"]
+
+
+def _rename(graph: MermaidGraph, match) -> List[str]:
+    node_id = resolve_node(graph, match.group('node'))
+    new_name = match.group('label').strip().strip('"\'')
+    if not new_name:
+        raise AmbiguousInstruction("Empty label")
+
+    node = graph.nodes[node_id]
+    old_name = _display_name(graph, node_id)
+    label = (node.label or node_id).strip('"')
+    # Keep the icon prefix and any <br/> detail lines, replace only the name
+    if old_name in label:
+        label = label.replace(old_name, new_name, 1)
+    else:
+        label = new_name
+    node.label = quote_label(label)
+    if node_id not in _declared_ids(graph):
+        # The node was only ever referenced bare; declare it so the label renders
+        graph.add_node(node)
+    return [f"Renamed {old_name} to {new_name}"]
+
+
+def _declared_ids(graph: MermaidGraph) -> set:
+    declared = {s.node_ids[0] for s in graph.statements if s.kind == 'node' and s.declares}
+    for edge in graph.edges:
+        if edge.source_inline:
+            declared.add(edge.source)
+        if edge.target_inline:
+            declared.add(edge.target)
+    return declared
+
+
+def _add_edge(graph: MermaidGraph, match) -> List[str]:
+    source = resolve_node(graph, match.group('source'))
+    target = resolve_node(graph, match.group('target'))
+    if source == target:
+        raise AmbiguousInstruction("Source and target are the same node")
+
+    label = match.group('label')
+    label = label.strip().strip('"\'') if label else None
+    if any(edge.source == source and edge.target == target and edge.label == label for edge in graph.edges):
+        raise AmbiguousInstruction("Edge already exists")
+
+    indent = next((s.indent for s in graph.statements if s.kind == 'edge'), '    ')
+    graph.add_edge(Edge(source=source, target=target, label=label), indent=indent)
+    change = f"Connected {_display_name(graph, source)} to {_display_name(graph, target)}"
+    return [change + (f" ({label})" if label else '')]
+
+
+def _set_direction(graph: MermaidGraph, match) -> List[str]:
+    direction = DIRECTION_WORDS.get(' '.join(match.group('direction').lower().replace('-', ' ').split()))
+    if direction is None:
+        raise AmbiguousInstruction("Unknown direction")
+    if direction == graph.direction:
+        return [f"Diagram already uses {direction} layout"]
+    graph.direction = direction
+    return [f"Switched layout to {direction}"]
+
+
+def _restyle(graph: MermaidGraph, match) -> List[str]:
+    node_id = resolve_node(graph, match.group('node'))
+    color = match.group('color').lower()
+    fill = COLOR_NAMES.get(color, color)
+
+    style = next(
+        (s for s in graph.statements if s.kind == 'style' and s.node_ids == [node_id]),
+        None
+    )
+    if style is not None:
+        properties = [p for p in style.text.split(',') if p and not p.strip().startswith('fill:')]
+        style.text = ','.join([f"fill:{fill}"] + properties)
+    else:
+        indent = next((s.indent for s in graph.statements if s.kind in ('classDef', 'class', 'edge')), '    ')
+        graph.statements.append(Statement(kind='style', indent=indent, node_ids=[node_id], text=f"fill:{fill}"))
+    return [f"Set {_display_name(graph, node_id)} fill to {fill}"]
+
+
+OPERATIONS: List[Tuple[str, re.Pattern, Callable]] = [
+    ('rename', RENAME_RE, _rename),
+    ('add_edge', ADD_EDGE_RE, _add_edge),
+    ('restyle', RESTYLE_RE, _restyle),
+    ('direction', DIRECTION_RE, _set_direction),
+    ('remove', REMOVE_RE, _remove),
+]
+
+
+def classify(instruction: str) -> Optional[Tuple[str, re.Match, Callable]]:
+    """Return (operation, match, handler) for a simple instruction, else None"""
+    instruction = ' '.join(instruction.strip().rstrip('.!').split())
+    if not instruction or COMPOUND_RE.search(instruction):
+        return None
+    for name, pattern, handler in OPERATIONS:
+        match = pattern.match(instruction)
+        if match:
+            return name, match, handler
+    return None
+
+
+class LocalRefinementEngine:
+    """
+    Applies simple refinement instructions to a parsed diagram and keeps
+    counters of how many refines were served locally vs by the LLM.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local = 0
+        self.fallback = 0
+        self.by_operation: Dict[str, int] = {}
+
+    def try_refine(self, current_mermaid: str, refinement_instruction: str) -> Optional[dict]:
+        """
+        Return a refine response dict (updated_mermaid, changes_made,
+        explanation) if the instruction could be applied locally, else None.
+        """
+        classified = classify(refinement_instruction)
+        if classified is None:
+            return None
+        operation, match, handler = classified
+
+        try:
+            graph = parse_mermaid(strip_code_fences(current_mermaid))
+            changes = handler(graph, match)
+        except (MermaidParseError, AmbiguousInstruction) as e:
+            print(f"[REFINE] Local {operation} not applied, falling back to LLM: {str(e)}")
+            return None
+
+        with self._lock:
+            self.by_operation[operation] = self.by_operation.get(operation, 0) + 1
+        return {
+            'updated_mermaid': serialize_mermaid(graph),
+            'changes_made': changes,
+            'explanation': f"Applied a {operation.replace('_', ' ')} edit directly to the diagram."
+        }
+
+    def record(self, served_locally: bool):
+        with self._lock:
+            if served_locally:
+                self.local += 1
+            else:
+                self.fallback += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.local + self.fallback
+            return {
+                'total': total,
+                'served_locally': self.local,
+                'llm_fallbacks': self.fallback,
+                'local_ratio': self.local / total if total else 0.0,
+                'by_operation': dict(self.by_operation)
+            }
+
+
+refine_engine = LocalRefinementEngine()
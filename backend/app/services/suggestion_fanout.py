@@ -0,0 +1,168 @@
+"""
+Parallel fan-out for improvement suggestions.
+
+Instead of one completion that writes every suggestion before any can be
+shown, one short completion per interpretation angle is sent concurrently
+and suggestions are returned as each call finishes. Once `count` valid
+suggestions have arrived the remaining calls are cancelled, so the slowest
+angle never holds up the response. Time to the first and to the last
+suggestion are recorded for /api/diagrams/suggest/stats.
+
+fan_out() is for asyncio callers (FastAPI), fan_out_threads() for the
+synchronous Lambda handlers. This module has no application imports so
+the Lambda layer ships the same file (common/suggestion_fanout.py).
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Sequence, Tuple
+
+SUGGESTION_FIELDS = ('title', 'description', 'improved_text')
+# Timings kept for percentiles
+STATS_WINDOW = 500
+
+
+def normalize_suggestion(data: Any) -> Optional[dict]:
+    """The suggestion fields, stripped; None if any is missing or empty"""
+    if not isinstance(data, dict):
+        return None
+    if not all(isinstance(data.get(field), str) and data[field].strip() for field in SUGGESTION_FIELDS):
+        return None
+    return {field: data[field].strip() for field in SUGGESTION_FIELDS}
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class FanOutStats:
+    """Counters and recent first/last suggestion times across fan-outs"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.suggestions = 0
+        self.failed_calls = 0
+        self.cancelled_calls = 0
+        self._first_ms = deque(maxlen=STATS_WINDOW)
+        self._last_ms = deque(maxlen=STATS_WINDOW)
+
+    def record(self, timings: dict):
+        with self._lock:
+            self.runs += 1
+            self.suggestions += timings['returned']
+            self.failed_calls += timings['failed']
+            self.cancelled_calls += timings['cancelled']
+            if timings['first_ms'] is not None:
+                self._first_ms.append(timings['first_ms'])
+                self._last_ms.append(timings['last_ms'])
+
+    def stats(self) -> dict:
+        with self._lock:
+            first, last = list(self._first_ms), list(self._last_ms)
+            return {
+                'runs': self.runs,
+                'suggestions': self.suggestions,
+                'failed_calls': self.failed_calls,
+                'cancelled_calls': self.cancelled_calls,
+                'first_suggestion_ms': {'p50': _percentile(first, 50), 'p95': _percentile(first, 95)},
+                'last_suggestion_ms': {'p50': _percentile(last, 50), 'p95': _percentile(last, 95)},
+            }
+
+
+suggestion_fanout_stats = FanOutStats()
+
+
+def _timings(requested: int, elapsed: List[float], failed: int) -> dict:
+    return {
+        'requested': requested,
+        'returned': len(elapsed),
+        'failed': failed,
+        'cancelled': requested - len(elapsed) - failed,
+        'first_ms': round(elapsed[0] * 1000, 1) if elapsed else None,
+        'last_ms': round(elapsed[-1] * 1000, 1) if elapsed else None,
+    }
+
+
+async def fan_out(
+    call: Callable[[str], Awaitable[Optional[dict]]],
+    angles: Sequence[str],
+    count: int,
+    timings: Optional[dict] = None
+) -> AsyncIterator[Tuple[dict, float]]:
+    """
+    Run `call(angle)` for every angle concurrently and yield (suggestion,
+    seconds since start) as each valid one completes, stopping after
+    `count`. Failed or unparseable calls are skipped. Pending calls are
+    cancelled when the generator finishes or is closed; the final timings
+    are written into `timings` if given.
+    """
+    start = time.perf_counter()
+    tasks = [asyncio.ensure_future(call(angle)) for angle in angles]
+    elapsed: List[float] = []
+    failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                suggestion = await next_done
+            except Exception as e:
+                print(f"[SUGGEST] Fan-out call failed: {str(e)}")
+                suggestion = None
+            if suggestion is None:
+                failed += 1
+                continue
+            elapsed.append(time.perf_counter() - start)
+            yield suggestion, elapsed[-1]
+            if len(elapsed) >= count:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        result = _timings(len(tasks), elapsed, failed)
+        suggestion_fanout_stats.record(result)
+        if timings is not None:
+            timings.update(result)
+
+
+def fan_out_threads(
+    call: Callable[[str], Optional[dict]],
+    angles: Sequence[str],
+    count: int
+) -> Tuple[List[dict], dict]:
+    """
+    Thread-pool version of fan_out for synchronous code. Returns up to
+    `count` suggestions in completion order and their timings; calls still
+    running at that point are abandoned rather than awaited.
+    """
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=len(angles))
+    # Each thread runs in a copy of the caller's context so spans nest under the caller's
+    futures = [executor.submit(contextvars.copy_context().run, call, angle) for angle in angles]
+    suggestions: List[dict] = []
+    elapsed: List[float] = []
+    failed = 0
+    try:
+        for future in as_completed(futures):
+            try:
+                suggestion = future.result()
+            except Exception as e:
+                print(f"[SUGGEST] Fan-out call failed: {str(e)}")
+                suggestion = None
+            if suggestion is None:
+                failed += 1
+                continue
+            suggestions.append(suggestion)
+            elapsed.append(time.perf_counter() - start)
+            if len(suggestions) >= count:
+                break
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    timings = _timings(len(futures), elapsed, failed)
+    suggestion_fanout_stats.record(timings)
+    return suggestions, timings
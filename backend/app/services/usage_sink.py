@@ -0,0 +1,209 @@
+import asyncio
+import atexit
+import queue
+import threading
+import time
+from typing import Callable, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.database import UsageLog
+
+
+class UsageLogSink:
+    """
+    Buffered, batched writer for UsageLog records.
+
+    Request handlers hand records to `submit()` and return immediately; a
+    background thread flushes them with one multi-row INSERT whenever the
+    batch is full or the flush interval elapses. The queue is bounded: when
+    it is full, records are dropped ('drop') or the caller waits up to
+    `block_timeout` seconds before dropping ('block'). Coroutines submit
+    with `submit_async()`, which waits without blocking the event loop.
+
+    The app closes the sink on shutdown (see the lifespan in app.main) so
+    queued records are written; atexit is only a fallback.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        batch_size: int = 100,
+        flush_interval: float = 2.0,
+        max_queue_size: int = 10_000,
+        overflow_policy: str = 'drop',
+        block_timeout: float = 0.05
+    ):
+        if overflow_policy not in ('drop', 'block'):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+        # Monitoring counters
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def start(self):
+        """Start the background flusher (idempotent)"""
+        with self._start_lock:
+            if self._thread is not None or self._closed:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='usage-log-sink', daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.close)
+
+    def submit(self, record: dict) -> bool:
+        """
+        Queue a UsageLog row (as a column dict) for the next batch.
+        Returns False if the record was dropped. In 'block' mode this waits
+        in the calling thread; use submit_async() from coroutines.
+        """
+        if self._closed:
+            self.dropped += 1
+            return False
+
+        self.start()
+        try:
+            if self.overflow_policy == 'block':
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+        self.submitted += 1
+        return True
+
+    async def submit_async(self, record: dict) -> bool:
+        """
+        submit() for coroutines: in 'block' mode, waiting for queue space
+        yields to the event loop instead of blocking it.
+        """
+        if self.overflow_policy != 'block' or self._closed:
+            return self.submit(record)
+
+        self.start()
+        deadline = time.monotonic() + self.block_timeout
+        while True:
+            try:
+                self._queue.put_nowait(record)
+                break
+            except queue.Full:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.dropped += 1
+                    return False
+                await asyncio.sleep(min(remaining, 0.005))
+
+        self.submitted += 1
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Flush everything still queued and stop the background thread"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            return
+        # Sentinel wakes the flusher, which drains the queue before exiting
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        """Queue depth, throughput and flush latency"""
+        return {
+            'queue_depth': self._queue.qsize(),
+            'submitted': self.submitted,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'last_flush_ms': self.last_flush_ms,
+            'max_flush_ms': self.max_flush_ms
+        }
+
+    def _run(self):
+        """Collect records into batches and flush on size or time trigger"""
+        stopping = False
+        while not stopping:
+            batch: List[dict] = []
+            deadline = time.monotonic() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    record = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+
+            if stopping:
+                # Drain whatever arrived before shutdown
+                while True:
+                    try:
+                        record = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if record is not None:
+                        batch.append(record)
+
+            for start in range(0, len(batch), self.batch_size):
+                self._flush(batch[start:start + self.batch_size])
+
+    def _flush(self, batch: List[dict]):
+        """Write one batch with a single multi-row INSERT"""
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            db.execute(insert(UsageLog), batch)
+            db.commit()
+            self.written += len(batch)
+        except Exception as e:
+            db.rollback()
+            self.failed += len(batch)
+            print(f"[USAGE] Failed to flush {len(batch)} usage records: {str(e)}")
+        finally:
+            db.close()
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.flushes += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+
+
+usage_log_sink = UsageLogSink(
+    SessionLocal,
+    batch_size=settings.USAGE_LOG_BATCH_SIZE,
+    flush_interval=settings.USAGE_LOG_FLUSH_INTERVAL_SECONDS,
+    max_queue_size=settings.USAGE_LOG_QUEUE_SIZE,
+    overflow_policy=settings.USAGE_LOG_OVERFLOW_POLICY
+)
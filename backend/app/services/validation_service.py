@@ -2,6 +2,8 @@ from sqlalchemy.orm import Session
 from app.models.schemas import ValidationResult
 from app.ml.semantic_validator import SemanticValidator
 from app.ml.gap_analyzer import GapAnalyzer
+from app.core.metrics import record_validation, stage_timer
+from app.core.tracing import span
 from typing import List, Dict
 
 
@@ -41,6 +43,7 @@ class ValidationService:
         
         # Step 1: Basic validation
         if not input_text or len(input_text.strip()) < 15:
+            record_validation('too_short')
             errors.append({
                 'category': 'Input Length',
                 'message': 'Input too short. Please provide at least 15 words.',
@@ -54,66 +57,69 @@ class ValidationService:
                 suggestions=suggestions
             )
         
-        text_lower = input_text.lower()
-        
-        # Step 2: Block non-technical content
-        blocked_found = [kw for kw in self.blocked_keywords if kw in text_lower]
-        if blocked_found:
-            errors.append({
-                'category': 'Content Type',
-                'message': f'This appears to be non-technical content (found: {", ".join(blocked_found)})',
-                'severity': 'error'
-            })
-            return ValidationResult(
-                is_valid=False,
-                score=0.0,
-                errors=errors,
-                warnings=warnings,
-                suggestions=['Please provide a technical solution overview, not entertainment content.']
-            )
-        
-        # Step 3: Rule-based validation
-        has_systems = any(kw in text_lower for kw in self.system_keywords)
-        has_users = any(kw in text_lower for kw in self.user_keywords)
-        has_containers = any(kw in text_lower for kw in self.container_keywords)
-        has_relationships = any(kw in text_lower for kw in self.relationship_keywords)
-        
-        # Check for specific services (more lenient)
-        has_specific_services = bool(re.search(
-            r's3|sftp|lambda|ec2|rds|whatsapp|google docs|dashboard|api|database',
-            text_lower
-        ))
-        
-        if not has_systems and not has_specific_services:
-            errors.append({
-                'category': 'System Context',
-                'message': 'No clear system or service identified',
-                'severity': 'error'
-            })
-        
-        if not has_containers and not has_specific_services:
-            errors.append({
-                'category': 'Components',
-                'message': 'No technical components identified',
-                'severity': 'error'
-            })
-        
-        if not has_users:
-            warnings.append({
-                'category': 'Actors',
-                'message': 'No users or actors mentioned',
-                'severity': 'warning'
-            })
-        
-        if not has_relationships:
-            warnings.append({
-                'category': 'Relationships',
-                'message': 'No interactions or data flows described',
-                'severity': 'warning'
-            })
+        with stage_timer('rule_validation'):
+            text_lower = input_text.lower()
+            
+            # Step 2: Block non-technical content
+            blocked_found = [kw for kw in self.blocked_keywords if kw in text_lower]
+            if blocked_found:
+                record_validation('blocked')
+                errors.append({
+                    'category': 'Content Type',
+                    'message': f'This appears to be non-technical content (found: {", ".join(blocked_found)})',
+                    'severity': 'error'
+                })
+                return ValidationResult(
+                    is_valid=False,
+                    score=0.0,
+                    errors=errors,
+                    warnings=warnings,
+                    suggestions=['Please provide a technical solution overview, not entertainment content.']
+                )
+            
+            # Step 3: Rule-based validation
+            has_systems = any(kw in text_lower for kw in self.system_keywords)
+            has_users = any(kw in text_lower for kw in self.user_keywords)
+            has_containers = any(kw in text_lower for kw in self.container_keywords)
+            has_relationships = any(kw in text_lower for kw in self.relationship_keywords)
+            
+            # Check for specific services (more lenient)
+            has_specific_services = bool(re.search(
+                r's3|sftp|lambda|ec2|rds|whatsapp|google docs|dashboard|api|database',
+                text_lower
+            ))
+            
+            if not has_systems and not has_specific_services:
+                errors.append({
+                    'category': 'System Context',
+                    'message': 'No clear system or service identified',
+                    'severity': 'error'
+                })
+            
+            if not has_containers and not has_specific_services:
+                errors.append({
+                    'category': 'Components',
+                    'message': 'No technical components identified',
+                    'severity': 'error'
+                })
+            
+            if not has_users:
+                warnings.append({
+                    'category': 'Actors',
+                    'message': 'No users or actors mentioned',
+                    'severity': 'warning'
+                })
+            
+            if not has_relationships:
+                warnings.append({
+                    'category': 'Relationships',
+                    'message': 'No interactions or data flows described',
+                    'severity': 'warning'
+                })
         
-        # Step 4: Semantic validation (ML-based)
-        semantic_result = self.semantic_validator.validate_semantically(input_text, db)
+        # Step 4: Semantic validation (ML-based; embedding and vector search are timed inside)
+        with span('semantic_validation'):
+            semantic_result = self.semantic_validator.validate_semantically(input_text, db)
         
         if semantic_result['has_similar_examples']:
             if semantic_result['is_likely_valid']:
@@ -128,19 +134,21 @@ class ValidationService:
                 })
         
         # Step 5: Pattern recognition
-        recognized_pattern = self.semantic_validator.recognize_pattern(input_text, db)
-        if recognized_pattern:
-            pattern_suggestions = self.semantic_validator.suggest_pattern_components(
-                recognized_pattern, db
-            )
-            suggestions.extend(pattern_suggestions[:3])  # Add top 3 suggestions
+        with stage_timer('pattern_recognition'):
+            recognized_pattern = self.semantic_validator.recognize_pattern(input_text, db)
+            if recognized_pattern:
+                pattern_suggestions = self.semantic_validator.suggest_pattern_components(
+                    recognized_pattern, db
+                )
+                suggestions.extend(pattern_suggestions[:3])  # Add top 3 suggestions
         
         # Step 6: Gap analysis
-        gap_analysis = self.gap_analyzer.analyze(
-            input_text,
-            errors,
-            semantic_result.get('similar_examples', [])
-        )
+        with stage_timer('gap_analysis'):
+            gap_analysis = self.gap_analyzer.analyze(
+                input_text,
+                errors,
+                semantic_result.get('similar_examples', [])
+            )
         
         # Add gap analysis suggestions
         suggestions.extend(gap_analysis.suggestions[:5])
@@ -158,6 +166,7 @@ class ValidationService:
         
         # Determine if valid
         is_valid = len(errors) == 0 and score >= 50.0
+        record_validation('valid' if is_valid else 'invalid')
         
         return ValidationResult(
             is_valid=is_valid,
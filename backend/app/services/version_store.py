@@ -0,0 +1,191 @@
+from typing import List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session, aliased, undefer_group
+from app.core.config import settings
+from app.models.database import Diagram, DiagramRevision
+from app.services.line_delta import make_delta, needs_snapshot, reconstruct
+
+
+class VersionNotFoundError(Exception):
+    """Raised when a diagram has no revision with the requested version"""
+
+    def __init__(self, diagram_id: int, version: int):
+        self.diagram_id = diagram_id
+        self.version = version
+        super().__init__(f"Diagram {diagram_id} has no version {version}")
+
+
+class VersionStore:
+    """
+    Diagram version history stored as periodic full snapshots plus
+    line-level deltas.
+
+    The Diagram row always holds the latest content, so reading the current
+    version never touches this table. Older versions are rebuilt from the
+    nearest snapshot at or before them; the revisions needed are fetched in
+    one recursive query over parent_revision_id, and at most
+    `snapshot_interval - 1` deltas are applied.
+    """
+
+    def __init__(self, snapshot_interval: int = 10):
+        self.snapshot_interval = max(1, snapshot_interval)
+
+    def commit(
+        self,
+        diagram: Diagram,
+        db: Session,
+        mermaid_code: str,
+        input_text: Optional[str] = None,
+        change_note: Optional[str] = None,
+        user_id: Optional[int] = None,
+        base_version: Optional[int] = None
+    ) -> DiagramRevision:
+        """
+        Record a new version of `diagram` and make it the current content.
+        `base_version` branches from an older version (e.g. after a restore);
+        by default the new version follows the current one.
+
+        The diagram row is locked (and reloaded) first, so concurrent commits
+        to the same diagram take turns instead of both numbering their
+        revision from the same head. Databases without row locks (SQLite)
+        still reject the duplicate through uq_diagram_revisions_diagram_version.
+        """
+        db.refresh(diagram, with_for_update=True)
+        head = self._ensure_base_revision(diagram, db)
+
+        if base_version is None or base_version == head.version:
+            base = head
+            base_mermaid, base_input = diagram.mermaid_code, diagram.input_text
+        else:
+            base = self._get_revision(diagram.id, base_version, db)
+            base_mermaid, base_input = self._rebuild(base, db)
+
+        if input_text is None:
+            input_text = base_input
+
+        revision = DiagramRevision(
+            diagram_id=diagram.id,
+            parent_revision_id=base.id,
+            version=head.version + 1,
+            change_note=change_note,
+            user_id=user_id
+        )
+        mermaid_delta = make_delta(base_mermaid, mermaid_code)
+        input_delta = make_delta(base_input, input_text)
+        delta_size = len(mermaid_delta) + len(input_delta)
+        full_size = len(mermaid_code) + len(input_text)
+
+        if needs_snapshot(base.delta_depth, delta_size, full_size, self.snapshot_interval):
+            revision.is_snapshot = True
+            revision.delta_depth = 0
+            revision.mermaid_code = mermaid_code
+            revision.input_text = input_text
+        else:
+            revision.is_snapshot = False
+            revision.delta_depth = base.delta_depth + 1
+            revision.mermaid_delta = mermaid_delta
+            revision.input_delta = input_delta
+
+        db.add(revision)
+        diagram.mermaid_code = mermaid_code
+        diagram.input_text = input_text
+        diagram.version = revision.version
+        db.commit()
+        db.refresh(revision)
+        return revision
+
+    def get_version(self, diagram: Diagram, version: int, db: Session) -> Tuple[DiagramRevision, str, str]:
+        """Return (revision, mermaid_code, input_text) for one version"""
+        revision = self._get_revision(diagram.id, version, db)
+        if version == diagram.version:
+            return revision, diagram.mermaid_code, diagram.input_text
+        mermaid_code, input_text = self._rebuild(revision, db)
+        return revision, mermaid_code, input_text
+
+    def list_versions(self, diagram_id: int, db: Session) -> List[DiagramRevision]:
+        """All revisions of a diagram, oldest first"""
+        return db.query(DiagramRevision).filter(
+            DiagramRevision.diagram_id == diagram_id
+        ).order_by(DiagramRevision.version).all()
+
+    def lineage(self, diagram_id: int, version: int, db: Session) -> List[DiagramRevision]:
+        """A version and all of its ancestors, oldest first, in one query"""
+        revision = self._get_revision(diagram_id, version, db)
+        return self._ancestors(revision.id, db, stop_at_snapshot=False)
+
+    def _ensure_base_revision(self, diagram: Diagram, db: Session) -> DiagramRevision:
+        """
+        Latest revision of the diagram. Diagrams saved before the version
+        store existed get their current content recorded as a snapshot.
+        """
+        head = db.query(DiagramRevision).filter(
+            DiagramRevision.diagram_id == diagram.id
+        ).order_by(DiagramRevision.version.desc()).first()
+        if head is not None:
+            return head
+
+        head = DiagramRevision(
+            diagram_id=diagram.id,
+            version=diagram.version or 1,
+            is_snapshot=True,
+            delta_depth=0,
+            mermaid_code=diagram.mermaid_code,
+            input_text=diagram.input_text,
+            user_id=diagram.user_id
+        )
+        db.add(head)
+        db.flush()
+        return head
+
+    def _get_revision(self, diagram_id: int, version: int, db: Session) -> DiagramRevision:
+        revision = db.query(DiagramRevision).filter(
+            DiagramRevision.diagram_id == diagram_id,
+            DiagramRevision.version == version
+        ).first()
+        if revision is None:
+            raise VersionNotFoundError(diagram_id, version)
+        return revision
+
+    def _ancestors(self, revision_id: int, db: Session, stop_at_snapshot: bool) -> List[DiagramRevision]:
+        """
+        Walk parent_revision_id with a recursive CTE. With stop_at_snapshot
+        the walk ends at the nearest snapshot, which is all a rebuild needs.
+        """
+        chain = select(
+            DiagramRevision.id,
+            DiagramRevision.parent_revision_id,
+            DiagramRevision.is_snapshot
+        ).where(
+            DiagramRevision.id == revision_id
+        ).cte("revision_chain", recursive=True)
+
+        parent = aliased(DiagramRevision)
+        step = select(
+            parent.id,
+            parent.parent_revision_id,
+            parent.is_snapshot
+        ).join(chain, parent.id == chain.c.parent_revision_id)
+        if stop_at_snapshot:
+            step = step.where(chain.c.is_snapshot.is_(False))
+        chain = chain.union_all(step)
+
+        query = db.query(DiagramRevision).join(chain, DiagramRevision.id == chain.c.id)
+        if stop_at_snapshot:
+            # A rebuild needs the snapshot's text; load it in the same query
+            query = query.options(undefer_group("content"))
+        # Ancestors always have lower version numbers than their descendants
+        return query.order_by(DiagramRevision.version).all()
+
+    def _rebuild(self, revision: DiagramRevision, db: Session) -> Tuple[str, str]:
+        """Reconstruct a revision's content from its nearest snapshot"""
+        if revision.is_snapshot:
+            return revision.mermaid_code, revision.input_text
+
+        chain = self._ancestors(revision.id, db, stop_at_snapshot=True)
+        snapshot, deltas = chain[0], chain[1:]
+        mermaid_code = reconstruct(snapshot.mermaid_code, (r.mermaid_delta for r in deltas))
+        input_text = reconstruct(snapshot.input_text, (r.input_delta for r in deltas))
+        return mermaid_code, input_text
+
+
+version_store = VersionStore(snapshot_interval=settings.DIAGRAM_SNAPSHOT_INTERVAL)
@@ -0,0 +1 @@
+# Benchmarks and measurement scripts
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Storage savings and encode/decode cost of the compressed text columns.
+
+Compares plain UTF-8, zstd without a dictionary and zstd with a dictionary
+trained on a disjoint part of the corpus, then estimates the added CPU per
+request for the diagram endpoints:
+  - list (default projection): no large columns loaded, nothing decoded
+  - list with include=mermaid_code: one decode per row on the page
+  - get: mermaid_code and input_text decoded once
+
+The corpus is synthetic (refined diagrams plus prose inputs) unless
+--from-db is given, which samples stored diagrams instead.
+
+Usage (from backend/, requires zstandard):
+    python -m benchmarks.compression
+    python -m benchmarks.compression --from-db --samples 2000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import zstandard
+
+from app.core.compression import DICT_SUFFIX, TextCompressor
+from benchmarks.version_history import COMPONENTS, initial_diagram, refinement_sequence
+
+INPUT_TEMPLATE = (
+    "Solution Overview: {a} receives requests from customers through the {b}. "
+    "It stores state in the {c} and publishes events to the {d}, which the {e} "
+    "consumes to send notifications. All services run in private subnets behind "
+    "an internal load balancer and authenticate with the {f}."
+)
+
+
+def synthetic_corpus(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    corpus = []
+    while len(corpus) < count:
+        size = rng.randint(6, 25)
+        code = initial_diagram(size)
+        for _, code in refinement_sequence(rng.randint(0, 5), size, rng.randint(0, 10 ** 6)):
+            pass
+        corpus.append(code)
+        names = rng.sample(COMPONENTS, 6)
+        corpus.append(INPUT_TEMPLATE.format(**dict(zip("abcdef", names))) * rng.randint(1, 4))
+    return corpus[:count]
+
+
+def database_corpus(count: int) -> list:
+    from sqlalchemy import func
+    from sqlalchemy.orm import Session
+    from app.core.database import engine
+    from app.models.database import Diagram
+
+    with Session(engine) as session:
+        rows = session.query(Diagram.mermaid_code, Diagram.input_text).order_by(
+            func.random()
+        ).limit(count // 2).all()
+    return [text for row in rows for text in row]
+
+
+def measure(compressor: TextCompressor, corpus: list) -> dict:
+    start = time.perf_counter()
+    encoded = [compressor.compress(text) for text in corpus]
+    encode_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for value, expected in zip(encoded, corpus):
+        if compressor.decompress(value) != expected:
+            raise AssertionError("Round-trip mismatch")
+    decode_s = time.perf_counter() - start
+
+    raw = sum(len(text.encode('utf-8')) for text in corpus)
+    stored = sum(len(value) for value in encoded)
+    decode_us = decode_s / len(corpus) * 1e6
+    return {
+        "stored_bytes": stored,
+        "ratio": round(stored / raw, 3),
+        "encode_us_per_value": round(encode_s / len(corpus) * 1e6, 1),
+        "decode_us_per_value": round(decode_us, 1),
+        "added_ms_per_request": {
+            "list_default": 0.0,
+            "list_include_mermaid_code_20_rows": round(20 * decode_us / 1000, 3),
+            "get": round(2 * decode_us / 1000, 3),
+        },
+    }
+
+
+def run(args):
+    corpus = database_corpus(args.samples) if args.from_db else synthetic_corpus(args.samples, args.seed)
+    random.Random(args.seed).shuffle(corpus)
+    split = len(corpus) // 2
+    training, evaluation = corpus[:split], corpus[split:]
+
+    results = {
+        "values": len(evaluation),
+        "raw_bytes": sum(len(text.encode('utf-8')) for text in evaluation),
+        "zstd": measure(TextCompressor(level=args.level, min_size=0), evaluation),
+    }
+
+    dictionary = zstandard.train_dictionary(
+        args.dict_size, [text.encode('utf-8') for text in training], dict_id=1, level=args.level
+    )
+    with tempfile.TemporaryDirectory() as dict_dir:
+        with open(os.path.join(dict_dir, f"bench-1{DICT_SUFFIX}"), 'wb') as f:
+            f.write(dictionary.as_bytes())
+        results["zstd_dictionary"] = measure(
+            TextCompressor(level=args.level, dict_dir=dict_dir, min_size=0), evaluation
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--level", type=int, default=3)
+    parser.add_argument("--dict-size", type=int, default=64 * 1024)
+    parser.add_argument("--from-db", action="store_true")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Micro-benchmarks for the CPU-bound hot paths, with a regression gate.
+
+Times each function over a fixed corpus (short solution overviews,
+overviews at the 5000 character input limit, and generated Mermaid with
+reserved IDs and code fences) and compares against a stored baseline:
+    - validate_input            (app.main, simple-mode validation)
+    - GapAnalyzer.analyze
+    - sanitize_mermaid          (what DiagramService._sanitize_mermaid_code runs)
+    - ValidationService._calculate_score
+    - SemanticValidator.recognize_pattern (against an in-memory pattern table)
+
+Each case reports its best per-call time over many short rounds: the
+minimum filters out scheduler and frequency noise, which only ever makes a
+round slower. --save records the median of several such runs per case, so
+one lucky or unlucky run does not become the reference. --check fails
+(exit 1) when any case is slower than the baseline by more than
+--threshold. Times are absolute, so record the baseline on the machine (or
+CI runner class) that runs --check; a baseline from another Python version
+or architecture is reported.
+
+Usage (from backend/):
+    python -m benchmarks.hot_paths                   # print results
+    python -m benchmarks.hot_paths --save            # record the baseline (median of 3 runs)
+    python -m benchmarks.hot_paths --check --threshold 0.2
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from app.main import validate_input
+from app.ml.gap_analyzer import GapAnalyzer
+from app.ml.semantic_validator import SemanticValidator
+from app.models.database import LearnedPattern
+from app.services.mermaid_parser import sanitize_mermaid
+from app.services.validation_service import ValidationService
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'baselines' / 'hot_paths.json'
+MAX_INPUT_LENGTH = 5000  # DiagramCreate.input_text max_length
+
+SHORT_OVERVIEWS = [
+    "Build a web application where customers upload invoices that are stored in S3 and processed "
+    "by a Lambda function that sends a confirmation email through SendGrid.",
+    "An internal platform for support staff to manage tickets, integrated with Jira and Slack, "
+    "storing ticket history in a PostgreSQL database.",
+    "Solution Overview: a nightly job transfers files from the partner SFTP server to S3, validates "
+    "them and loads the records into the data warehouse for analysts.",
+    "A mobile app where members book fitness classes, pay with Stripe and receive push notifications.",
+]
+
+OVERVIEW_SENTENCES = [
+    "The {a} receives requests from customers through the {b} and authenticates them with the {c}.",
+    "Orders are stored in the {c} and events are published to the {d} for downstream consumers.",
+    "The {e} consumes those events, calls the {a} for details and sends notifications to users.",
+    "Administrators manage configuration through the {b}, which calls the {d} API over HTTPS.",
+    "Every night a scheduled job exports data from the {c} to S3 where the {e} aggregates reports.",
+    "Operators monitor the {a} and the {e} with dashboards and receive alerts when errors increase.",
+    "Files uploaded by employees are scanned, transformed and transferred to the partner SFTP server.",
+]
+SERVICES = [
+    "Order Service", "API Gateway", "Identity Provider", "Event Bus", "Notification Worker",
+    "Payment Service", "Orders Database", "Admin Portal", "Reporting Service", "Search Cluster",
+]
+
+PATTERN_KEYWORDS = {
+    'file_transfer': ['file', 'transfer', 'sftp', 's3', 'upload'],
+    'api_integration': ['api', 'rest', 'endpoint', 'integrate', 'webhook'],
+    'event_driven': ['event', 'queue', 'publish', 'subscribe', 'kafka'],
+    'microservices': ['microservice', 'service', 'gateway', 'mesh', 'container'],
+    'data_pipeline': ['pipeline', 'etl', 'warehouse', 'transform', 'airflow'],
+}
+
+
+def long_overview(rng: random.Random) -> str:
+    """Realistic overview padded with varied sentences to the input limit"""
+    parts = ["Solution Overview:"]
+    while sum(len(part) + 1 for part in parts) < MAX_INPUT_LENGTH:
+        names = rng.sample(SERVICES, 5)
+        parts.append(rng.choice(OVERVIEW_SENTENCES).format(a=names[0], b=names[1], c=names[2], d=names[3], e=names[4]))
+    return ' '.join(parts)[:MAX_INPUT_LENGTH]
+
+
+def generated_mermaid(rng: random.Random, nodes: int) -> str:
+    """LLM-style output: code fences, a reserved ID, classes and styles"""
+    ids = ['System'] + [f"N{index}" for index in range(1, nodes)]
+    lines = ['```mermaid', 'graph LR', '    User[👤 Customer<br/>Places orders]']
+    lines += [f"    {node_id}[🔷 {rng.choice(SERVICES)}<br/>Handles step {index}]" for index, node_id in enumerate(ids)]
+    lines.append(f"    User -->|Uses| {ids[0]}")
+    for index in range(1, nodes):
+        lines.append(f"    {ids[rng.randrange(index)]} -->|Calls| {ids[index]}")
+    lines += [
+        '    classDef systemStyle fill:#1168BD,stroke:#0B4884,color:#fff',
+        f"    class {','.join(ids)} systemStyle",
+        f"    style {ids[0]} stroke-width:3px",
+        '```',
+    ]
+    return '\n'.join(lines)
+
+
+class PatternTable:
+    """In-memory stand-in for the session recognize_pattern queries"""
+
+    def __init__(self, patterns: List[LearnedPattern]):
+        self.patterns = patterns
+
+    def query(self, model):
+        return self
+
+    def filter(self, *criteria):
+        return self
+
+    def all(self):
+        return self.patterns
+
+
+def build_cases() -> Dict[str, Callable[[], object]]:
+    rng = random.Random(42)
+    short_text = SHORT_OVERVIEWS[0]
+    long_text = long_overview(rng)
+    small_diagram = generated_mermaid(rng, 6)
+    large_diagram = generated_mermaid(rng, 40)
+
+    gap_analyzer = GapAnalyzer()
+    validation_service = ValidationService.__new__(ValidationService)  # Skip loading the embedding model
+    semantic_validator = SemanticValidator.__new__(SemanticValidator)
+    patterns = PatternTable([
+        LearnedPattern(pattern_name=name, keywords=keywords, confidence_score=0.9)
+        for name, keywords in PATTERN_KEYWORDS.items()
+    ])
+    errors = [{'type': 'missing_users', 'message': 'No users or actors identified'}]
+
+    def score():
+        for has_users in (True, False):
+            validation_service._calculate_score(True, has_users, True, False, 0.42, 1, 2)
+
+    return {
+        'validate_input.short': lambda: [validate_input(text) for text in SHORT_OVERVIEWS],
+        'validate_input.max_length': lambda: validate_input(long_text),
+        'gap_analyzer.short': lambda: gap_analyzer.analyze(short_text, errors),
+        'gap_analyzer.max_length': lambda: gap_analyzer.analyze(long_text, errors),
+        'sanitize_mermaid.small': lambda: sanitize_mermaid(small_diagram),
+        'sanitize_mermaid.large': lambda: sanitize_mermaid(large_diagram),
+        'calculate_score': score,
+        'recognize_pattern.short': lambda: semantic_validator.recognize_pattern(short_text, patterns),
+        'recognize_pattern.max_length': lambda: semantic_validator.recognize_pattern(long_text, patterns),
+    }
+
+
+def loops_for(func: Callable[[], object], min_time: float) -> int:
+    """Calls per round so that one round takes about `min_time`"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 10:
+            break
+        loops *= 2
+    return max(1, int(loops * min_time / elapsed))
+
+
+def best_times(cases: Dict[str, Callable[[], object]], min_time: float, rounds: int) -> Dict[str, float]:
+    """
+    Best seconds per call for each case over `rounds` rounds. Rounds are
+    interleaved across cases, so a slow spell on the machine hits one round
+    of every case rather than all rounds of one.
+    """
+    loops = {name: loops_for(func, min_time) for name, func in cases.items()}
+    best = {name: float('inf') for name in cases}
+    for _ in range(rounds):
+        for name, func in cases.items():
+            start = time.perf_counter()
+            for _ in range(loops[name]):
+                func()
+            best[name] = min(best[name], (time.perf_counter() - start) / loops[name])
+    return best
+
+
+def run(min_time: float, rounds: int, only: List[str], runs: int = 1) -> dict:
+    """Best time per case; with several runs, the median of their best times"""
+    cases = {
+        name: func for name, func in build_cases().items()
+        if not only or any(name.startswith(prefix) for prefix in only)
+    }
+    samples = {name: [] for name in cases}
+    for _ in range(runs):
+        for name, seconds in best_times(cases, min_time, rounds).items():
+            samples[name].append(seconds)
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'runs': runs,
+        'results': {name: {'us': round(statistics.median(times) * 1e6, 3)} for name, times in samples.items()},
+    }
+
+
+def check(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """Names and slowdowns of cases slower than baseline * (1 + threshold)"""
+    regressions = []
+    for name, result in current['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        change = result['us'] / previous['us'] - 1
+        if change > threshold:
+            regressions.append(f"{name}: {change:+.1%} ({previous['us']:.1f} -> {result['us']:.1f} us)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--min-time', type=float, default=0.02, help='Seconds per round of one case')
+    parser.add_argument('--rounds', type=int, default=50, help='Rounds per case; the fastest counts')
+    parser.add_argument('--save-runs', type=int, default=3, help='Runs whose median --save records')
+    parser.add_argument('--only', action='append', default=[], help='Run cases with this name prefix')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--check', action='store_true', help='Exit 1 if a case regressed past the threshold')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    current = run(args.min_time, args.rounds, args.only, runs=args.save_runs if args.save else 1)
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else None
+    if baseline and (baseline.get('python'), baseline.get('machine')) != (current['python'], current['machine']):
+        print(f"Baseline was recorded with Python {baseline.get('python')} on {baseline.get('machine')}; "
+              f"comparing anyway\n")
+    for name, result in current['results'].items():
+        line = f"{name:<32} {result['us']:>10.2f} us"
+        previous = baseline['results'].get(name) if baseline else None
+        if previous:
+            line += f"  {result['us'] / previous['us'] - 1:+7.1%} vs baseline"
+        print(line)
+
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(current, indent=2) + '\n')
+        print(f"Baseline written to {args.baseline}")
+    elif args.check:
+        if baseline is None:
+            print(f"No baseline at {args.baseline}; record one with --save")
+            sys.exit(2)
+        regressions = check(current, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} hot path(s) slower than baseline by more than {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
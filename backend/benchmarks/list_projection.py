@@ -0,0 +1,149 @@
+"""
+Measure payload size and query time of the diagram list endpoint with the
+full ORM rows versus the summary projection.
+
+Usage (from backend/, against a database initialised with init_db.py):
+    python -m benchmarks.list_projection --user-id 1
+    python -m benchmarks.list_projection --seed 500   # create a synthetic user first
+"""
+import argparse
+import json
+import statistics
+import time
+
+from sqlalchemy.orm import load_only
+
+from app.core.database import SessionLocal
+from app.models.database import Diagram, User
+from app.models.schemas import DiagramResponse, DiagramSummary
+
+# Mirrors app.api.diagrams.SUMMARY_COLUMNS without importing the router,
+# which would load the embedding model
+SUMMARY_COLUMNS = (
+    Diagram.id,
+    Diagram.title,
+    Diagram.diagram_type,
+    Diagram.version,
+    Diagram.created_at,
+    Diagram.updated_at,
+)
+
+SAMPLE_MERMAID = """graph LR
+    UserNode[👤 Operations User<br/>Uploads files]
+    TransferSys[🔷 File Transfer System<br/>Moves files]
+    S3Bucket[📦 Amazon S3<br/>Source storage]
+    SFTPServer[📦 SFTP Server<br/>Partner endpoint]
+    AuditDB[💾 Audit Database<br/>Transfer history]
+
+    UserNode -->|Schedules transfer| TransferSys
+    TransferSys -->|Reads objects| S3Bucket
+    TransferSys -->|Pushes files| SFTPServer
+    TransferSys -->|Writes audit records| AuditDB
+
+    classDef userStyle fill:#08427B,stroke:#052E56,color:#fff
+    classDef systemStyle fill:#1168BD,stroke:#0B4884,color:#fff
+    classDef externalStyle fill:#999,stroke:#666,color:#fff
+    classDef dbStyle fill:#2E7D32,stroke:#1B5E20,color:#fff
+
+    class UserNode userStyle
+    class TransferSys systemStyle
+    class S3Bucket,SFTPServer externalStyle
+    class AuditDB dbStyle
+"""
+
+SAMPLE_INPUT = (
+    "Build a file transfer system where operations users schedule transfers of "
+    "files from Amazon S3 buckets to partner SFTP servers. Every transfer is "
+    "recorded in an audit database and failures notify the on-call team by email. "
+) * 12
+
+
+def seed(db, count: int) -> int:
+    """Create a synthetic user with `count` diagrams and return its id"""
+    user = User(
+        email=f"bench-{time.time_ns()}@example.com",
+        username=f"bench-{time.time_ns()}",
+        hashed_password="!",
+    )
+    db.add(user)
+    db.commit()
+    db.add_all([
+        Diagram(
+            title=f"Benchmark diagram {i}",
+            description=SAMPLE_INPUT[:500],
+            input_text=SAMPLE_INPUT,
+            mermaid_code=SAMPLE_MERMAID,
+            diagram_type="context",
+            user_id=user.id
+        )
+        for i in range(count)
+    ])
+    db.commit()
+    return user.id
+
+
+def run_query(db, user_id: int, page_size: int, projected: bool):
+    query = db.query(Diagram)
+    if projected:
+        query = query.options(load_only(*SUMMARY_COLUMNS))
+    return query.filter(
+        Diagram.user_id == user_id
+    ).order_by(
+        Diagram.created_at.desc(),
+        Diagram.id.desc()
+    ).limit(page_size).all()
+
+
+def measure(user_id: int, page_size: int, iterations: int, projected: bool) -> dict:
+    schema = DiagramSummary if projected else DiagramResponse
+    timings = []
+    payload_bytes = 0
+    for _ in range(iterations):
+        # Fresh session per iteration so the identity map does not hide loads
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            rows = run_query(db, user_id, page_size, projected)
+            body = json.dumps(
+                [schema.model_validate(row).model_dump(mode="json") for row in rows]
+            )
+            timings.append((time.perf_counter() - start) * 1000)
+            payload_bytes = len(body.encode())
+        finally:
+            db.close()
+    return {
+        "rows": page_size,
+        "payload_bytes": payload_bytes,
+        "p50_ms": statistics.median(timings),
+        "mean_ms": statistics.fmean(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument("--seed", type=int, default=0, help="create a user with N diagrams")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    user_id = args.user_id
+    if args.seed:
+        with SessionLocal() as db:
+            user_id = seed(db, args.seed)
+        print(f"Seeded user {user_id} with {args.seed} diagrams")
+    if user_id is None:
+        parser.error("pass --user-id or --seed")
+
+    full = measure(user_id, args.page_size, args.iterations, projected=False)
+    summary = measure(user_id, args.page_size, args.iterations, projected=True)
+
+    print(json.dumps({"full_rows": full, "summary_projection": summary}, indent=2))
+    if full["payload_bytes"]:
+        print(f"Payload reduction: {1 - summary['payload_bytes'] / full['payload_bytes']:.0%}")
+    if full["p50_ms"]:
+        print(f"p50 query+serialize reduction: {1 - summary['p50_ms'] / full['p50_ms']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
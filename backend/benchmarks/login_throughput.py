@@ -0,0 +1,136 @@
+"""
+Login throughput under concurrent diagram traffic.
+
+Measures diagram-list latency on its own, then again while a burst of
+logins runs, and reports login throughput. With hashing on the event loop
+the diagram p95 jumps by roughly (bcrypt time x concurrent logins); with
+the off-loop hasher it should stay close to the baseline.
+
+Needs the database-backed API: `USE_DATABASE=true uvicorn app.main:app` mounts
+the /api/auth and /api/diagrams routers (run `python init_db.py` first for the
+admin user). Usage, with that server running:
+    python -m benchmarks.login_throughput --base-url http://localhost:8000 \\
+        --username admin --password admin123 --logins 200 --login-concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "mean_ms": statistics.fmean(samples) if samples else 0.0,
+    }
+
+
+async def login(client, username, password) -> str:
+    response = await client.post(
+        "/api/auth/token", data={"username": username, "password": password}
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def diagram_traffic(client, token, stop: asyncio.Event, samples, concurrency):
+    """Keep `concurrency` list requests in flight until stopped"""
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def worker():
+        while not stop.is_set():
+            start = time.perf_counter()
+            await client.get("/api/diagrams/", headers=headers, params={"include_total": "false"})
+            samples.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def login_burst(client, username, password, total, concurrency):
+    """Run `total` logins with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await login(client, username, password)
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+async def run(args):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        token = await login(client, args.username, args.password)
+
+        # Phase 1: diagram traffic alone
+        baseline = []
+        stop = asyncio.Event()
+        traffic = asyncio.create_task(
+            diagram_traffic(client, token, stop, baseline, args.traffic_concurrency)
+        )
+        await asyncio.sleep(args.baseline_seconds)
+        stop.set()
+        await traffic
+
+        # Phase 2: diagram traffic during a login burst
+        during = []
+        stop = asyncio.Event()
+        traffic = asyncio.create_task(
+            diagram_traffic(client, token, stop, during, args.traffic_concurrency)
+        )
+        latencies, errors, elapsed = await login_burst(
+            client, args.username, args.password, args.logins, args.login_concurrency
+        )
+        stop.set()
+        await traffic
+
+    return {
+        "logins": {
+            **summarize(latencies),
+            "errors": errors,
+            "throughput_per_s": args.logins / elapsed if elapsed else 0.0,
+        },
+        "diagram_requests_baseline": summarize(baseline),
+        "diagram_requests_during_logins": summarize(during),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--login-concurrency", type=int, default=16)
+    parser.add_argument("--traffic-concurrency", type=int, default=8)
+    parser.add_argument("--baseline-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
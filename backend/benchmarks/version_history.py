@@ -0,0 +1,164 @@
+"""
+Storage size and reconstruction time of diagram version history: full
+copies per version versus periodic snapshots plus line deltas.
+
+Simulates a diagram going through many refinements (renames, new edges,
+restyles, removals applied with the local refinement engine), stores the
+history both ways in memory and rebuilds every version. Revisions are
+stored with the same policy as app.services.version_store; in the database
+the revisions a rebuild needs come back from one recursive query.
+
+Usage (from backend/):
+    python -m benchmarks.version_history --refinements 150
+    python -m benchmarks.version_history --refinements 500 --interval 20
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from app.services.line_delta import make_delta, needs_snapshot, reconstruct
+from app.services.refine_engine import refine_engine
+
+COMPONENTS = [
+    "API Gateway", "Auth Service", "Order Service", "Payment Service", "Inventory Service",
+    "Notification Service", "Search Service", "Reporting Service", "Billing Service",
+    "Shipping Service", "Catalog Service", "Recommendation Engine", "Audit Log",
+    "Message Queue", "Cache Cluster", "Orders Database", "Payments Database",
+    "Data Warehouse", "Email Provider", "SMS Gateway", "CDN", "Object Storage",
+    "Identity Provider", "Fraud Detection", "Pricing Service", "Loyalty Service",
+    "Support Portal", "Admin Console", "Analytics Pipeline", "Scheduler",
+]
+COLORS = ["red", "green", "blue", "orange", "purple", "grey"]
+
+
+def initial_diagram(size: int) -> str:
+    lines = ["graph LR", "    User[👤 Customer<br/>Places orders]"]
+    for i, name in enumerate(COMPONENTS[:size]):
+        lines.append(f"    N{i}[🔷 {name}<br/>Handles {name.lower()} traffic]")
+    lines.append("")
+    lines.append("    User -->|Uses| N0")
+    for i in range(1, size):
+        lines.append(f"    N{i // 2} -->|Calls| N{i}")
+    lines.append("")
+    lines.append("    classDef userStyle fill:#08427B,stroke:#052E56,color:#fff")
+    lines.append("    classDef systemStyle fill:#1168BD,stroke:#0B4884,color:#fff")
+    lines.append("    class User userStyle")
+    lines.append("    class " + ",".join(f"N{i}" for i in range(size)) + " systemStyle")
+    return "\n".join(lines)
+
+
+def refinement_sequence(count: int, size: int, seed: int):
+    """Yield (instruction, mermaid_code) for each successful local refinement"""
+    rng = random.Random(seed)
+    code = initial_diagram(size)
+    names = {f"N{i}": name for i, name in enumerate(COMPONENTS[:size])}
+    produced = 0
+
+    while produced < count:
+        live = list(names)
+        op = rng.choices(["rename", "connect", "restyle", "remove"], weights=[4, 4, 3, 1])[0]
+        if op == "remove" and len(live) <= size // 2:
+            op = "rename"
+
+        if op == "rename":
+            node_id = rng.choice(live)
+            new_name = f"{names[node_id].split(' v')[0]} v{produced + 2}"
+            instruction = f"rename {node_id} to {new_name}"
+            names[node_id] = new_name
+        elif op == "connect":
+            source, target = rng.sample(live, 2)
+            instruction = f"connect {source} to {target} labeled Step {produced}"
+        elif op == "restyle":
+            instruction = f"make {rng.choice(live)} {rng.choice(COLORS)}"
+        else:
+            node_id = rng.choice(live)
+            instruction = f"remove {node_id}"
+            del names[node_id]
+
+        result = refine_engine.try_refine(code, instruction)
+        if result is None:
+            continue
+        code = result["updated_mermaid"]
+        produced += 1
+        yield instruction, code
+
+
+def build_history(versions, interval: int):
+    """Store versions as snapshots + deltas; returns the revision list"""
+    revisions = []
+    depth = 0
+    previous = None
+    for text in versions:
+        if previous is None:
+            revisions.append({"snapshot": text, "depth": 0})
+        else:
+            delta = make_delta(previous, text)
+            if needs_snapshot(depth, len(delta), len(text), interval):
+                depth = 0
+                revisions.append({"snapshot": text, "depth": 0})
+            else:
+                depth += 1
+                revisions.append({"delta": delta, "depth": depth})
+        previous = text
+    return revisions
+
+
+def rebuild(revisions, index: int) -> str:
+    """Rebuild one version the way VersionStore._rebuild does"""
+    start = index - revisions[index]["depth"]
+    return reconstruct(
+        revisions[start]["snapshot"],
+        (revision["delta"] for revision in revisions[start + 1:index + 1])
+    )
+
+
+def run(args):
+    versions = [initial_diagram(args.nodes)]
+    versions.extend(code for _, code in refinement_sequence(args.refinements, args.nodes, args.seed))
+
+    full_bytes = sum(len(text.encode()) for text in versions)
+    revisions = build_history(versions, args.interval)
+    stored_bytes = sum(
+        len((revision.get("snapshot") or revision["delta"]).encode()) for revision in revisions
+    )
+
+    timings = []
+    for index, expected in enumerate(versions):
+        start = time.perf_counter()
+        rebuilt = rebuild(revisions, index)
+        timings.append((time.perf_counter() - start) * 1000)
+        if rebuilt != expected:
+            raise AssertionError(f"Version {index + 1} did not round-trip")
+
+    ordered = sorted(timings)
+    return {
+        "versions": len(versions),
+        "snapshot_interval": args.interval,
+        "snapshots": sum(1 for revision in revisions if "snapshot" in revision),
+        "full_copy_bytes": full_bytes,
+        "snapshot_delta_bytes": stored_bytes,
+        "storage_ratio": round(stored_bytes / full_bytes, 3),
+        "max_deltas_applied": max(revision["depth"] for revision in revisions),
+        "rebuild_ms": {
+            "mean": round(statistics.fmean(timings), 3),
+            "p95": round(ordered[int(len(ordered) * 0.95)], 3),
+            "max": round(ordered[-1], 3),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--refinements", type=int, default=150)
+    parser.add_argument("--nodes", type=int, default=20)
+    parser.add_argument("--interval", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,24 @@
 Initialize database with pgvector extension and create tables.
 Run this script once to set up the database.
 """
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 from app.core.database import engine, Base
 from app.models.database import (
     User, Team, ValidatedInput, Diagram,
-    UserFeedback, LearnedPattern, UsageLog
+    UserFeedback, LearnedPattern, UsageLog, TeamUsageCounter, DiagramRevision
 )
 
 
+def _index_differs(index, reflected: dict) -> bool:
+    """Whether a reflected index no longer matches its model definition"""
+    include = index.dialect_options['postgresql']['include'] or []
+    return (
+        list(reflected['column_names']) != [column.name for column in index.columns]
+        or bool(reflected['unique']) != bool(index.unique)
+        or list(reflected.get('dialect_options', {}).get('postgresql_include', [])) != list(include)
+    )
+
+
 def init_db():
     """Initialize database with pgvector extension and create all tables"""
     
@@ -23,6 +33,21 @@ def init_db():
     Base.metadata.create_all(bind=engine)
     print("✓ Created all database tables")
     
+    # create_all skips indexes on tables that already exist, so add any
+    # indexes introduced after the initial deployment, and rebuild any whose
+    # definition has since changed (e.g. gained INCLUDE columns)
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {index['name']: index for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+            elif _index_differs(index, existing[index.name]):
+                index.drop(bind=engine)
+                index.create(bind=engine)
+                print(f"✓ Rebuilt index {index.name}")
+    print("✓ Ensured all indexes exist")
+    
     # Create default team
     from sqlalchemy.orm import Session
     from app.api.auth import get_password_hash
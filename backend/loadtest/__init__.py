@@ -0,0 +1 @@
+# Load testing against a local fake LLM API
@@ -0,0 +1,435 @@
+"""
+Local fake of the Anthropic Messages API and the Bedrock runtime.
+
+Serves canned but well-formed responses for the generate, suggest and
+refine prompts, with configurable latency, token streaming and injected
+errors, so load tests never call (or pay for) a real model.
+
+Endpoints:
+    POST /v1/messages                                  Anthropic Messages API (stream or not)
+    POST /model/{model_id}/invoke                      Bedrock InvokeModel
+    POST /model/{model_id}/invoke-with-response-stream Bedrock streaming (AWS event stream)
+    GET  /stats                                        Calls served, by status
+
+Point the app at it with ANTHROPIC_BASE_URL=http://127.0.0.1:<port> (any
+ANTHROPIC_API_KEY works) or BEDROCK_ENDPOINT_URL for the Lambda code.
+
+    python -m loadtest.fake_llm --port 8089 --latency lognormal:800:2500 --throttle-rate 0.02
+"""
+import argparse
+import base64
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from app.services.prompts import (
+    GENERATE_SYSTEM_PROMPT, MIN_CACHEABLE_TOKENS, REFINE_SYSTEM_PROMPT, SUGGEST_ONE_SYSTEM_PROMPT,
+    SUGGEST_SYSTEM_PROMPT
+)
+
+BEDROCK_PATH = re.compile(r'^/model/(?P<model>[^/]+)/(?P<action>invoke|invoke-with-response-stream)$')
+
+
+class LatencyDistribution:
+    """
+    Time to first token, in seconds, from a spec string (milliseconds):
+        fixed:800             always 800 ms
+        uniform:200:1500      uniformly between 200 and 1500 ms
+        lognormal:800:2500    lognormal with p50 800 ms and p95 2500 ms
+    """
+
+    def __init__(self, spec: str, rng: Optional[random.Random] = None):
+        self.spec = spec
+        self.rng = rng or random.Random()
+        kind, *params = spec.split(':')
+        values = [float(param) / 1000 for param in params]
+        if kind == 'fixed' and len(values) == 1:
+            self._sample = lambda: values[0]
+        elif kind == 'uniform' and len(values) == 2:
+            self._sample = lambda: self.rng.uniform(values[0], values[1])
+        elif kind == 'lognormal' and len(values) == 2:
+            mu = math.log(values[0])
+            sigma = max(0.0, (math.log(values[1]) - mu) / 1.645)
+            self._sample = lambda: self.rng.lognormvariate(mu, sigma)
+        else:
+            raise ValueError(f"Bad latency spec: {spec}")
+
+    def sample(self) -> float:
+        return self._sample()
+
+
+@dataclass
+class FakeLLMConfig:
+    latency: str = 'lognormal:800:2500'
+    token_delay_ms: float = 5.0  # Per output token (streamed or not)
+    error_rate: float = 0.0  # 500 api_error
+    overload_rate: float = 0.0  # 529 overloaded_error
+    throttle_rate: float = 0.0  # 429 rate_limit_error / ThrottlingException
+    seed: Optional[int] = None
+
+
+@dataclass
+class FakeLLMStats:
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    calls: int = 0
+    by_status: Dict[int, int] = field(default_factory=dict)
+    by_task: Dict[str, int] = field(default_factory=dict)
+    cached_prefixes: set = field(default_factory=set)
+
+    def record(self, task: str, status: int):
+        with self.lock:
+            self.calls += 1
+            self.by_status[status] = self.by_status.get(status, 0) + 1
+            self.by_task[task] = self.by_task.get(task, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'calls': self.calls,
+                'by_status': {str(status): count for status, count in sorted(self.by_status.items())},
+                'by_task': dict(self.by_task)
+            }
+
+
+def _system_text(system) -> Tuple[str, bool]:
+    """System prompt text and whether it carries a cache breakpoint"""
+    if not system:
+        return '', False
+    if isinstance(system, str):
+        return system, False
+    text = ''.join(block.get('text', '') for block in system)
+    return text, any('cache_control' in block for block in system)
+
+
+def _user_text(messages: List[dict]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(block.get('text', '') for block in content or [])
+    return '\n'.join(parts)
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _diagram(prompt: str, rng: random.Random) -> str:
+    """A small, valid flowchart whose size loosely follows the prompt"""
+    count = min(12, max(3, _tokens(prompt) // 25))
+    names = [f"Node{index}" for index in range(count)]
+    lines = ['graph LR', f'    User[👤 User<br/>Uses the system]']
+    lines += [f'    {name}[🔷 Component {index}<br/>Handles step {index}]' for index, name in enumerate(names)]
+    lines.append(f'    User -->|Uses| {names[0]}')
+    for source, target in zip(names, names[1:]):
+        lines.append(f'    {source} -->|Calls| {target}')
+    if rng.random() < 0.5:
+        lines.append(f'    {names[-1]} -->|Replies| {names[0]}')
+    lines += [
+        '    classDef userStyle fill:#08427B,stroke:#052E56,color:#fff',
+        '    classDef systemStyle fill:#1168BD,stroke:#0B4884,color:#fff',
+        '    class User userStyle',
+        f'    class {",".join(names)} systemStyle'
+    ]
+    return '\n'.join(lines)
+
+
+def fake_completion(system: str, prompt: str, rng: random.Random) -> Tuple[str, str]:
+    """(task, response text) matching the output format the prompt asks for"""
+    if system == GENERATE_SYSTEM_PROMPT:
+        return 'generate', _diagram(prompt, rng)
+    if system == SUGGEST_SYSTEM_PROMPT:
+        return 'suggest', json.dumps({'suggestions': [
+            {
+                'title': f'Interpretation {index + 1} of the request',
+                'description': 'A complete description with system, users and integrations.',
+                'improved_text': (
+                    'Build a web platform where operations staff upload files that are validated, '
+                    'stored in Amazon S3 and transferred to partner SFTP servers, with email alerts '
+                    f'sent through an external notification service (variant {index + 1}).'
+                )
+            }
+            for index in range(3)
+        ]})
+    if system == SUGGEST_ONE_SYSTEM_PROMPT:
+        angle = prompt.rsplit('Interpretation angle:', 1)[-1].strip()
+        return 'suggest', json.dumps({
+            'title': f'{angle} interpretation',
+            'description': 'A complete description with system, users and integrations.',
+            'improved_text': (
+                f'Build a {angle.lower()} where operations staff review file transfers between Amazon S3 '
+                'and partner SFTP servers, with email alerts sent through an external notification service.'
+            )
+        })
+    if system == REFINE_SYSTEM_PROMPT:
+        return 'refine', json.dumps({
+            'updated_mermaid': _diagram(prompt, rng),
+            'changes_made': ['Applied the requested change'],
+            'explanation': 'Updated the diagram as requested.'
+        })
+    return 'other', 'OK'
+
+
+def _chunks(text: str, size: int = 16) -> List[str]:
+    return [text[start:start + size] for start in range(0, len(text), size)] or ['']
+
+
+def event_stream_frame(payload: bytes, event_type: str = 'chunk') -> bytes:
+    """One AWS event stream message (as used by InvokeModelWithResponseStream)"""
+    headers = b''
+    for name, value in ((':event-type', event_type), (':content-type', 'application/json'), (':message-type', 'event')):
+        encoded_name, encoded_value = name.encode(), value.encode()
+        headers += struct.pack('B', len(encoded_name)) + encoded_name + b'\x07'
+        headers += struct.pack('>H', len(encoded_value)) + encoded_value
+    total_length = 12 + len(headers) + len(payload) + 4
+    prelude = struct.pack('>II', total_length, len(headers))
+    message = prelude + struct.pack('>I', zlib.crc32(prelude)) + headers + payload
+    return message + struct.pack('>I', zlib.crc32(message))
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: 'FakeLLMServer'
+
+    def log_message(self, format, *args):
+        pass  # Keep load-test output readable
+
+    # -- routing ---------------------------------------------------------
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, self.server.stats.snapshot())
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'type': 'error', 'error': {'type': 'invalid_request_error', 'message': 'Bad JSON'}})
+            return
+
+        bedrock = BEDROCK_PATH.match(self.path)
+        if self.path.split('?')[0] == '/v1/messages':
+            self._messages(body, model=body.get('model', 'unknown'), bedrock=False, stream=bool(body.get('stream')))
+        elif bedrock:
+            self._messages(
+                body,
+                model=bedrock.group('model'),
+                bedrock=True,
+                stream=bedrock.group('action') == 'invoke-with-response-stream'
+            )
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    # -- responses -------------------------------------------------------
+
+    def _messages(self, body: dict, model: str, bedrock: bool, stream: bool):
+        server = self.server
+        rng = server.rng
+        system, cacheable = _system_text(body.get('system'))
+        prompt = _user_text(body.get('messages') or [])
+        task, text = fake_completion(system, prompt, rng)
+
+        injected = self._injected_error(rng, bedrock)
+        time.sleep(server.latency.sample())
+        if injected is not None:
+            status, payload, headers = injected
+            server.stats.record(task, status)
+            self._send_json(status, payload, headers)
+            return
+
+        usage = self._usage(model, system, cacheable, prompt, text)
+        server.stats.record(task, 200)
+        # A forced tool call answers with the same JSON as a tool_use input
+        forced = body.get('tool_choice') or {}
+        tool_name = forced.get('name') if forced.get('type') == 'tool' else None
+        if tool_name:
+            block = {'type': 'tool_use', 'id': f"toolu_{uuid.uuid4().hex[:24]}", 'name': tool_name,
+                     'input': json.loads(text)}
+            start_block = {**block, 'input': {}}
+            delta = lambda chunk: {'type': 'input_json_delta', 'partial_json': chunk}
+        else:
+            block = {'type': 'text', 'text': text}
+            start_block = {'type': 'text', 'text': ''}
+            delta = lambda chunk: {'type': 'text_delta', 'text': chunk}
+        message = {
+            'id': f"msg_{uuid.uuid4().hex[:24]}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': model,
+            'content': [block],
+            'stop_reason': 'tool_use' if tool_name else 'end_turn',
+            'stop_sequence': None,
+            'usage': usage
+        }
+        token_delay = server.config.token_delay_ms / 1000
+
+        if not stream:
+            time.sleep(token_delay * usage['output_tokens'])
+            self._send_json(200, message)
+            return
+
+        events = [
+            ('message_start', {'type': 'message_start', 'message': {
+                **message, 'content': [], 'stop_reason': None, 'usage': {**usage, 'output_tokens': 1}
+            }}),
+            ('content_block_start', {'type': 'content_block_start', 'index': 0, 'content_block': start_block}),
+        ]
+        events += [
+            ('content_block_delta', {'type': 'content_block_delta', 'index': 0, 'delta': delta(chunk)})
+            for chunk in _chunks(text)
+        ]
+        events += [
+            ('content_block_stop', {'type': 'content_block_stop', 'index': 0}),
+            ('message_delta', {'type': 'message_delta', 'delta': {'stop_reason': message['stop_reason'], 'stop_sequence': None},
+                               'usage': {'output_tokens': usage['output_tokens']}}),
+            ('message_stop', {'type': 'message_stop'}),
+        ]
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.amazon.eventstream' if bedrock else 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        for name, event in events:
+            if bedrock:
+                payload = json.dumps({'bytes': base64.b64encode(json.dumps(event).encode()).decode()}).encode()
+                self.wfile.write(event_stream_frame(payload))
+            else:
+                self.wfile.write(f"event: {name}\ndata: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+            if name == 'content_block_delta':
+                delta = event['delta']
+                time.sleep(token_delay * _tokens(delta.get('text') or delta.get('partial_json', '')))
+
+    def _usage(self, model: str, system: str, cacheable: bool, prompt: str, text: str) -> dict:
+        """
+        Token counts, simulating a prompt cache for marked system prompts
+        that reach the model's minimum cacheable length
+        """
+        system_tokens = _tokens(system) if system else 0
+        minimum = MIN_CACHEABLE_TOKENS['haiku' if 'haiku' in model.lower() else 'sonnet']
+        cacheable = cacheable and system_tokens >= minimum
+        usage = {
+            'input_tokens': _tokens(prompt),
+            'output_tokens': _tokens(text),
+            'cache_read_input_tokens': 0,
+            'cache_creation_input_tokens': 0
+        }
+        if cacheable:
+            stats = self.server.stats
+            with stats.lock:
+                hit = system in stats.cached_prefixes
+                stats.cached_prefixes.add(system)
+            usage['cache_read_input_tokens' if hit else 'cache_creation_input_tokens'] = system_tokens
+        else:
+            usage['input_tokens'] += system_tokens
+        return usage
+
+    def _injected_error(self, rng: random.Random, bedrock: bool) -> Optional[Tuple[int, dict, dict]]:
+        config = self.server.config
+        roll = rng.random()
+        if roll < config.throttle_rate:
+            if bedrock:
+                return 429, {'message': 'Too many requests, please wait before trying again.'}, {
+                    'x-amzn-ErrorType': 'ThrottlingException'
+                }
+            return 429, {'type': 'error', 'error': {'type': 'rate_limit_error', 'message': 'Rate limited'}}, {
+                'retry-after': '1'
+            }
+        roll -= config.throttle_rate
+        if roll < config.overload_rate:
+            if bedrock:
+                return 503, {'message': 'Model is overloaded'}, {'x-amzn-ErrorType': 'ServiceUnavailableException'}
+            return 529, {'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'Overloaded'}}, {}
+        roll -= config.overload_rate
+        if roll < config.error_rate:
+            if bedrock:
+                return 500, {'message': 'Internal server error'}, {'x-amzn-ErrorType': 'InternalServerException'}
+            return 500, {'type': 'error', 'error': {'type': 'api_error', 'message': 'Internal error'}}, {}
+        return None
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address: Tuple[str, int], config: FakeLLMConfig):
+        super().__init__(address, FakeLLMHandler)
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.latency = LatencyDistribution(config.latency, self.rng)
+        self.stats = FakeLLMStats()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeLLMServer':
+        """Serve from a background thread"""
+        threading.Thread(target=self.serve_forever, name='fake-llm', daemon=True).start()
+        return self
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--latency', default='lognormal:800:2500',
+                        help='Time to first token: fixed:MS | uniform:MIN:MAX | lognormal:P50:P95')
+    parser.add_argument('--token-delay-ms', type=float, default=5.0, help='Delay per output token')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of calls failing with 500')
+    parser.add_argument('--overload-rate', type=float, default=0.0, help='Share of calls failing with 529/503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of calls throttled with 429')
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def config_from_args(args) -> FakeLLMConfig:
+    return FakeLLMConfig(
+        latency=args.latency,
+        token_delay_ms=args.token_delay_ms,
+        error_rate=args.error_rate,
+        overload_rate=args.overload_rate,
+        throttle_rate=args.throttle_rate,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeLLMServer((args.host, args.port), config_from_args(args))
+    print(f"Fake Anthropic/Bedrock API on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+Load test for the FastAPI app against a local fake Anthropic API.
+
+Starts the fake LLM server (loadtest.fake_llm) and the app under uvicorn
+pointed at it, then drives a weighted validate/generate/suggest/refine mix
+at increasing concurrency. Each level runs a closed loop (every worker
+sends its next request as soon as the previous one returns) and the run
+ends with a JSON report of throughput, p50/p95/p99 latency and error
+rates per level and request kind, for comparing runs over time.
+
+Usage:
+    python -m loadtest.run --levels 1,4,16,64 --duration 30 --output loadtest-report.json
+    python -m loadtest.run --latency fixed:300 --throttle-rate 0.05 --workers 4
+    # An already running app (point its ANTHROPIC_BASE_URL at `python -m loadtest.fake_llm`)
+    python -m loadtest.run --target http://localhost:8000
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from loadtest.fake_llm import FakeLLMServer, add_config_arguments, config_from_args
+from loadtest.scenarios import DEFAULT_MIX, REQUEST_KINDS, parse_mix
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(samples: List[float]) -> dict:
+    return {
+        'p50_ms': round(percentile(samples, 50), 1),
+        'p95_ms': round(percentile(samples, 95), 1),
+        'p99_ms': round(percentile(samples, 99), 1),
+        'max_ms': round(max(samples), 1) if samples else 0.0,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_app(port: int, fake_url: str, workers: int) -> subprocess.Popen:
+    """uvicorn app.main:app talking to the fake API, with rate limits out of the way"""
+    env = {
+        **os.environ,
+        'ANTHROPIC_API_KEY': 'loadtest',
+        'ANTHROPIC_BASE_URL': fake_url,
+        'RATE_LIMIT_PER_MINUTE': '1000000',
+        'RATE_LIMIT_PER_HOUR': '1000000',
+        'RATE_LIMIT_TEAM_PER_MINUTE': '1000000',
+        'RATE_LIMIT_TEAM_PER_HOUR': '1000000',
+        'RATE_LIMIT_BACKEND': 'memory',
+    }
+    env.pop('REDIS_URL', None)
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app.main:app', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=BACKEND_DIR,
+        env=env
+    )
+
+
+async def wait_until_healthy(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get('/health')).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"App at {base_url} did not become healthy within {timeout:.0f}s")
+
+
+async def run_level(base_url: str, concurrency: int, duration: float, warmup: float,
+                    mix: Dict[str, float], duplicate_ratio: float, timeout: float, seed: Optional[int]) -> dict:
+    """Closed-loop load at one concurrency; samples taken during warm-up are discarded"""
+    kinds = [REQUEST_KINDS[name] for name in mix]
+    weights = list(mix.values())
+    samples: Dict[str, List[float]] = {kind.name: [] for kind in kinds}
+    errors: Dict[str, int] = {kind.name: 0 for kind in kinds}
+    statuses: Dict[str, Dict[str, int]] = {kind.name: {} for kind in kinds}
+
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    async def worker(index: int, client: httpx.AsyncClient):
+        rng = random.Random(None if seed is None else seed * 1000 + index)
+        while time.perf_counter() < stop_at:
+            kind = rng.choices(kinds, weights)[0]
+            request_start = time.perf_counter()
+            try:
+                response = await client.post(kind.path, json=kind.build(rng, duplicate_ratio))
+                status = str(response.status_code)
+                failed = response.status_code not in kind.expected
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+                failed = True
+            if request_start < measure_from:
+                continue
+            samples[kind.name].append((time.perf_counter() - request_start) * 1000)
+            statuses[kind.name][status] = statuses[kind.name].get(status, 0) + 1
+            errors[kind.name] += failed
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        await asyncio.gather(*(worker(index, client) for index in range(concurrency)))
+    # Requests in flight at stop_at finish late; divide by the real window
+    elapsed = max(time.perf_counter() - measure_from, 1e-9)
+
+    all_samples = [sample for kind_samples in samples.values() for sample in kind_samples]
+    total_errors = sum(errors.values())
+    return {
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 2),
+        'requests': len(all_samples),
+        'throughput_rps': round(len(all_samples) / elapsed, 2),
+        'error_rate': round(total_errors / len(all_samples), 4) if all_samples else 0.0,
+        'latency': summarize(all_samples),
+        'by_kind': {
+            name: {
+                'requests': len(kind_samples),
+                'throughput_rps': round(len(kind_samples) / elapsed, 2),
+                'error_rate': round(errors[name] / len(kind_samples), 4) if kind_samples else 0.0,
+                'latency': summarize(kind_samples),
+                'statuses': statuses[name],
+            }
+            for name, kind_samples in samples.items()
+        },
+    }
+
+
+async def fetch_json(base_url: str, path: str) -> Optional[dict]:
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=5) as client:
+            response = await client.get(path)
+            return response.json() if response.status_code == 200 else None
+    except (httpx.HTTPError, ValueError):
+        return None
+
+
+async def run(args) -> dict:
+    mix = parse_mix(args.mix)
+    levels = [int(level) for level in args.levels.split(',')]
+
+    fake = None
+    app_process = None
+    base_url = args.target
+    try:
+        if base_url is None:
+            fake = FakeLLMServer(('127.0.0.1', args.fake_port), config_from_args(args)).start()
+            app_process = start_app(args.app_port, fake.url, args.workers)
+            base_url = f"http://127.0.0.1:{args.app_port}"
+            print(f"Fake LLM on {fake.url}, app on {base_url} ({args.workers} worker(s))", file=sys.stderr)
+        await wait_until_healthy(base_url)
+
+        results = []
+        for concurrency in levels:
+            upstream_before = fake.stats.snapshot() if fake else None
+            level = await run_level(
+                base_url, concurrency, args.duration, args.warmup, mix, args.duplicate_ratio, args.timeout, args.seed
+            )
+            if fake:
+                # Includes warm-up; the SDK's own retries of 429/5xx show up here
+                upstream_after = fake.stats.snapshot()
+                level['upstream_calls'] = upstream_after['calls'] - upstream_before['calls']
+            results.append(level)
+            print(
+                f"  c={concurrency:<4} {level['throughput_rps']:>8.1f} req/s  "
+                f"p50 {level['latency']['p50_ms']:>7.1f} ms  p95 {level['latency']['p95_ms']:>7.1f} ms  "
+                f"p99 {level['latency']['p99_ms']:>7.1f} ms  errors {level['error_rate']:.2%}",
+                file=sys.stderr
+            )
+
+        return {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'git_commit': git_commit(),
+                'python': platform.python_version(),
+                'target': args.target or 'local',
+                'workers': args.workers if args.target is None else None,
+                'mix': mix,
+                'duration_s': args.duration,
+                'warmup_s': args.warmup,
+                'duplicate_ratio': args.duplicate_ratio,
+                'fake_llm': config_from_args(args).__dict__ if fake else None,
+            },
+            'levels': results,
+            'upstream': fake.stats.snapshot() if fake else None,
+            'app': {
+                'llm_usage': await fetch_json(base_url, '/api/llm/usage'),
+                'refine': await fetch_json(base_url, '/api/diagrams/refine/stats'),
+                'generate': await fetch_json(base_url, '/api/diagrams/generate/stats'),
+            },
+        }
+    finally:
+        if app_process is not None:
+            app_process.terminate()
+            app_process.wait(timeout=10)
+        if fake is not None:
+            fake.shutdown()
+            fake.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', default=None, help='Base URL of a running app (default: start one locally)')
+    parser.add_argument('--levels', default='1,4,16,64', help='Comma-separated concurrency levels')
+    parser.add_argument('--duration', type=float, default=30.0, help='Measured seconds per level')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Unmeasured seconds before each level')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Request weights, e.g. validate=40,generate=30')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1,
+                        help='Share of generate requests repeating a common description')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Client timeout per request (seconds)')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn workers for the local app')
+    parser.add_argument('--app-port', type=int, default=8765)
+    parser.add_argument('--fake-port', type=int, default=8089)
+    parser.add_argument('--output', default=None, help='Write the JSON report here (default: stdout)')
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    body = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(body + '\n')
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(body)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Request mix for the load test.
+
+Each request kind builds a randomised payload and lists the statuses that
+count as success for it:
+
+    validate  generate calls whose input fails validation (400, no LLM call);
+              this is how the frontend validates in simple mode
+    generate  valid descriptions (200, one LLM call unless coalesced)
+    suggest   incomplete descriptions (200, one LLM call)
+    refine    local edits (no LLM call) mixed with free-form instructions
+"""
+import random
+from dataclasses import dataclass
+from typing import Callable, Dict, Tuple
+
+SYSTEMS = [
+    'web application', 'mobile app', 'internal platform', 'API service', 'customer portal', 'analytics dashboard'
+]
+USERS = ['customers', 'employees', 'administrators', 'support staff', 'partner developers', 'store managers']
+ACTIONS = [
+    'upload and share documents', 'track orders and deliveries', 'schedule appointments',
+    'review monthly sales reports', 'manage support tickets', 'approve expense requests'
+]
+INTEGRATIONS = [
+    'a PostgreSQL database', 'Amazon S3 storage', 'Stripe for payments', 'SendGrid for email',
+    'Salesforce', 'Slack notifications', 'an external identity provider', 'Redis for caching'
+]
+
+# Invalid inputs: too short, or missing the users a context diagram needs
+SHORT_INPUTS = ['Build an app', 'A system for orders', 'dashboard for sales data please', 'Make a website']
+INCOMPLETE_INPUTS = [
+    'Build a platform that processes files from S3 and transfers them to an SFTP server every night '
+    'with retries and email alerts when a transfer fails after several attempts',
+    'Create a backend service that will sync inventory data between the warehouse database and the '
+    'Shopify store every fifteen minutes and export a daily report',
+    'Develop an API that will ingest sensor readings, store them in a time series database and send '
+    'notification messages through Twilio when thresholds are crossed'
+]
+
+REFINE_DIAGRAM = """graph LR
+    Customer[👤 Customer<br/>Places orders]
+    WebApp[🌐 Web App<br/>Online store]
+    OrderAPI[⚙️ Order API<br/>Processes orders]
+    Database[(🗄️ Database<br/>Orders and products)]
+    Email[📧 Email Service<br/>Sends confirmations]
+    Customer -->|Browses| WebApp
+    WebApp -->|Submits orders| OrderAPI
+    OrderAPI -->|Stores| Database
+    OrderAPI -->|Notifies| Email"""
+
+LOCAL_REFINEMENTS = [
+    'remove Email Service', 'rename Web App to Storefront', 'connect Web App to Database',
+    'switch to top-down', 'make Order API red'
+]
+LLM_REFINEMENTS = [
+    'Add a payment provider that the Order API calls before confirming orders and explain the flow',
+    'Split the Order API into separate ordering and fulfilment services',
+    'Show an admin user who manages products through a back-office tool'
+]
+
+
+@dataclass(frozen=True)
+class RequestKind:
+    name: str
+    path: str
+    build: Callable[[random.Random, float], dict]
+    expected: Tuple[int, ...]
+
+
+def valid_description(rng: random.Random, duplicate_ratio: float) -> str:
+    """A description that passes validation; a share repeat a common one to exercise coalescing"""
+    if rng.random() < duplicate_ratio:
+        return (
+            'Build a web application where customers upload and share documents, stored in Amazon S3, '
+            'with email notifications sent through SendGrid'
+        )
+    return (
+        f"Build a {rng.choice(SYSTEMS)} where {rng.choice(USERS)} can {rng.choice(ACTIONS)}. "
+        f"It integrates with {rng.choice(INTEGRATIONS)} and {rng.choice(INTEGRATIONS)}. "
+        f"Request {rng.randrange(10 ** 9)}."
+    )
+
+
+def _validate(rng: random.Random, duplicate_ratio: float) -> dict:
+    return {'input_text': rng.choice(SHORT_INPUTS + INCOMPLETE_INPUTS), 'diagram_type': 'context'}
+
+
+def _generate(rng: random.Random, duplicate_ratio: float) -> dict:
+    return {'input_text': valid_description(rng, duplicate_ratio), 'diagram_type': 'context'}
+
+
+def _suggest(rng: random.Random, duplicate_ratio: float) -> dict:
+    return {'input_text': rng.choice(INCOMPLETE_INPUTS), 'diagram_type': 'context'}
+
+
+def _refine(rng: random.Random, duplicate_ratio: float) -> dict:
+    instructions = LOCAL_REFINEMENTS if rng.random() < 0.6 else LLM_REFINEMENTS
+    return {
+        'current_mermaid': REFINE_DIAGRAM,
+        'original_context': 'An online store where customers place orders that are stored and confirmed by email',
+        'refinement_instruction': rng.choice(instructions)
+    }
+
+
+REQUEST_KINDS: Dict[str, RequestKind] = {
+    'validate': RequestKind('validate', '/api/diagrams/generate', _validate, (400,)),
+    'generate': RequestKind('generate', '/api/diagrams/generate', _generate, (200,)),
+    'suggest': RequestKind('suggest', '/api/diagrams/suggest-improvements', _suggest, (200,)),
+    'refine': RequestKind('refine', '/api/diagrams/refine', _refine, (200,)),
+}
+
+# Roughly what the UI sends: most sessions validate a few times before generating
+DEFAULT_MIX = 'validate=40,generate=30,suggest=15,refine=15'
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """'validate=40,generate=30' -> {'validate': 40.0, 'generate': 30.0}"""
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in REQUEST_KINDS:
+            raise ValueError(f"Unknown request kind: {name} (expected one of {', '.join(REQUEST_KINDS)})")
+        mix[name] = float(weight or 1)
+    return mix
@@ -0,0 +1,91 @@
+"""
+Migrate large text columns to zstd-compressed BYTEA.
+
+Step 1 converts each column from TEXT to BYTEA in place (values become
+their UTF-8 bytes, which CompressedText still reads as plain text), so the
+application keeps working while step 2 compresses existing rows in batches.
+Safe to re-run; already-compressed values are skipped.
+
+    python migrate_compressed_columns.py                # convert + compress
+    python migrate_compressed_columns.py --recompress   # also re-encode rows
+                                                        # written with an older dictionary
+"""
+import argparse
+from sqlalchemy import text, bindparam, LargeBinary
+from app.core.database import engine
+from app.core.compression import text_compressor, is_compressed
+
+COMPRESSED_COLUMNS = [
+    ("diagrams", "input_text"),
+    ("diagrams", "mermaid_code"),
+    ("validated_inputs", "input_text"),
+    ("validated_inputs", "generated_diagram"),
+    ("diagram_revisions", "mermaid_code"),
+    ("diagram_revisions", "input_text"),
+]
+
+
+def convert_column_type(conn, table: str, column: str) -> bool:
+    """ALTER a TEXT column to BYTEA; returns False if it already is"""
+    data_type = conn.execute(text(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_name = :table AND column_name = :column"
+    ), {"table": table, "column": column}).scalar()
+
+    if data_type is None or data_type == "bytea":
+        return False
+    conn.execute(text(
+        f"ALTER TABLE {table} ALTER COLUMN {column} TYPE BYTEA "
+        f"USING convert_to({column}, 'UTF8')"
+    ))
+    return True
+
+
+def compress_rows(table: str, column: str, batch_size: int, recompress: bool) -> int:
+    """Compress plain values (and optionally re-encode old-dictionary ones)"""
+    update = text(
+        f"UPDATE {table} SET {column} = :value WHERE id = :id"
+    ).bindparams(bindparam("value", type_=LargeBinary))
+
+    rewritten = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                f"SELECT id, {column} FROM {table} "
+                f"WHERE id > :last_id AND {column} IS NOT NULL ORDER BY id LIMIT :limit"
+            ), {"last_id": last_id, "limit": batch_size}).fetchall()
+            if not rows:
+                return rewritten
+
+            for row_id, raw in rows:
+                raw = bytes(raw)
+                if is_compressed(raw):
+                    if not recompress or text_compressor.frame_dict_id(raw) == text_compressor.active_dict_id:
+                        continue
+                value = text_compressor.compress(text_compressor.decompress(raw))
+                if value != raw:
+                    conn.execute(update, {"value": value, "id": row_id})
+                    rewritten += 1
+            last_id = rows[-1][0]
+
+
+def migrate(batch_size: int, recompress: bool):
+    """Convert column types, then compress existing values"""
+    with engine.begin() as conn:
+        for table, column in COMPRESSED_COLUMNS:
+            if convert_column_type(conn, table, column):
+                print(f"✓ Converted {table}.{column} to BYTEA")
+
+    for table, column in COMPRESSED_COLUMNS:
+        count = compress_rows(table, column, batch_size, recompress)
+        print(f"✓ Compressed {count} value(s) in {table}.{column}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress large text columns")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--recompress", action="store_true",
+                        help="Re-encode values written with an older dictionary")
+    args = parser.parse_args()
+    migrate(args.batch_size, args.recompress)
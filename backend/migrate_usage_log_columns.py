@@ -0,0 +1,34 @@
+"""
+Add the token accounting columns to usage_logs.
+
+create_all only creates missing tables, so existing deployments need the
+new columns added in place. Existing rows keep their estimated
+tokens_used/cost_estimate and have NULL token counts and price_version,
+which the usage breakdown reports as estimated. Safe to re-run.
+
+    python migrate_usage_log_columns.py
+"""
+from sqlalchemy import text
+from app.core.database import engine
+
+USAGE_LOG_COLUMNS = [
+    ("model", "VARCHAR(100)"),
+    ("input_tokens", "INTEGER"),
+    ("output_tokens", "INTEGER"),
+    ("cache_read_tokens", "INTEGER"),
+    ("cache_write_tokens", "INTEGER"),
+    ("latency_ms", "DOUBLE PRECISION"),
+    ("price_version", "VARCHAR(20)"),
+]
+
+
+def migrate():
+    """Add any missing usage_logs columns"""
+    with engine.begin() as conn:
+        for column, column_type in USAGE_LOG_COLUMNS:
+            conn.execute(text(f"ALTER TABLE usage_logs ADD COLUMN IF NOT EXISTS {column} {column_type}"))
+            print(f"✓ Ensured usage_logs.{column}")
+
+
+if __name__ == "__main__":
+    migrate()
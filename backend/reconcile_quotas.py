@@ -0,0 +1,25 @@
+"""
+Reconcile per-team quota counters against UsageLog.
+Run periodically (e.g. hourly from cron):
+
+    python reconcile_quotas.py                 # current month
+    python reconcile_quotas.py --period 2024-05
+"""
+import argparse
+from sqlalchemy.orm import Session
+from app.core.database import engine
+from app.services.quota_service import QuotaService, current_period
+
+
+def reconcile_quotas(period: str):
+    """Recompute team usage counters for one period"""
+    with Session(engine) as session:
+        count = QuotaService().reconcile(session, period)
+    print(f"✓ Reconciled quota counters for {count} team(s) in {period}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile team quota counters")
+    parser.add_argument("--period", default=None, help="YYYY-MM (defaults to the current month)")
+    args = parser.parse_args()
+    reconcile_quotas(args.period or current_period())
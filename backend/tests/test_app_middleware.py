@@ -0,0 +1,40 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip('fastapi')
+pytest.importorskip('httpx')
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Spends the single allowed request, then prints the rejected response's headers
+SECOND_REQUEST_HEADERS = '''
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+headers = {'Origin': 'http://localhost:5173'}
+client.post('/api/diagrams/generate', json={}, headers=headers)
+response = client.post('/api/diagrams/generate', json={}, headers=headers)
+print(json.dumps({'status': response.status_code, 'headers': dict(response.headers)}))
+'''
+
+
+def test_rate_limited_response_carries_cors_headers():
+    env = {key: value for key, value in os.environ.items() if key not in ('SECRET_KEY', 'REDIS_URL')}
+    env.update(USE_DATABASE='false', RATE_LIMIT_PER_MINUTE='1', RATE_LIMIT_BACKEND='memory')
+    result = subprocess.run(
+        [sys.executable, '-c', SECOND_REQUEST_HEADERS],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    response = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert response['status'] == 429
+    assert response['headers']['access-control-allow-origin'] == 'http://localhost:5173'
+    assert 'retry-after' in response['headers']['access-control-expose-headers'].lower()
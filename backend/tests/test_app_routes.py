@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip('fastapi')
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Prints the module of the endpoint Starlette picks for a request, and its dependencies
+RESOLVE_ENDPOINT = '''
+import json
+import os
+import sys
+from contextlib import nullcontext
+from unittest import mock
+from starlette.routing import Match
+
+# Database mode loads the embedding model at import; routing does not need it
+database_mode = os.environ['USE_DATABASE'] == 'true'
+with mock.patch('sentence_transformers.SentenceTransformer') if database_mode else nullcontext():
+    from app.main import app
+
+scope = {'type': 'http', 'method': sys.argv[1], 'path': sys.argv[2]}
+for route in app.router.routes:
+    if route.matches(scope)[0] == Match.FULL:
+        print(json.dumps({
+            'module': route.endpoint.__module__,
+            'dependencies': [dependency.call.__qualname__ for dependency in route.dependant.dependencies]
+        }))
+        break
+'''
+
+MODE_VARIABLES = ('USE_DATABASE', 'DATABASE_URL', 'REDIS_URL', 'SECRET_KEY', 'SINGLE_FLIGHT_USE_REDIS')
+
+
+DATABASE_MODE = {
+    'USE_DATABASE': 'true',
+    'DATABASE_URL': 'postgresql+psycopg2://localhost/c4',
+    'REDIS_URL': 'redis://localhost:6379/0',
+    'SECRET_KEY': 'test',
+    'SINGLE_FLIGHT_USE_REDIS': 'false',
+}
+
+
+def serving_route(method: str, path: str, **environ: str) -> dict:
+    env = {key: value for key, value in os.environ.items() if key not in MODE_VARIABLES}
+    env.update(environ)
+    result = subprocess.run(
+        [sys.executable, '-c', RESOLVE_ENDPOINT, method, path],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def require_database_stack():
+    for module in ('sqlalchemy', 'jose', 'passlib', 'pgvector', 'psycopg2', 'sentence_transformers'):
+        pytest.importorskip(module)
+
+
+def test_simple_mode_generate_is_served_by_main():
+    assert serving_route('POST', '/api/diagrams/generate', USE_DATABASE='false')['module'] == 'app.main'
+
+
+def test_database_mode_generate_is_served_by_diagram_router():
+    require_database_stack()
+    assert serving_route('POST', '/api/diagrams/generate', **DATABASE_MODE)['module'] == 'app.api.diagrams'
+
+
+@pytest.mark.parametrize('path', [
+    '/api/diagrams/suggest-improvements',
+    '/api/diagrams/suggest-improvements/stream',
+    '/api/diagrams/refine',
+    '/api/diagrams/refine/stream',
+])
+def test_suggest_and_refine_count_against_quota_only_in_database_mode(path):
+    assert serving_route('POST', path, USE_DATABASE='false')['dependencies'] == []
+    require_database_stack()
+    assert serving_route('POST', path, **DATABASE_MODE)['dependencies'] == ['charge_quota.<locals>.dependency']
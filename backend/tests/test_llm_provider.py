@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.llm_provider import CircuitBreaker, NoProviderAvailable, Provider, ProviderPool
+
+
+class Overloaded(Exception):
+    status_code = 529
+
+
+def open_circuit(provider: Provider):
+    for _ in range(provider.breaker.failure_threshold):
+        provider.breaker.record_failure()
+
+
+def make_pool(reset_timeout: float = 0.01) -> ProviderPool:
+    provider = Provider('anthropic', breaker=CircuitBreaker(failure_threshold=2, reset_timeout=reset_timeout))
+    open_circuit(provider)
+    return ProviderPool([provider])
+
+
+def test_circuit_opens_after_threshold_and_fails_over():
+    primary = Provider('anthropic', breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    fallback = Provider('bedrock')
+    pool = ProviderPool([primary, fallback])
+
+    def call(provider, model_id):
+        if provider.name == 'anthropic':
+            raise Overloaded()
+        return model_id
+
+    for _ in range(3):
+        assert pool.call_sync(call, 'claude-3-haiku-20240307') == 'anthropic.claude-3-haiku-20240307-v1:0'
+    assert primary.breaker.state == 'open'
+    assert primary.outcomes['circuit_open'] == 1
+
+
+def test_cancelled_async_probe_releases_half_open_circuit():
+    pool = make_pool()
+    provider = pool.providers[0]
+    time.sleep(0.02)
+    assert provider.breaker.state == 'half_open'
+
+    async def hang(provider, model_id):
+        await asyncio.sleep(10)
+
+    async def ok(provider, model_id):
+        return 'ok'
+
+    async def scenario():
+        probe = asyncio.ensure_future(pool.call(hang, 'claude-3-haiku-20240307'))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        # The next call gets to probe again instead of finding the circuit stuck
+        return await pool.call(ok, 'claude-3-haiku-20240307')
+
+    assert asyncio.run(scenario()) == 'ok'
+    assert provider.breaker.state == 'closed'
+
+
+def test_interrupted_sync_probe_releases_half_open_circuit():
+    pool = make_pool()
+    provider = pool.providers[0]
+    time.sleep(0.02)
+
+    def interrupted(provider, model_id):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        pool.call_sync(interrupted, 'claude-3-haiku-20240307')
+    assert pool.call_sync(lambda provider, model_id: 'ok', 'claude-3-haiku-20240307') == 'ok'
+    assert provider.breaker.state == 'closed'
+
+
+def test_single_probe_while_half_open():
+    pool = make_pool()
+    time.sleep(0.02)
+    breaker = pool.providers[0].breaker
+    assert breaker.allow()
+    with pytest.raises(NoProviderAvailable):
+        pool.call_sync(lambda provider, model_id: 'ok', 'claude-3-haiku-20240307')
+    breaker.release()
+    assert pool.call_sync(lambda provider, model_id: 'ok', 'claude-3-haiku-20240307') == 'ok'
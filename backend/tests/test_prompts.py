@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+from app.services.prompts import (
+    DIAGRAM_GUIDE, GENERATE_SYSTEM_PROMPT, MIN_CACHEABLE_TOKENS, REFINE_SYSTEM_PROMPT,
+    SUGGEST_ONE_SYSTEM_PROMPT, SUGGEST_SYSTEM_PROMPT, cached_system, system_blocks
+)
+from app.services.structured_output import REFINEMENT_TOOL, SUGGESTION_TOOL, SUGGESTIONS_TOOL
+
+# Deliberately generous; English prose and JSON tokenize at roughly 3.5-4
+CHARS_PER_TOKEN = 4.5
+
+
+@pytest.mark.parametrize('prompt, tool', [
+    (GENERATE_SYSTEM_PROMPT, None),
+    (SUGGEST_SYSTEM_PROMPT, SUGGESTIONS_TOOL),
+    (SUGGEST_ONE_SYSTEM_PROMPT, SUGGESTION_TOOL),
+    (REFINE_SYSTEM_PROMPT, REFINEMENT_TOOL),
+], ids=['generate', 'suggest', 'suggest-one', 'refine'])
+def test_cached_prefix_reaches_minimum_cacheable_length(prompt, tool):
+    # Tools come before the system prompt in the cached prefix
+    prefix = (json.dumps(tool) if tool else '') + ''.join(block['text'] for block in cached_system(prompt))
+    assert len(prefix) / CHARS_PER_TOKEN >= max(MIN_CACHEABLE_TOKENS.values())
+
+
+def test_breakpoint_follows_the_task_prompt():
+    guide, task = cached_system(REFINE_SYSTEM_PROMPT)
+    assert guide == {'type': 'text', 'text': DIAGRAM_GUIDE}
+    assert task == {'type': 'text', 'text': REFINE_SYSTEM_PROMPT, 'cache_control': {'type': 'ephemeral'}}
+    assert 'cache_control' not in system_blocks(REFINE_SYSTEM_PROMPT, cache=False)[1]
@@ -0,0 +1,63 @@
+"""
+Train a zstd dictionary on stored diagrams for the compressed text columns.
+
+Samples mermaid code and input text from the database and writes
+<dict-dir>/diagrams-<id>.zdict with the next free dictionary ID. New
+values use the newest dictionary after a restart; existing rows stay
+readable with the dictionary they were written with (re-encode them with
+`python migrate_compressed_columns.py --recompress`).
+
+    python train_compression_dict.py --samples 5000 --size 65536
+"""
+import argparse
+import os
+import zstandard
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.compression import DICT_SUFFIX, text_compressor
+from app.core.config import settings
+from app.core.database import engine
+from app.models.database import Diagram, ValidatedInput
+
+
+def collect_samples(limit: int) -> list:
+    """Random sample of stored diagram texts"""
+    with Session(engine) as session:
+        diagrams = session.query(Diagram.mermaid_code, Diagram.input_text).order_by(
+            func.random()
+        ).limit(limit).all()
+        inputs = session.query(ValidatedInput.generated_diagram).filter(
+            ValidatedInput.generated_diagram.isnot(None)
+        ).order_by(func.random()).limit(limit // 4).all()
+
+    samples = []
+    for mermaid_code, input_text in diagrams:
+        samples.append(mermaid_code.encode('utf-8'))
+        samples.append(input_text.encode('utf-8'))
+    samples.extend(row[0].encode('utf-8') for row in inputs if row[0])
+    return samples
+
+
+def train_dictionary(samples: list, size: int, dict_id: int) -> zstandard.ZstdCompressionDict:
+    return zstandard.train_dictionary(size, samples, dict_id=dict_id, level=settings.COMPRESSION_LEVEL)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train a zstd dictionary for compressed columns")
+    parser.add_argument("--samples", type=int, default=5000, help="Diagrams to sample")
+    parser.add_argument("--size", type=int, default=64 * 1024, help="Dictionary size in bytes")
+    parser.add_argument("--dict-dir", default=settings.COMPRESSION_DICT_DIR)
+    args = parser.parse_args()
+
+    samples = collect_samples(args.samples)
+    if len(samples) < 100:
+        raise SystemExit(f"Only {len(samples)} samples found; need at least 100 to train a useful dictionary")
+
+    dict_id = max(text_compressor.dictionaries, default=0) + 1
+    dictionary = train_dictionary(samples, args.size, dict_id)
+
+    os.makedirs(args.dict_dir, exist_ok=True)
+    path = os.path.join(args.dict_dir, f"diagrams-{dict_id}{DICT_SUFFIX}")
+    with open(path, 'wb') as f:
+        f.write(dictionary.as_bytes())
+    print(f"✓ Trained dictionary {dict_id} from {len(samples)} samples -> {path}")
@@ -76,7 +76,24 @@ function DiagramGenerator() {
     setLoadingSuggestions(true)
     try {
       const aiService = new AIService(apiProvider)
-      const suggestionsData = await aiService.getSuggestions(context)
+      let suggestionsData
+      try {
+        // Show each suggestion as soon as it arrives
+        suggestionsData = await aiService.streamSuggestions(context, (suggestion) => {
+          setSuggestions(prev => ({
+            original_text: context,
+            validation_issues: [],
+            suggestions: [...(prev?.suggestions || []), suggestion]
+          }))
+          setError('')
+        })
+      } catch (streamError) {
+        // Fall back only when streaming is missing (404/405) or unreachable (network
+        // TypeError); a rejected request or a server error event is shown as is
+        const streamUnavailable = streamError instanceof TypeError || [404, 405].includes(streamError.status)
+        if (!streamUnavailable) throw streamError
+        suggestionsData = await aiService.getSuggestions(context)
+      }
       setSuggestions(suggestionsData)
       setError('') // Clear error when showing suggestions
     } catch (err) {
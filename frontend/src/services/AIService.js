@@ -33,6 +33,65 @@ class AIService {
     }
   }
 
+  async streamSuggestions(context, onSuggestion) {
+    // Suggestions as Server-Sent Events, each passed to onSuggestion as it arrives.
+    // Errors carry the HTTP status, so callers can tell a backend without the
+    // streaming endpoint (404/405, e.g. the Lambda API) from a rejected request.
+    const response = await fetch(`${this.backendUrl}/api/diagrams/suggest-improvements/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({
+        input_text: context,
+        diagram_type: 'context'
+      })
+    })
+
+    if (!response.ok || !response.body) {
+      const error = await response.json().catch(() => ({}))
+      const streamError = new Error(error.message || error.detail?.message || error.detail || 'Failed to get suggestions')
+      streamError.status = response.status
+      throw streamError
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    const suggestions = []
+    let buffer = ''
+    let done = null
+
+    while (true) {
+      const { value, done: finished } = await reader.read()
+      if (finished) break
+      buffer += decoder.decode(value, { stream: true })
+
+      let boundary
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const block = buffer.slice(0, boundary)
+        buffer = buffer.slice(boundary + 2)
+        const event = block.match(/^event: (.*)$/m)?.[1]
+        const data = JSON.parse(block.match(/^data: (.*)$/m)?.[1] || '{}')
+
+        if (event === 'suggestion') {
+          suggestions.push(data.suggestion)
+          onSuggestion(data.suggestion, data.elapsed_ms)
+        } else if (event === 'error') {
+          throw new Error(data.detail)
+        } else if (event === 'done') {
+          done = data
+        }
+      }
+    }
+
+    return {
+      original_text: context,
+      validation_issues: done?.validation_issues || [],
+      suggestions,
+      metadata: { mode: done?.mode, timings: done?.timings }
+    }
+  }
+
   async refineDiagram(currentMermaid, originalContext, refinementInstruction) {
     // Refine existing diagram based on user instructions
     try {